@@ -9,18 +9,24 @@ from html.parser import HTMLParser
 from urllib.parse import urlparse
 import sys
 
+from bookmark_model import Bookmark, FolderTable
+from bookmark_stream import feed_file
+from url_canon import canonical_key
+from url_classify import classify_urls
+
+# url_classify の理由コード -> 怪しいブックマークの分類（有効なものは None）
+SUSPICIOUS_KEYS = (None, 'empty', 'chrome_urls', 'javascript', 'file', 'localhost', 'invalid')
+
 class BookmarkParser(HTMLParser):
     def __init__(self):
         super().__init__()
         self.bookmarks = []
-        self.folders = []
+        self.folders = FolderTable()
         self.current_folder = []
         self.in_dt = False
         self.current_link = None
 
     def handle_starttag(self, tag, attrs):
-        attrs_dict = dict(attrs)
-
         if tag == 'dt':
             self.in_dt = True
 
@@ -31,17 +37,11 @@ class BookmarkParser(HTMLParser):
 
         elif tag == 'a':
             # ブックマーク
-            href = attrs_dict.get('href', '')
-            add_date = attrs_dict.get('add_date', '')
-            icon = attrs_dict.get('icon', '')
-
-            self.current_link = {
-                'url': href,
-                'add_date': add_date,
-                'icon': icon,
-                'folder': '/'.join(self.current_folder),
-                'title': ''
-            }
+            self.current_link = Bookmark.from_attrs(
+                attrs,
+                folder_id=self.folders.intern(self.current_folder),
+                folders=self.folders
+            )
 
     def handle_endtag(self, tag):
         if tag == 'dt':
@@ -59,7 +59,7 @@ class BookmarkParser(HTMLParser):
         data = data.strip()
         if data:
             if self.current_link is not None:
-                self.current_link['title'] = data
+                self.current_link.title = data
             elif self.in_dt and self.current_folder:
                 self.current_folder[-1] = data
 
@@ -73,13 +73,13 @@ def analyze_bookmarks(bookmarks):
     # ドメイン別集計
     domains = Counter()
     protocols = Counter()
-    folder_counts = Counter()
+    folders = None
+    folder_ids = []
 
     for bm in bookmarks:
         url = bm['url']
-        folder = bm['folder']
-
-        folder_counts[folder if folder else '(ルート)'] += 1
+        folders = bm.folders
+        folder_ids.append(bm.folder_id)
 
         try:
             parsed = urlparse(url)
@@ -92,6 +92,11 @@ def analyze_bookmarks(bookmarks):
         except:
             pass
 
+    # フォルダ別集計（パス文字列はフォルダごとに1回だけ作る）
+    folder_counts = Counter()
+    if folders is not None:
+        folder_counts.update(folders.path_counts(folders.bincount(folder_ids), root_label='(ルート)'))
+
     # トップドメイン表示
     print("\n【トップ20ドメイン】")
     for domain, count in domains.most_common(20):
@@ -111,9 +116,9 @@ def analyze_bookmarks(bookmarks):
     return domains, protocols, folder_counts
 
 def find_duplicates(bookmarks):
-    """重複ブックマークを検出"""
+    """重複ブックマークを検出（正規化キーが同じものを重複とみなす）"""
 
-    url_count = Counter(bm['url'] for bm in bookmarks)
+    url_count = Counter(canonical_key(bm['url']) for bm in bookmarks)
     duplicates = {url: count for url, count in url_count.items() if count > 1}
 
     print(f"\n{'='*60}")
@@ -140,21 +145,11 @@ def find_suspicious(bookmarks):
         'invalid': []
     }
 
-    for bm in bookmarks:
-        url = bm['url']
-
-        if not url or url.strip() == '':
-            suspicious['empty'].append(bm)
-        elif url.startswith('chrome://') or url.startswith('chrome-extension://'):
-            suspicious['chrome_urls'].append(bm)
-        elif url.startswith('javascript:'):
-            suspicious['javascript'].append(bm)
-        elif url.startswith('file://'):
-            suspicious['file'].append(bm)
-        elif 'localhost' in url or '127.0.0.1' in url:
-            suspicious['localhost'].append(bm)
-        elif not url.startswith('http'):
-            suspicious['invalid'].append(bm)
+    codes = classify_urls([bm['url'] for bm in bookmarks])
+    for bm, code in zip(bookmarks, codes):
+        category = SUSPICIOUS_KEYS[code]
+        if category is not None:
+            suspicious[category].append(bm)
 
     print(f"\n{'='*60}")
     print("【削除候補（怪しいブックマーク）】")
@@ -173,13 +168,9 @@ def find_suspicious(bookmarks):
 def main():
     print("Chromeブックマーク分析開始...")
 
-    # HTMLファイル読み込み
-    with open('bookmarks_2025_12_31.html', 'r', encoding='utf-8') as f:
-        html_content = f.read()
-
-    # パース
+    # HTMLファイルをチャンク単位でパース
     parser = BookmarkParser()
-    parser.feed(html_content)
+    feed_file(parser, 'bookmarks_2025_12_31.html', lazy_icons=True)
 
     bookmarks = parser.bookmarks
 
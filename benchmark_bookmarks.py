@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ブックマークパーサーのベンチマーク
+HTMLParser と Netscape専用トークナイザーの処理速度、
+辞書と Bookmark レコード（ICONの遅延読み込みを含む）のメモリ使用量を比較する
+
+使い方:
+    python3 benchmark_bookmarks.py [ブックマークHTML ...] [--synthetic 1000000] [--memory]
+"""
+
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+from bookmark_stream import BOOKMARK, iter_events
+
+DEFAULT_INPUT = 'bookmarks_2025_12_31.html'
+
+# 合成データのアイコン（Chromeのエクスポートと同程度の大きさ）
+SYNTHETIC_ICON = 'data:image/png;base64,' + 'iVBORw0KGgoAAAANSUhEUgAAABAAAAAQCAYAAAAf8/9h' * 12
+
+
+def generate_synthetic_export(filepath, bookmark_count, folder_size=200, icon_every=2):
+    """
+    Netscape形式の合成ブックマークファイルを生成
+    folder_size 件ごとにフォルダを区切り、icon_every 件に1件アイコンを付ける
+    """
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write('<!DOCTYPE NETSCAPE-Bookmark-file-1>\n')
+        f.write('<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">\n')
+        f.write('<TITLE>Bookmarks</TITLE>\n<H1>Bookmarks</H1>\n<DL><p>\n')
+        f.write('    <DT><H3 ADD_DATE="1703861181" LAST_MODIFIED="1766439577" PERSONAL_TOOLBAR_FOLDER="true">ブックマーク バー</H3>\n')
+        f.write('    <DL><p>\n')
+
+        for i in range(bookmark_count):
+            if i % folder_size == 0:
+                if i:
+                    f.write('        </DL><p>\n')
+                f.write(f'        <DT><H3 ADD_DATE="1703861181" LAST_MODIFIED="1766439577">フォルダ {i // folder_size}</H3>\n')
+                f.write('        <DL><p>\n')
+
+            icon = f' ICON="{SYNTHETIC_ICON}"' if i % icon_every == 0 else ''
+            f.write(f'            <DT><A HREF="https://example.com/page/{i}?q=bookmark&amp;n={i % 97}" '
+                    f'ADD_DATE="{1600000000 + i}"{icon}>ブックマーク &amp; ページ {i}</A>\n')
+
+        if bookmark_count:
+            f.write('        </DL><p>\n')
+        f.write('    </DL><p>\n</DL><p>\n')
+
+
+def time_events(filepath, use_html_parser):
+    """イベントを最後まで読み、(秒, ブックマーク数) を返す"""
+    start = time.perf_counter()
+    count = 0
+    for kind, _ in iter_events(filepath, use_html_parser=use_html_parser):
+        if kind == BOOKMARK:
+            count += 1
+    return time.perf_counter() - start, count
+
+
+def benchmark_file(filepath, repeat=3):
+    """1ファイル分のベンチマークを実行して表示"""
+    size_mb = os.path.getsize(filepath) / (1024 * 1024)
+    print(f"\n【{filepath}】 ({size_mb:.1f} MB)")
+
+    results = {}
+    for label, use_html_parser in [('HTMLParser', True), ('NetscapeTokenizer', False)]:
+        best = None
+        for _ in range(repeat):
+            elapsed, count = time_events(filepath, use_html_parser)
+            best = elapsed if best is None else min(best, elapsed)
+        results[label] = best
+        print(f"  {label:18s} : {best:7.3f}秒  {count / best:12,.0f}件/秒  {size_mb / best:7.1f} MB/秒  ({count:,}件)")
+
+    speedup = results['HTMLParser'] / results['NetscapeTokenizer']
+    print(f"  速度比: {speedup:.2f}倍")
+
+
+def build_dict_records(filepath):
+    """従来の辞書モデル（organize_bookmarks.py と同じく attrs も保持）"""
+    records = []
+    for kind, bm in iter_events(filepath):
+        if kind == BOOKMARK:
+            attrs = bm.attrs
+            records.append({
+                'url': bm.url,
+                'add_date': attrs.get('add_date', ''),
+                'icon': bm.get_icon(),
+                'folder_path': bm.folder_path,
+                'title': bm.title,
+                'attrs': attrs
+            })
+    return records
+
+
+def build_slotted_records(filepath):
+    """Bookmark レコード"""
+    return [bm for kind, bm in iter_events(filepath) if kind == BOOKMARK]
+
+
+def build_lazy_icon_records(filepath):
+    """Bookmark レコード（ICONは位置だけを保持）"""
+    return [bm for kind, bm in iter_events(filepath, lazy_icons=True) if kind == BOOKMARK]
+
+
+def measure_memory(build, filepath):
+    """レコード一覧を作り、保持しているメモリ量（バイト）と件数を返す"""
+    gc.collect()
+    tracemalloc.start()
+    records = build(filepath)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(records)
+    del records
+    return current, count
+
+
+def benchmark_memory(filepath):
+    """辞書モデルと Bookmark レコードのメモリ使用量を比較"""
+    print(f"\n【メモリ比較: {filepath}】")
+
+    builds = [
+        ('dict', build_dict_records),
+        ('Bookmark', build_slotted_records),
+        ('Bookmark (ICON遅延)', build_lazy_icon_records),
+    ]
+    results = {}
+    for label, build in builds:
+        size, count = measure_memory(build, filepath)
+        results[label] = size
+        per_entry = size / count if count else 0
+        print(f"  {label:18s} : {size / (1024 * 1024):8.2f} MB  ({per_entry:,.0f} バイト/件, {count:,}件)")
+
+    if results['dict']:
+        for label in ('Bookmark', 'Bookmark (ICON遅延)'):
+            print(f"  削減率 ({label}): {(1 - results[label] / results['dict']) * 100:.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ブックマークパーサーのベンチマーク')
+    parser.add_argument('files', nargs='*', help='計測するブックマークHTML')
+    parser.add_argument('--synthetic', type=int, default=1000000,
+                        help='合成ファイルのブックマーク数（0で無効）')
+    parser.add_argument('--repeat', type=int, default=3, help='計測回数（最小値を採用）')
+    parser.add_argument('--memory', action='store_true',
+                        help='辞書と Bookmark レコードのメモリ使用量も比較する')
+    args = parser.parse_args()
+
+    files = args.files or ([DEFAULT_INPUT] if os.path.exists(DEFAULT_INPUT) else [])
+
+    print("="*70)
+    print("ブックマークパーサー ベンチマーク")
+    print("="*70)
+
+    for filepath in files:
+        benchmark_file(filepath, args.repeat)
+        if args.memory:
+            benchmark_memory(filepath)
+
+    if args.synthetic:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            synthetic_file = os.path.join(tmpdir, f'synthetic_{args.synthetic}.html')
+            print(f"\n合成ファイルを生成中: {args.synthetic:,}件")
+            generate_synthetic_export(synthetic_file, args.synthetic)
+            benchmark_file(synthetic_file, args.repeat)
+            if args.memory:
+                benchmark_memory(synthetic_file)
+
+
+if __name__ == '__main__':
+    main()
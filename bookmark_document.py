@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+属性を保持したブックマーク文書モデル
+解析時に見たフォルダ・ブックマークを文書の順に、すべての属性
+（ADD_DATE / LAST_MODIFIED / ICON_URI / PERSONAL_TOOLBAR_FOLDER や未知の属性も）ごと保持し、
+元のファイルを読み直さずにNetscape形式のHTMLを書き出せるようにする
+
+entries の要素は Bookmark、FolderEntry（フォルダ開始）、FOLDER_END（フォルダ終了）のいずれか
+spans には各ブックマークの <DT><A …>…</A> の元ファイル内のバイト範囲を文書の順に
+[開始, 終了, 開始, 終了, …] と並べて持つ（記録できなかった場合は空）
+"""
+
+import mmap
+from array import array
+
+from bookmark_model import Bookmark, FolderTable
+from bookmark_replay import escape_title
+
+# フォルダ終了の目印
+FOLDER_END = None
+
+HTML_HEADER = '''<!DOCTYPE NETSCAPE-Bookmark-file-1>
+<!-- This is an automatically generated file.
+     It will be read and overwritten.
+     DO NOT EDIT! -->
+<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">
+'''
+
+INDENT = '    '
+
+
+class FolderEntry:
+    """フォルダ開始（attrs は元の順序の (名前, 値) のタプル）"""
+
+    __slots__ = ('name', 'attrs', 'folder_id')
+
+    def __init__(self, name='', attrs=(), folder_id=FolderTable.ROOT):
+        self.name = name
+        self.attrs = attrs
+        self.folder_id = folder_id
+
+    def __repr__(self):
+        return f'FolderEntry(name={self.name!r})'
+
+
+class BookmarkDocument:
+    """ブックマークHTML1ファイル分の内容"""
+
+    def __init__(self, title='Bookmarks', heading='Bookmarks', folders=None, source=None):
+        self.title = title
+        self.heading = heading
+        self.folders = folders if folders is not None else FolderTable()
+        self.entries = []
+        self.source = source
+        self.spans = array('q')
+
+    def bookmarks(self):
+        """ブックマークを文書の順に返す"""
+        return (entry for entry in self.entries if isinstance(entry, Bookmark))
+
+    def has_spans(self):
+        """全ブックマークの元ファイル内の範囲が記録されているか"""
+        return (
+            self.source is not None
+            and len(self.spans) == 2 * sum(1 for _ in self.bookmarks())
+        )
+
+    def splice(self, f, keep):
+        """
+        元のファイルから keep(bookmark) が偽のブックマークの範囲だけを除き、
+        残りのバイト列をそのまま f（バイナリ）にコピーする
+        再シリアライズしないので、書式・属性・未知のタグは元のまま残る
+        """
+        spans = self.spans
+        with open(self.source, 'rb') as src, \
+                mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as data, \
+                memoryview(data) as view:
+            pos = 0
+            for i, bookmark in enumerate(self.bookmarks()):
+                if keep(bookmark):
+                    continue
+                start, end = _line_range(data, spans[2 * i], spans[2 * i + 1])
+                if start > pos:
+                    f.write(view[pos:start])
+                pos = max(pos, end)
+            f.write(view[pos:])
+
+    def write(self, f, keep=None):
+        """
+        Netscape形式（Chromeのエクスポートと同じレイアウト）で f に書き出す
+        keep(bookmark) が偽のブックマークは出力しない（フォルダはすべて残す）
+        """
+        with NetscapeWriter(f, self.title, self.heading) as writer:
+            for entry in self.entries:
+                if entry is FOLDER_END:
+                    writer.close_folder()
+                elif isinstance(entry, FolderEntry):
+                    writer.open_folder(entry.name, entry.attrs)
+                elif keep is None or keep(entry):
+                    writer.bookmark(entry)
+
+
+class NetscapeWriter:
+    """
+    フォルダ・ブックマークを1件ずつNetscape形式（Chromeのエクスポートと同じレイアウト）で書き出す
+    遅延参照の属性（ICONなど）は、元のファイルを1回だけマップして位置で読み出す
+    """
+
+    # まとめて書き出す行数
+    FLUSH_LINES = 1024
+
+    def __init__(self, f, title='Bookmarks', heading='Bookmarks'):
+        self.f = f
+        self.lazy = _LazyAttrReader()
+        self.lines = []
+        self.indent = INDENT
+        f.write(HTML_HEADER)
+        f.write(f'<TITLE>{escape_title(title)}</TITLE>\n')
+        f.write(f'<H1>{escape_title(heading)}</H1>\n')
+        f.write('<DL><p>\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.lazy.close()
+
+    def open_folder(self, name, attrs=()):
+        self._append(
+            f'{self.indent}<DT><H3{_format_attrs(attrs, self.lazy)}>{escape_title(name)}</H3>\n'
+            f'{self.indent}<DL><p>\n'
+        )
+        self.indent += INDENT
+
+    def close_folder(self):
+        self.indent = self.indent[:-len(INDENT)]
+        self._append(f'{self.indent}</DL><p>\n')
+
+    def bookmark(self, bookmark, extra_attrs=()):
+        """Bookmark を1行書き出す（extra_attrs は末尾に追加する属性）"""
+        attrs = bookmark.tag_attrs()
+        attrs.extend(extra_attrs)
+        self._append(
+            f'{self.indent}<DT><A{_format_attrs(attrs, self.lazy)}>{escape_title(bookmark.title)}</A>\n'
+        )
+
+    def _append(self, line):
+        self.lines.append(line)
+        if len(self.lines) >= self.FLUSH_LINES:
+            self.f.writelines(self.lines)
+            self.lines.clear()
+
+    def close(self):
+        """開いているフォルダを閉じ、末尾を書き出す"""
+        while len(self.indent) > len(INDENT):
+            self.close_folder()
+        self.f.writelines(self.lines)
+        self.lines.clear()
+        self.f.write('</DL><p>\n')
+        self.lazy.close()
+
+
+def _line_range(data, start, end):
+    """範囲の前が行頭までの空白、後ろが行末までの空白なら、行全体（改行を含む）に広げる"""
+    line_start = start
+    while line_start > 0 and data[line_start - 1] in b' \t':
+        line_start -= 1
+    if line_start > 0 and data[line_start - 1] != ord('\n'):
+        return start, end
+
+    line_end = end
+    size = len(data)
+    while line_end < size and data[line_end] in b' \t\r':
+        line_end += 1
+    if line_end < size and data[line_end] != ord('\n'):
+        return start, end
+    return line_start, min(line_end + 1, size)
+
+
+def escape_attr(name, value):
+    """
+    属性値を書き出す形にする
+    HREF はChromeのエクスポートと同じく '"' だけを置き換える（'&' はそのまま。
+    文字参照を展開しない読み込み（SIMPLE_BOOKMARK_BYTES_PATTERN）でも元のURLに戻る）
+    それ以外の属性はタイトルと同じく文字参照化する
+    """
+    if name == 'href':
+        return value.replace('"', '&quot;')
+    return escape_title(value)
+
+
+def _format_attrs(attrs, lazy):
+    """属性を ' NAME="値"' の並びにする（値のない属性は名前のみ、遅延参照は lazy で読み出す）"""
+    parts = []
+    for name, value in attrs:
+        if value is None:
+            parts.append(f' {name.upper()}')
+        else:
+            parts.append(f' {name.upper()}="{escape_attr(name, lazy.read(value))}"')
+    return ''.join(parts)
+
+
+class _LazyAttrReader:
+    """AttributeRef を元のファイルのマップから読み出す（ファイルごとに1回だけ開く）"""
+
+    def __init__(self):
+        self.files = {}
+
+    def read(self, value):
+        if isinstance(value, str):
+            return value
+        opened = self.files.get(value.source)
+        if opened is None:
+            f = open(value.source, 'rb')
+            opened = self.files[value.source] = (f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        return value.read_from(opened[1])
+
+    def close(self):
+        for f, data in self.files.values():
+            data.close()
+            f.close()
+        self.files.clear()
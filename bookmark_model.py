@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ブックマークのレコード定義
+1件ごとの辞書の代わりに __slots__ を使った小さなクラスで保持する
+フォルダパスは FolderTable に1回だけ登録し、ブックマークは整数IDで参照する
+"""
+
+from array import array
+
+
+def parse_timestamp(value):
+    """ADD_DATE などの文字列を整数にする（空・不正な値は None）"""
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+class FolderTable:
+    """
+    フォルダパスの表
+    各フォルダを (親ID, 名前) で1回だけ登録し、パス文字列は表示するときだけ組み立てる
+    ID 0 はルート
+    """
+
+    ROOT = 0
+
+    def __init__(self):
+        self.parents = array('l', [-1])
+        self.names = ['']
+        self.ids = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def child(self, parent_id, name):
+        """親フォルダ内の name フォルダのIDを返す（未登録なら登録）"""
+        key = (parent_id, name)
+        folder_id = self.ids.get(key)
+        if folder_id is None:
+            folder_id = self.ids[key] = len(self.names)
+            self.parents.append(parent_id)
+            self.names.append(name)
+        return folder_id
+
+    def intern(self, parts):
+        """フォルダ名のリストからIDを返す"""
+        folder_id = self.ROOT
+        for name in parts:
+            folder_id = self.child(folder_id, name)
+        return folder_id
+
+    def parts(self, folder_id):
+        """ルートからのフォルダ名リスト"""
+        parts = []
+        while folder_id > self.ROOT:
+            parts.append(self.names[folder_id])
+            folder_id = self.parents[folder_id]
+        parts.reverse()
+        return parts
+
+    def path(self, folder_id, sep='/'):
+        """フォルダパス文字列"""
+        return sep.join(self.parts(folder_id))
+
+    def bincount(self, folder_ids):
+        """フォルダIDごとの件数（IDをインデックスとするリスト）"""
+        counts = [0] * len(self.names)
+        for folder_id in folder_ids:
+            counts[folder_id] += 1
+        return counts
+
+    def path_counts(self, counts, sep='/', root_label=''):
+        """bincount の結果を {パス: 件数} に変換（0件のフォルダは除く）"""
+        return {
+            (self.path(folder_id, sep) or root_label): count
+            for folder_id, count in enumerate(counts) if count
+        }
+
+
+# Bookmark.extra で「値は url / add_date / icon にある」ことを表す印（marshal で保存できる）
+FIELD = ...
+
+# url / add_date / icon に移す属性の既定の並び
+FIELD_ORDER = ('href', 'add_date', 'icon')
+
+
+class Bookmark:
+    """
+    ブックマーク1件分のレコード
+
+    日付は整数で保持し、HREF / ADD_DATE / ICON 以外の属性だけを extra に残す
+    整数にならない ADD_DATE・値のない（または空の）ICON は元の値のまま extra に残す
+    属性の並びが HREF, ADD_DATE, ICON, その他 の順でなければ、extra に元の順で並べ、
+    値を url / add_date / icon に移したものは値の代わりに FIELD を置く
+    フォルダは folders (FolderTable) 内の folder_id で参照する
+    icon は文字列か、ファイル内の位置への参照（read() を持つオブジェクト）で、
+    中身は get_icon() を呼んだときだけ読み出す
+    既存コードとの互換のため bm['url'] や node.get('attrs', {}) の形でも参照できる
+    """
+
+    __slots__ = ('url', 'title', 'add_date', 'icon', 'folder_id', 'folders', 'level', 'extra')
+
+    # 辞書形式で参照されたときの別名
+    KEY_ALIASES = {
+        'name': 'title',
+        'folder': 'folder_path',
+    }
+
+    def __init__(self, url='', title='', add_date=None, icon='', folder_id=FolderTable.ROOT,
+                 folders=None, level=0, extra=None):
+        self.url = url
+        self.title = title
+        self.add_date = add_date
+        self.icon = icon
+        self.folder_id = folder_id
+        self.folders = folders
+        self.level = level
+        self.extra = extra
+
+    @classmethod
+    def from_attrs(cls, attrs, title='', folder_id=FolderTable.ROOT, folders=None, level=0):
+        """HTMLParser形式の属性リスト [(名前, 値), ...] から作成"""
+        url = None
+        add_date = None
+        icon = ''
+        entries = []
+        # 値を移した属性が既定の並びで先頭に続いているか
+        in_order = True
+
+        for name, value in attrs:
+            if name == 'href' and url is None:
+                url = value or ''
+            elif name == 'add_date' and add_date is None and parse_timestamp(value) is not None:
+                add_date = parse_timestamp(value)
+            elif name == 'icon' and not icon and value:
+                icon = value
+            else:
+                entries.append((name, value))
+                continue
+            if entries and (entries[-1][1] is not FIELD
+                            or FIELD_ORDER.index(entries[-1][0]) > FIELD_ORDER.index(name)):
+                in_order = False
+            entries.append((name, FIELD))
+
+        if in_order:
+            entries = [entry for entry in entries if entry[1] is not FIELD]
+        return cls(url or '', title, add_date, icon, folder_id, folders, level,
+                   tuple(entries) if entries else None)
+
+    @property
+    def folder_path(self):
+        """'/' 区切りのフォルダパス（参照されたときだけ組み立てる）"""
+        if self.folders is None:
+            return ''
+        return self.folders.path(self.folder_id)
+
+    def get_icon(self):
+        """ICONの値（遅延参照の場合はここでファイルから読み出す）"""
+        icon = self.icon
+        if icon and not isinstance(icon, str):
+            return icon.read()
+        return icon
+
+    def tag_attrs(self, read_icon=False):
+        """
+        タグの属性 [(名前, 値), ...] を元の順に返す（値のない属性は None）
+        ICON の遅延参照は read_icon=True のときだけ読み出す
+        """
+        fields = {'href': self.url}
+        if self.add_date is not None:
+            fields['add_date'] = str(self.add_date)
+        if self.icon:
+            fields['icon'] = self.get_icon() if read_icon else self.icon
+        extra = self.extra or ()
+        if not any(value is FIELD for _, value in extra):
+            return list(fields.items()) + list(extra)
+
+        placed = []
+        for name, value in extra:
+            if value is not FIELD:
+                placed.append((name, value))
+            elif name in fields:
+                placed.append((name, fields.pop(name)))
+        return list(fields.items()) + placed
+
+    @property
+    def attrs(self):
+        """元のタグ属性を辞書で返す（必要なときだけ組み立てる）"""
+        return dict(self.tag_attrs(read_icon=True))
+
+    def __getitem__(self, key):
+        if key == 'type':
+            return 'bookmark'
+        if key == 'attrs':
+            return self.attrs
+        key = self.KEY_ALIASES.get(key, key)
+        if key in self.__slots__ or key == 'folder_path':
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        """辞書に変換（出力・比較用）"""
+        return {
+            'url': self.url,
+            'title': self.title,
+            'add_date': self.add_date,
+            'icon': self.get_icon(),
+            'folder_path': self.folder_path,
+            'level': self.level,
+            'extra': list(self.extra) if self.extra else None,
+        }
+
+    def __repr__(self):
+        return f'Bookmark(url={self.url!r}, title={self.title!r})'
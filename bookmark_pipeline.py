@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+読み込み → 解析 → クリーニング → カテゴリー分類 → 書き出し を asyncio のステージで並行に実行する
+clean_bookmarks.py と categorize_bookmarks.py を続けて実行した場合と同じ
+bookmarks_cleaned.html / bookmarks_categorized.html / bookmark_cleaning_report.txt を1回の読み込みで作る
+
+各ステージはコルーチンで、間を大きさに上限のあるキュー（asyncio.Queue）でつなぐ
+後ろのステージが詰まると前のステージの put が待たされる（バックプレッシャー）ため、
+メモリ上に溜まるのはキューの上限分のチャンク・バッチだけになる
+ファイルの読み書きはスレッド、解析・分類はワーカー（CPUが複数あればプロセスプール）で実行し、
+I/O と解析・分類を重ねる。解析・分類は同時に複数のバッチを投入し、結果は入力の順に受け取る
+クリーニング（重複判定と分析）は全体の状態を持つので、1バッチずつ順に処理する
+
+使い方:
+    python3 bookmark_pipeline.py bookmarks_2025_12_31.html --workers 4
+"""
+
+import argparse
+import asyncio
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from bookmark_model import Bookmark
+from bookmark_stream import SIMPLE_BOOKMARK_BYTES_PATTERN
+from categorize_bookmarks import CategorySpools, categorize_bookmark, print_category_stats
+from clean_bookmarks import (
+    CLEANED_HTML_FOOTER, CLEANED_HTML_HEADER, BookmarkAnalyzer, escape_cleaned,
+    format_cleaned_line, iter_clean_bookmarks, new_removed_count, print_clean_summary,
+    save_cleaning_report
+)
+from seen_index import close_seen_set, open_seen_set
+
+# 1回に読み込むバイト数（解析のバッチの単位にもなる）
+READ_CHUNK_SIZE = 1024 * 1024
+
+# ステージ間のキューに溜められるチャンク・バッチの数
+DEFAULT_QUEUE_SIZE = 4
+
+# キューの終わりの目印
+END = None
+
+DT_TAG = b'<DT>'
+
+
+def split_complete(data):
+    """
+    data を解析できる部分と次のチャンクへ持ち越す部分に分ける位置
+    途中で切れたブックマークは必ず '<DT>' から始まるので、最後の '<DT>'（末尾で切れたものを含む）の前で分ける
+    末尾の '<' などは、最後の '<DT>' の項目が閉じている（'</' がある）場合だけ切れた '<DT>' とみなす
+    （'…<DT><' の '<' は '<DT>' の項目の続きなので、'<DT>' の前で分ける）
+    """
+    cut = data.rfind(DT_TAG)
+    tail = data.find(b'<', max(len(data) - len(DT_TAG) + 1, 0))
+    if (tail > cut and DT_TAG.startswith(data[tail:])
+            and (cut < 0 or data.find(b'</', cut, tail) >= 0)):
+        cut = tail
+    return cut if cut >= 0 else len(data)
+
+
+def parse_chunk(data):
+    """チャンク内のブックマークを (URL, タイトル) のリストにする（iter_bookmarks_mmap と同じ抽出）"""
+    return [
+        (url.decode('utf-8', 'ignore'), title.decode('utf-8', 'ignore').strip())
+        for url, title in SIMPLE_BOOKMARK_BYTES_PATTERN.findall(data)
+    ]
+
+
+def categorize_batch(batch):
+    """(URL, タイトル) のバッチをカテゴリーのリストにする"""
+    return [categorize_bookmark(Bookmark(url, title)) for url, title in batch]
+
+
+class CleanStage:
+    """クリーニングと分析（全体の重複判定の状態を持つ）"""
+
+    def __init__(self, seen_urls=None):
+        self.analyzer = BookmarkAnalyzer()
+        self.removed = new_removed_count()
+        self.seen_urls = set() if seen_urls is None else seen_urls
+
+    def clean(self, batch):
+        """
+        (URL, タイトル) のバッチを分析・クリーニングし、残したものを整理済みファイルの表記で返す
+        整理済みファイルを categorize_bookmarks.py が読み直した場合と同じ値にするため、
+        分類にも書き出し後の表記を使う
+        """
+        add = self.analyzer.add
+        bookmarks = []
+        for url, title in batch:
+            add(url)
+            bookmarks.append(Bookmark(url, title))
+        return [
+            escape_cleaned(bm.url, bm.title)
+            for bm in iter_clean_bookmarks(bookmarks, self.removed, seen_urls=self.seen_urls)
+        ]
+
+
+async def read_stage(filepath, out_queue, io_executor, chunk_size=READ_CHUNK_SIZE):
+    """ファイルをチャンク単位で読み込み、ブックマークの途中で切れないように区切って送る"""
+    loop = asyncio.get_running_loop()
+    carry = b''
+    with open(filepath, 'rb') as f:
+        while True:
+            chunk = await loop.run_in_executor(io_executor, f.read, chunk_size)
+            if not chunk:
+                break
+            data = carry + chunk
+            cut = split_complete(data)
+            carry = data[cut:]
+            if cut > 0:
+                await out_queue.put(data[:cut])
+
+    if carry:
+        await out_queue.put(carry)
+    await out_queue.put(END)
+
+
+async def map_stage(in_queue, out_queue, func, executor, window, with_input=False):
+    """
+    受け取った要素ごとに executor で func を実行し、結果を入力の順に送る
+    同時に実行するのは window 個まで。with_input=True の場合は (入力, 結果) を送る
+    """
+    loop = asyncio.get_running_loop()
+    pending = deque()
+
+    async def send_oldest():
+        item, future = pending.popleft()
+        result = await future
+        await out_queue.put((item, result) if with_input else result)
+
+    while True:
+        item = await in_queue.get()
+        if item is END:
+            break
+        pending.append((item, loop.run_in_executor(executor, func, item)))
+        if len(pending) >= window:
+            await send_oldest()
+
+    while pending:
+        await send_oldest()
+    await out_queue.put(END)
+
+
+def _write_batch(f, spools, batch, categories):
+    for (url, title), category in zip(batch, categories):
+        line = format_cleaned_line(url, title)
+        f.write(line)
+        # 整理済みファイルの行とカテゴリー別ファイルの行は同じ表記になる
+        spools.add(category, line)
+    return len(batch)
+
+
+async def write_stage(in_queue, cleaned_file, categorized_file, io_executor):
+    """整理済みファイルとカテゴリー別の一時ファイルに書き出し、最後にカテゴリー別ファイルを作る"""
+    loop = asyncio.get_running_loop()
+    spools = CategorySpools()
+    kept_count = 0
+    try:
+        with open(cleaned_file, 'w', encoding='utf-8') as f:
+            f.write(CLEANED_HTML_HEADER)
+            while True:
+                item = await in_queue.get()
+                if item is END:
+                    break
+                kept_count += await loop.run_in_executor(io_executor, _write_batch, f, spools, *item)
+            f.write(CLEANED_HTML_FOOTER)
+
+        await loop.run_in_executor(io_executor, spools.save, categorized_file)
+    finally:
+        spools.close()
+    return kept_count, spools.counts
+
+
+async def run_pipeline(input_file, cleaned_file, categorized_file, workers=None,
+                       queue_size=DEFAULT_QUEUE_SIZE, use_processes=None, seen_urls=None):
+    """
+    パイプラインを実行し、(CleanStage, 残存数, カテゴリー別件数) を返す
+    use_processes=False の場合は解析・分類もスレッドで実行する
+    （既定ではワーカーが2つ以上のときだけプロセスを使う）
+    seen_urls には重複判定の集合（seen_index.SqliteSeenSet など）を渡せる
+    """
+    workers = workers or os.cpu_count() or 1
+    if use_processes is None:
+        use_processes = workers > 1
+    chunks = asyncio.Queue(queue_size)
+    parsed = asyncio.Queue(queue_size)
+    cleaned = asyncio.Queue(queue_size)
+    categorized = asyncio.Queue(queue_size)
+    clean_stage = CleanStage(seen_urls)
+
+    # 読み書きは1本ずつ順に行うので、それぞれ専用のスレッドを使う
+    with ThreadPoolExecutor(1) as reader, ThreadPoolExecutor(1) as writer, \
+            ThreadPoolExecutor(1) as cleaner, \
+            (ProcessPoolExecutor(workers) if use_processes else ThreadPoolExecutor(workers)) as cpu:
+        _, _, _, _, (kept_count, counts) = await asyncio.gather(
+            read_stage(input_file, chunks, reader),
+            map_stage(chunks, parsed, parse_chunk, cpu, workers),
+            map_stage(parsed, cleaned, clean_stage.clean, cleaner, 1),
+            map_stage(cleaned, categorized, categorize_batch, cpu, workers, with_input=True),
+            write_stage(categorized, cleaned_file, categorized_file, writer),
+        )
+
+    return clean_stage, kept_count, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='クリーニングとカテゴリー分類を並行するパイプラインで実行')
+    parser.add_argument('input', nargs='?', default='bookmarks_2025_12_31.html', help='入力するブックマークファイル')
+    parser.add_argument('--cleaned', default='bookmarks_cleaned.html', help='整理済みブックマークの出力')
+    parser.add_argument('--categorized', default='bookmarks_categorized.html', help='カテゴリー別ブックマークの出力')
+    parser.add_argument('--report', default='bookmark_cleaning_report.txt', help='整理レポートの出力')
+    parser.add_argument('--workers', type=int, help='解析・分類のワーカー数（既定: CPU数）')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help='ステージ間のキューに溜めるチャンク数の上限')
+    parser.add_argument('--threads', action='store_true', help='解析・分類をプロセスではなくスレッドで実行')
+    parser.add_argument('--seen-db', help='重複判定に SQLite のファイルを使い、--record-seen で記録した以前の実行のURLも重複として除く')
+    parser.add_argument('--record-seen', action='store_true',
+                        help='この実行で見たURLを --seen-db に記録する（次回以降の整理済みファイルには、それ以前に記録していないURLだけが残る）')
+    args = parser.parse_args()
+    if args.record_seen and not args.seen_db:
+        parser.error('--record-seen には --seen-db が必要です')
+
+    print("="*70)
+    print("ブックマーク整理パイプライン（読み込み → 解析 → クリーニング → 分類 → 書き出し）")
+    print("="*70)
+    print(f"\n読み込み中: {args.input}")
+
+    seen_urls = open_seen_set(args.seen_db)
+    try:
+        clean_stage, kept_count, counts = asyncio.run(run_pipeline(
+            args.input, args.cleaned, args.categorized,
+            workers=args.workers, queue_size=args.queue_size, use_processes=False if args.threads else None,
+            seen_urls=seen_urls
+        ))
+        # 整理済みファイルを書き終えてから記録する
+        close_seen_set(seen_urls, commit=args.record_seen)
+    finally:
+        close_seen_set(seen_urls)
+
+    clean_stage.analyzer.report()
+
+    print(f"\n{'='*70}")
+    print("クリーニング結果")
+    print(f"{'='*70}\n")
+    removed = clean_stage.removed
+    print_clean_summary(removed, kept_count)
+    print(f"\n整理済みブックマークを保存: {args.cleaned}")
+
+    save_cleaning_report(args.report, kept_count + sum(removed.values()), kept_count, removed)
+    print(f"レポートを保存: {args.report}")
+
+    print_category_stats(counts)
+    print(f"\nカテゴリー別ブックマークを保存しました: {args.categorized}")
+
+    print(f"\n{'='*70}")
+    print("完了！")
+    print(f"{'='*70}\n")
+
+
+if __name__ == '__main__':
+    main()
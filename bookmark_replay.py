@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ブラウザのプロファイルから読み込んだフォルダツリーを、
+HTMLエクスポートを解析したときと同じハンドラ呼び出しとして再生する
+
+ツリーのノードは辞書で、フォルダは {'type': 'folder', 'name', 'children'}、
+ブックマークは {'type': 'url', 'name', 'url'}
+日付は id(ノード) -> (add_date, last_modified) の辞書（Unix秒、不明な値は None）で渡す
+ルートは (ノード, フォルダとして出力するか, 追加の属性リスト) のリスト
+"""
+
+from html import escape
+
+from bookmark_model import Bookmark
+
+
+def collect_nodes(roots):
+    """全ノードを出力順（前順）に並べる"""
+    nodes = []
+    stack = [node for node, _, _ in reversed(roots)]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        if node.get('type') == 'folder':
+            stack.extend(reversed(node.get('children', [])))
+    return nodes
+
+
+def replay_roots(handler, roots, dates):
+    """
+    handler の handle_starttag / handle_endtag / handle_data を
+    HTMLエクスポートを解析したときと同じ順序で呼び出す
+    フォルダを1つ閉じるごとに yield するので、呼び出し側はその間にイベントを取り出せる
+    """
+    def date_attrs(node, with_modified):
+        add_date, last_modified = dates.get(id(node), (None, None))
+        attrs = []
+        if add_date is not None:
+            attrs.append(('add_date', str(add_date)))
+        if with_modified and last_modified is not None:
+            attrs.append(('last_modified', str(last_modified)))
+        return attrs
+
+    def open_folder(node, extra_attrs):
+        handler.handle_starttag('dt', [])
+        handler.handle_starttag('h3', date_attrs(node, True) + list(extra_attrs))
+        if node.get('name'):
+            handler.handle_data(node['name'])
+        handler.handle_endtag('h3')
+        handler.handle_starttag('dl', [])
+        handler.handle_starttag('p', [])
+
+    handler.handle_starttag('dl', [])
+    handler.handle_starttag('p', [])
+
+    for root, as_folder, extra_attrs in roots:
+        if as_folder:
+            open_folder(root, extra_attrs)
+
+        # (フォルダ, 次に出力する子の位置) のスタックで深さ優先にたどる
+        stack = [(root, 0)]
+
+        while stack:
+            node, index = stack.pop()
+            children = node.get('children', [])
+            if index >= len(children):
+                if stack or as_folder:
+                    handler.handle_endtag('dl')
+                    handler.handle_starttag('p', [])
+                yield
+                continue
+
+            stack.append((node, index + 1))
+            child = children[index]
+            if child.get('type') == 'folder':
+                open_folder(child, ())
+                stack.append((child, 0))
+            elif child.get('type') == 'url':
+                handler.handle_starttag('dt', [])
+                handler.handle_starttag('a', [('href', child.get('url', ''))] + date_attrs(child, False))
+                if child.get('name'):
+                    handler.handle_data(child['name'])
+                handler.handle_endtag('a')
+
+    handler.handle_endtag('dl')
+    handler.handle_starttag('p', [])
+    yield
+
+
+def escape_title(title):
+    """ブラウザのHTMLエクスポートと同じ表記に文字参照化する"""
+    return escape(title).replace('&#x27;', '&#39;')
+
+
+def iter_tree_bookmarks(roots, dates):
+    """
+    ブックマーク（URLを持つノード）を出力順に Bookmark で返す
+    parse_bookmarks_simple と同じく、タイトルはHTMLエクスポート上の表記（文字参照のまま）
+    """
+    for node in collect_nodes(roots):
+        if node.get('type') == 'url':
+            yield Bookmark(
+                node.get('url', ''),
+                escape_title((node.get('name') or '').strip()),
+                dates.get(id(node), (None, None))[0]
+            )
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ブックマークHTMLのストリーミング読み込み
+ファイル全体を読み込まず、固定サイズのチャンクごとにパーサーへ流し込む
+Chromeプロファイルの Bookmarks（JSON）は chrome_bookmarks、
+Firefoxの places.sqlite は firefox_bookmarks で読み込む
+"""
+
+import mmap
+import re
+from collections import deque
+from html.parser import HTMLParser
+
+from bookmark_model import Bookmark, FolderTable
+import chrome_bookmarks
+import firefox_bookmarks
+from netscape_tokenizer import NetscapeTokenizer
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# parse_bookmarks_simple と同じ抽出パターン
+SIMPLE_BOOKMARK_PATTERN = re.compile(r'<DT><A HREF="([^"]*)"[^>]*>([^<]*)</A>')
+SIMPLE_BOOKMARK_BYTES_PATTERN = re.compile(rb'<DT><A HREF="([^"]*)"[^>]*>([^<]*)</A>')
+
+# イベント種別
+FOLDER_START = 'folder_start'
+FOLDER_END = 'folder_end'
+BOOKMARK = 'bookmark'
+
+
+def iter_text_chunks(filepath, chunk_size=DEFAULT_CHUNK_SIZE, errors='strict'):
+    """
+    ファイルをチャンク単位で読み込む
+    テキストが途中で分割されないよう、各チャンクは '<' の直前で区切る
+    """
+    carry = ''
+    with open(filepath, 'r', encoding='utf-8', errors=errors) as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+
+            data = carry + chunk
+            cut = data.rfind('<')
+            if cut <= 0:
+                # 区切れる位置がなければ次のチャンクと連結
+                carry = data
+                continue
+
+            carry = data[cut:]
+            yield data[:cut]
+
+    if carry:
+        yield carry
+
+
+def iter_byte_chunks(filepath, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ファイルをデコードせずにチャンク単位で読み込む"""
+    with open(filepath, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+# 遅延読み込みの対象にする属性
+LAZY_ICON_ATTRS = ('icon',)
+
+
+def profile_reader(filepath):
+    """
+    ブラウザのプロファイルファイルなら読み込み用のモジュール
+    （chrome_bookmarks / firefox_bookmarks）を返し、HTMLなら None
+    """
+    if chrome_bookmarks.is_chrome_json(filepath):
+        return chrome_bookmarks
+    if firefox_bookmarks.is_places_sqlite(filepath):
+        return firefox_bookmarks
+    return None
+
+
+def _iter_feed(parser, filepath, chunk_size, use_html_parser, lazy_icons=False):
+    """
+    パーサーにチャンクを1つ流し込むごとに yield する（最後は close の後）
+    既定ではNetscape専用トークナイザーがパーサーのハンドラを直接呼び出す
+    ブラウザのプロファイルファイルの場合はHTMLを経由せずハンドラを呼び出す
+    """
+    reader = profile_reader(filepath)
+    if reader is not None:
+        yield from reader.iter_replay(parser, filepath)
+        return
+
+    if use_html_parser:
+        chunks, feed, close = iter_text_chunks(filepath, chunk_size), parser.feed, parser.close
+    else:
+        tokenizer = NetscapeTokenizer(
+            parser,
+            lazy_attrs=LAZY_ICON_ATTRS if lazy_icons else (),
+            source=filepath
+        )
+        chunks, feed, close = iter_byte_chunks(filepath, chunk_size), tokenizer.feed, tokenizer.close
+
+    for chunk in chunks:
+        feed(chunk)
+        yield
+    close()
+    yield
+
+
+def feed_file(parser, filepath, chunk_size=DEFAULT_CHUNK_SIZE, use_html_parser=False,
+              lazy_icons=False):
+    """
+    パーサーにファイルをチャンク単位で流し込む
+    use_html_parser=True の場合は HTMLParser.feed を使う
+    lazy_icons=True の場合、ICONの値はデコードせず位置だけを AttributeRef で渡す
+    （HTMLParser.feed では使えないため無視される）
+    """
+    for _ in _iter_feed(parser, filepath, chunk_size, use_html_parser, lazy_icons):
+        pass
+    return parser
+
+
+class BookmarkEventParser(HTMLParser):
+    """
+    フォルダ・ブックマークが確定するたびにイベントを発行するパーサー
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.events = deque()
+        self.folders = FolderTable()
+        self.folder_ids = [FolderTable.ROOT]
+        self.dl_stack = []
+        self.pending_folder = None
+        self.current_bookmark = None
+        self.in_h3 = False
+        self.current_text = ''
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'h3':
+            self.in_h3 = True
+            self.current_text = ''
+            self.pending_folder = {
+                'name': '',
+                'attrs': dict(attrs)
+            }
+
+        elif tag == 'dl':
+            # 直前のH3があればフォルダ開始
+            folder = self.pending_folder
+            self.pending_folder = None
+            self.dl_stack.append(folder)
+            if folder is not None:
+                folder['id'] = self.folders.child(self.folder_ids[-1], folder['name'])
+                self.folder_ids.append(folder['id'])
+                self.events.append((FOLDER_START, folder))
+
+        elif tag == 'a':
+            self.current_text = ''
+            self.current_bookmark = Bookmark.from_attrs(
+                attrs,
+                folder_id=self.folder_ids[-1],
+                folders=self.folders
+            )
+
+    def handle_endtag(self, tag):
+        if tag == 'h3':
+            self.in_h3 = False
+            if self.pending_folder is not None:
+                self.pending_folder['name'] = self.current_text.strip()
+
+        elif tag == 'a':
+            if self.current_bookmark is not None:
+                self.current_bookmark.title = self.current_text.strip()
+                self.events.append((BOOKMARK, self.current_bookmark))
+                self.current_bookmark = None
+
+        elif tag == 'dl':
+            if self.dl_stack and self.dl_stack.pop() is not None:
+                self.folder_ids.pop()
+                self.events.append((FOLDER_END, None))
+
+    def handle_data(self, data):
+        if self.in_h3 or self.current_bookmark is not None:
+            self.current_text += data
+
+
+def iter_events(filepath, chunk_size=DEFAULT_CHUNK_SIZE, use_html_parser=False, lazy_icons=False):
+    """
+    ブックマークHTMLをストリーミングで解析し、(種別, データ) のイベントを順に返す
+    メモリ上に保持するのは1チャンク分のイベントのみ
+    lazy_icons=True の場合、Bookmark.icon はファイル内の位置への参照になる
+    """
+    parser = BookmarkEventParser()
+    events = parser.events
+
+    for _ in _iter_feed(parser, filepath, chunk_size, use_html_parser, lazy_icons):
+        while events:
+            yield events.popleft()
+
+
+def _carry_start(data, last_end):
+    """
+    次のチャンクへ持ち越す位置を求める
+    途中で切れたブックマークは必ず '<DT>' から始まる
+    """
+    start = data.rfind('<DT>', last_end)
+    if start >= 0:
+        return start
+
+    # 末尾が '<', '<D', '<DT' で切れている場合
+    tail = data.find('<', max(last_end, len(data) - 3))
+    if tail >= 0 and '<DT>'.startswith(data[tail:]):
+        return tail
+
+    return len(data)
+
+
+def iter_bookmarks_mmap(filepath):
+    """
+    ファイルをmmapしてバイト列のまま正規表現を適用する
+    デコードするのはURLとタイトルの部分だけで、ICONのデータはコピーもデコードもしない
+    """
+    with open(filepath, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空ファイルはmmapできない
+            return
+
+        with mapped:
+            for match in SIMPLE_BOOKMARK_BYTES_PATTERN.finditer(mapped):
+                url, title = match.groups()
+                yield Bookmark(
+                    url.decode('utf-8', 'ignore'),
+                    title.decode('utf-8', 'ignore').strip()
+                )
+
+
+def iter_bookmarks(filepath, chunk_size=DEFAULT_CHUNK_SIZE, use_mmap=False):
+    """
+    ブックマークを1件ずつ返すジェネレーター
+    parse_bookmarks_simple と同じ結果を、リストを作らずに返す
+    use_mmap=True の場合は iter_bookmarks_mmap を使う
+    """
+    if chrome_bookmarks.is_chrome_json(filepath):
+        yield from chrome_bookmarks.iter_chrome_bookmarks(filepath)
+        return
+    if firefox_bookmarks.is_places_sqlite(filepath):
+        yield from firefox_bookmarks.iter_firefox_bookmarks(filepath)
+        return
+
+    if use_mmap:
+        yield from iter_bookmarks_mmap(filepath)
+        return
+
+    carry = ''
+    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+
+            data = carry + chunk
+            last_end = 0
+            for match in SIMPLE_BOOKMARK_PATTERN.finditer(data):
+                yield Bookmark(match.group(1), match.group(2).strip())
+                last_end = match.end()
+
+            carry = data[_carry_start(data, last_end):]
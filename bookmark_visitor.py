@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共有パーサーのイベントを複数のフィルター・分類器に配るビジター
+ファイルを iter_events で1回だけ解析し、フォルダ開始・ブックマーク・フォルダ終了のたびに
+購読しているビジターのメソッドを登録順に呼び出す
+
+ビジターは BookmarkVisitor を継承し、必要なメソッドだけを上書きする
+    start_folder(folder)   : フォルダ開始（{'name', 'attrs', 'id'} の辞書）
+    visit_bookmark(bm)     : ブックマーク（Bookmark。複数のビジターで共有するので書き換えない）
+    end_folder(folder)     : フォルダ終了（start_folder と同じ辞書）
+    finish()               : 全イベントの後
+"""
+
+from bookmark_stream import BOOKMARK, FOLDER_END, FOLDER_START, iter_events
+
+
+class BookmarkVisitor:
+    """イベントを受け取る側の基底クラス（既定では何もしない）"""
+
+    def start_folder(self, folder):
+        pass
+
+    def visit_bookmark(self, bookmark):
+        pass
+
+    def end_folder(self, folder):
+        pass
+
+    def finish(self):
+        pass
+
+
+def _overridden(visitors, name):
+    """name を上書きしているビジターのメソッドだけを集める（何もしない呼び出しを省く）"""
+    default = getattr(BookmarkVisitor, name)
+    return [
+        getattr(visitor, name) for visitor in visitors
+        if getattr(type(visitor), name, default) is not default
+    ]
+
+
+def visit_file(filepath, visitors, lazy_icons=False):
+    """
+    filepath を1回だけ解析し、イベントを visitors に配る
+    HTMLのほか、Chromeの Bookmarks や Firefoxの places.sqlite も読める
+    visitors をそのまま返す
+    """
+    return visit_events(iter_events(filepath, lazy_icons=lazy_icons), visitors)
+
+
+def visit_events(events, visitors):
+    """
+    iter_events と同じ形のイベント列（parse_cache.cached_events の結果など）を visitors に配る
+    visitors をそのまま返す
+    """
+    starts = _overridden(visitors, 'start_folder')
+    visits = _overridden(visitors, 'visit_bookmark')
+    ends = _overridden(visitors, 'end_folder')
+    folder_stack = []
+
+    for kind, data in events:
+        if kind == BOOKMARK:
+            for visit in visits:
+                visit(data)
+        elif kind == FOLDER_START:
+            folder_stack.append(data)
+            for start in starts:
+                start(data)
+        elif kind == FOLDER_END:
+            folder = folder_stack.pop()
+            for end in ends:
+                end(folder)
+
+    for visitor in visitors:
+        visitor.finish()
+    return visitors
@@ -3,28 +3,20 @@
 ブックマークをカテゴリー別に自動分類
 """
 
-import re
+import argparse
+import tempfile
 from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
 from urllib.parse import urlparse
 import sys
 
-def parse_bookmarks_simple(filepath):
-    """シンプルなブックマークパーサー"""
-    bookmarks = []
-
-    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-        content = f.read()
-
-    pattern = r'<DT><A HREF="([^"]*)"[^>]*>([^<]*)</A>'
-    matches = re.findall(pattern, content)
-
-    for url, title in matches:
-        bookmarks.append({
-            'url': url,
-            'title': title.strip()
-        })
+from bookmark_stream import iter_bookmarks
+from external_sort import ExternalSorter, format_size, parse_size
 
-    return bookmarks
+def parse_bookmarks_simple(filepath, use_mmap=False):
+    """シンプルなブックマークパーサー"""
+    return list(iter_bookmarks(filepath, use_mmap=use_mmap))
 
 def categorize_bookmark(bm):
     """ブックマークをカテゴリー分け"""
@@ -91,10 +83,12 @@ def categorize_bookmark(bm):
     # デフォルト
     return 'その他'
 
-def save_categorized_bookmarks(categorized_bookmarks, output_file):
-    """カテゴリー別に整理されたブックマークを保存"""
+def iter_categorized(bookmarks):
+    """ブックマークを1件ずつ分類し、(カテゴリー, ブックマーク) を返す"""
+    for bm in bookmarks:
+        yield categorize_bookmark(bm), bm
 
-    html_header = '''<!DOCTYPE NETSCAPE-Bookmark-file-1>
+HTML_HEADER = '''<!DOCTYPE NETSCAPE-Bookmark-file-1>
 <!-- This is an automatically generated file.
      It will be read and overwritten.
      DO NOT EDIT! -->
@@ -104,33 +98,124 @@ def save_categorized_bookmarks(categorized_bookmarks, output_file):
 <DL><p>
 '''
 
-    html_footer = '''</DL><p>
+HTML_FOOTER = '''</DL><p>
 '''
 
+def format_bookmark_line(bm):
+    """ブックマーク1件分のHTML行"""
+    url = bm['url'].replace('"', '&quot;')
+    title = bm['title'].replace('<', '&lt;').replace('>', '&gt;')
+    return f'        <DT><A HREF="{url}">{title}</A>\n'
+
+def write_category_folder(f, category, count, lines):
+    """カテゴリーフォルダを書き出し"""
+    f.write(f'    <DT><H3 ADD_DATE="1703861181" LAST_MODIFIED="1766439577">{category} ({count})</H3>\n')
+    f.write('    <DL><p>\n')
+    for line in lines:
+        f.write(line)
+    f.write('    </DL><p>\n')
+
+def save_categorized_bookmarks(categorized_bookmarks, output_file):
+    """カテゴリー別に整理されたブックマークを保存"""
+
     with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(html_header)
+        f.write(HTML_HEADER)
 
         # カテゴリーをソート
-        sorted_categories = sorted(categorized_bookmarks.keys())
-
-        for category in sorted_categories:
+        for category in sorted(categorized_bookmarks.keys()):
             bookmarks = categorized_bookmarks[category]
+            write_category_folder(f, category, len(bookmarks), map(format_bookmark_line, bookmarks))
+
+        f.write(HTML_FOOTER)
+
+class CategorySpools:
+    """
+    カテゴリーごとの一時ファイルにHTML行を溜め、最後にカテゴリー順に連結して保存する
+    ブックマークをメモリに溜めない
+    """
+
+    def __init__(self):
+        self.spools = {}
+        self.counts = defaultdict(int)
+
+    def add(self, category, line):
+        spool = self.spools.get(category)
+        if spool is None:
+            spool = self.spools[category] = tempfile.TemporaryFile('w+', encoding='utf-8')
+        spool.write(line)
+        self.counts[category] += 1
+
+    def save(self, output_file):
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write(HTML_HEADER)
+
+            for category in sorted(self.spools.keys()):
+                spool = self.spools[category]
+                spool.seek(0)
+                write_category_folder(f, category, self.counts[category], spool)
+
+            f.write(HTML_FOOTER)
+
+    def close(self):
+        for spool in self.spools.values():
+            spool.close()
+        self.spools = {}
+
+def save_categorized_stream(categorized, output_file):
+    """
+    (カテゴリー, ブックマーク) のストリームをカテゴリー別に保存
+    カテゴリーごとに一時ファイルへ書き出してから連結するため、
+    ブックマークをメモリに溜めない
+    """
+
+    spools = CategorySpools()
+    try:
+        for category, bm in categorized:
+            spools.add(category, format_bookmark_line(bm))
+        spools.save(output_file)
+    finally:
+        spools.close()
+
+    return spools.counts
+
+def save_categorized_external(categorized, output_file, memory_budget):
+    """
+    (カテゴリー, ブックマーク) のストリームを (カテゴリー, 出現順, HTML行) の外部ソートで
+    カテゴリー順に並べて保存（カテゴリーごとの一時ファイルを開かず、メモリ使用量を予算内に抑える）
+    """
+
+    sorter = ExternalSorter(memory_budget)
+    counts = defaultdict(int)
+
+    for seq, (category, bm) in enumerate(categorized):
+        sorter.add((category, seq, format_bookmark_line(bm)))
+        counts[category] += 1
 
-            # カテゴリーフォルダ
-            f.write(f'    <DT><H3 ADD_DATE="1703861181" LAST_MODIFIED="1766439577">{category} ({len(bookmarks)})</H3>\n')
-            f.write('    <DL><p>\n')
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(HTML_HEADER)
 
-            # ブックマーク
-            for bm in bookmarks:
-                url = bm['url'].replace('"', '&quot;')
-                title = bm['title'].replace('<', '&lt;').replace('>', '&gt;')
-                f.write(f'        <DT><A HREF="{url}">{title}</A>\n')
+        for category, records in groupby(sorter.sorted(), key=itemgetter(0)):
+            write_category_folder(f, category, counts[category], (line for _, _, line in records))
 
-            f.write('    </DL><p>\n')
+        f.write(HTML_FOOTER)
 
-        f.write(html_footer)
+    return counts
+
+def print_category_stats(counts):
+    """カテゴリー別の件数と割合を表示"""
+    total = sum(counts.values())
+    print(f"\n【カテゴリー別統計】")
+    for category in sorted(counts.keys()):
+        count = counts[category]
+        percentage = count / total * 100
+        print(f"  {category:30s} : {count:5d}個 ({percentage:5.1f}%)")
 
 def main():
+    parser = argparse.ArgumentParser(description='ブックマーク自動カテゴリー分類')
+    parser.add_argument('--memory-budget', type=parse_size,
+                        help='外部メモリモードで処理する（一時ファイルを使い、メモリ使用量をこの値程度に抑える。例: 512M）')
+    args = parser.parse_args()
+
     input_file = 'bookmarks_cleaned.html'
     output_file = 'bookmarks_categorized.html'
 
@@ -138,29 +223,21 @@ def main():
     print("ブックマーク自動カテゴリー分類")
     print("="*70)
 
-    # 読み込み
-    print(f"\n整理済みブックマークを読み込み中: {input_file}")
-    bookmarks = parse_bookmarks_simple(input_file)
-    print(f"  読み込み完了: {len(bookmarks)}個")
-
-    # カテゴリー分け
-    print(f"\nカテゴリー分類中...")
-    categorized = defaultdict(list)
-
-    for bm in bookmarks:
-        category = categorize_bookmark(bm)
-        categorized[category].append(bm)
-
-    # 統計表示
-    print(f"\n【カテゴリー別統計】")
-    for category in sorted(categorized.keys()):
-        count = len(categorized[category])
-        percentage = count / len(bookmarks) * 100
-        print(f"  {category:30s} : {count:5d}個 ({percentage:5.1f}%)")
-
-    # 保存
-    print(f"\nカテゴリー別ブックマークを保存中: {output_file}")
-    save_categorized_bookmarks(categorized, output_file)
+    # 読み込み・カテゴリー分け・保存（ストリーミング）
+    categorized = iter_categorized(iter_bookmarks(input_file))
+    if args.memory_budget:
+        print(f"\n整理済みブックマークを外部メモリモードでカテゴリー分類中: {input_file}"
+              f"（メモリ予算 {format_size(args.memory_budget)}）")
+        counts = save_categorized_external(categorized, output_file, args.memory_budget)
+    else:
+        print(f"\n整理済みブックマークを読み込みながらカテゴリー分類中: {input_file}")
+        counts = save_categorized_stream(categorized, output_file)
+    total = sum(counts.values())
+    print(f"  読み込み完了: {total}個")
+
+    print_category_stats(counts)
+
+    print(f"\nカテゴリー別ブックマークを保存しました: {output_file}")
 
     print(f"\n{'='*70}")
     print("完了！")
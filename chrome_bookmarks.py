@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chromeプロファイルの Bookmarks（JSON）を直接読み込む
+HTMLにエクスポートせず、各パーサーのハンドラをHTMLと同じ順序で呼び出す
+（ブックマークバーは PERSONAL_TOOLBAR_FOLDER 付きのフォルダ、
+  「その他のブックマーク」の中身はルート直下、モバイルはフォルダとして扱う）
+
+date_added / date_modified は 1601-01-01 からのマイクロ秒（WebKit形式）なので、
+全ノード分をまとめてUnix秒に変換する（NumPyがあれば使う）
+
+使い方:
+    python3 chrome_bookmarks.py [Bookmarksのパス]
+"""
+
+import json
+import os
+import sys
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from bookmark_replay import collect_nodes, iter_tree_bookmarks, replay_roots
+
+# 1601-01-01 から 1970-01-01 までの秒数
+WEBKIT_EPOCH_OFFSET = 11644473600
+
+# これより少ない件数はNumPyを使わずに変換
+NUMPY_MIN_BATCH = 1024
+
+
+def default_bookmarks_path():
+    """既定のChromeプロファイルの Bookmarks のパス"""
+    if sys.platform == 'win32':
+        base = os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Google', 'Chrome', 'User Data')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Application Support/Google/Chrome')
+    else:
+        base = os.path.expanduser('~/.config/google-chrome')
+    return os.path.join(base, 'Default', 'Bookmarks')
+
+
+def is_chrome_json(filepath):
+    """ファイルがJSON（Chromeの Bookmarks）かどうかを先頭の文字で判定"""
+    try:
+        with open(filepath, 'rb') as f:
+            head = f.read(64)
+    except OSError:
+        return False
+    return head.lstrip(b'\xef\xbb\xbf \t\r\n').startswith(b'{')
+
+
+def webkit_to_unix(values):
+    """WebKit形式（マイクロ秒の文字列）のリストをUnix秒のリストに一括変換（不明な値は None）"""
+    if np is not None and len(values) >= NUMPY_MIN_BATCH:
+        try:
+            raw = np.array([value or '0' for value in values], dtype=np.int64)
+        except (TypeError, ValueError, OverflowError):
+            raw = None
+        if raw is not None:
+            seconds = raw // 1000000 - WEBKIT_EPOCH_OFFSET
+            return [
+                second if micro > 0 else None
+                for micro, second in zip(raw.tolist(), seconds.tolist())
+            ]
+
+    result = []
+    for value in values:
+        try:
+            micro = int(value)
+        except (TypeError, ValueError):
+            micro = 0
+        result.append(micro // 1000000 - WEBKIT_EPOCH_OFFSET if micro > 0 else None)
+    return result
+
+
+def load_roots(filepath):
+    """
+    (ノード, フォルダとして出力するか, 追加の属性リスト) のリストを返す
+    """
+    with open(filepath, 'r', encoding='utf-8-sig') as f:
+        data = json.load(f)
+
+    roots = data.get('roots', {})
+    result = []
+    if 'bookmark_bar' in roots:
+        result.append((roots['bookmark_bar'], True, [('personal_toolbar_folder', 'true')]))
+    if 'other' in roots:
+        result.append((roots['other'], False, []))
+    if roots.get('synced', {}).get('children'):
+        result.append((roots['synced'], True, []))
+    return result
+
+
+def convert_dates(roots):
+    """全ノードの日付をまとめて変換し、id(ノード) -> (add_date, last_modified) を返す"""
+    nodes = collect_nodes(roots)
+    add_dates = webkit_to_unix([node.get('date_added') for node in nodes])
+    modified = webkit_to_unix([node.get('date_modified') for node in nodes])
+    return {id(node): dates for node, dates in zip(nodes, zip(add_dates, modified))}
+
+
+def iter_replay(handler, filepath):
+    """
+    Bookmarks を読み、handler をHTMLエクスポートを解析したときと同じ順序で呼び出す
+    フォルダを1つ閉じるごとに yield する
+    """
+    roots = load_roots(filepath)
+    yield from replay_roots(handler, roots, convert_dates(roots))
+
+
+def iter_chrome_bookmarks(filepath):
+    """ブックマーク（URLを持つノード）を出力順に Bookmark で返す"""
+    roots = load_roots(filepath)
+    return iter_tree_bookmarks(roots, convert_dates(roots))
+
+
+def main():
+    filepath = sys.argv[1] if len(sys.argv) > 1 else default_bookmarks_path()
+    if not os.path.exists(filepath):
+        print(f"Bookmarks が見つかりません: {filepath}")
+        sys.exit(1)
+
+    print(f"📖 読み込み中: {filepath}")
+    bookmarks = list(iter_chrome_bookmarks(filepath))
+    dates = [bm.add_date for bm in bookmarks if bm.add_date is not None]
+
+    print(f"   ブックマーク数: {len(bookmarks):,}")
+    if dates:
+        oldest = datetime.fromtimestamp(min(dates)).strftime('%Y-%m-%d')
+        newest = datetime.fromtimestamp(max(dates)).strftime('%Y-%m-%d')
+        print(f"   追加日: {oldest} 〜 {newest}")
+
+
+if __name__ == '__main__':
+    main()
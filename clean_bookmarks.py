@@ -6,41 +6,36 @@ Chromeブックマーク整理スクリプト
 - カテゴリー整理
 """
 
-import re
+import argparse
+import heapq
 from collections import defaultdict, Counter
+from itertools import groupby
+from operator import itemgetter
 from urllib.parse import urlparse
 import sys
 
-def parse_bookmarks_simple(filepath):
-    """シンプルなブックマークパーサー"""
-    bookmarks = []
-
-    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-        content = f.read()
-
-    # ブックマークを正規表現で抽出
-    pattern = r'<DT><A HREF="([^"]*)"[^>]*>([^<]*)</A>'
-    matches = re.findall(pattern, content)
+from bookmark_model import Bookmark
+from bookmark_stream import iter_bookmarks
+from external_sort import ExternalSorter, format_size, parse_size
+from parse_cache import load_simple_bookmarks
+from seen_index import close_seen_set, open_seen_set
+from url_canon import canonical_key
+from url_classify import classify_url
 
-    for url, title in matches:
-        bookmarks.append({
-            'url': url,
-            'title': title.strip()
-        })
+# url_classify の理由コード -> 怪しいURLの種類（http(s) 以外のスキームはここでは数えず、分析で invalid になる）
+SUSPICIOUS_CATEGORIES = (None, 'empty', 'chrome', 'javascript', 'file', 'localhost', None)
 
-    return bookmarks
-
-def analyze_bookmarks(bookmarks):
-    """ブックマーク分析"""
+def parse_bookmarks_simple(filepath, use_mmap=False):
+    """シンプルなブックマークパーサー"""
+    return list(iter_bookmarks(filepath, use_mmap=use_mmap))
 
-    print(f"\n{'='*70}")
-    print(f"総ブックマーク数: {len(bookmarks)}")
-    print(f"{'='*70}\n")
+def suspicious_category(url):
+    """怪しいURLの種類（empty / chrome / javascript / file / localhost）、問題なければ None"""
+    return SUSPICIOUS_CATEGORIES[classify_url(url)]
 
-    # ドメイン別集計
-    domains = Counter()
-    protocols = Counter()
-    suspicious_count = {
+def new_suspicious_count():
+    """怪しいURLの種類別カウンタを作成"""
+    return {
         'chrome': 0,
         'javascript': 0,
         'file': 0,
@@ -49,52 +44,98 @@ def analyze_bookmarks(bookmarks):
         'invalid': 0
     }
 
-    for bm in bookmarks:
-        url = bm['url']
+def analyze_url(url):
+    """
+    分析用に (怪しいURLの種類, ドメイン, プロトコル, 正規化キー) を返す
+    怪しいURLならドメイン・プロトコルは空、解析できないURLは種類が None でプロトコルが空
+    """
+    key = canonical_key(url)
+    category = suspicious_category(url)
+    if category is not None:
+        return category, '', '', key
+
+    try:
+        parsed = urlparse(url)
+        return None, parsed.netloc, parsed.scheme, key
+    except:
+        return None, '', '', key
+
+class BookmarkAnalyzer:
+    """
+    ブックマークを1件ずつ受け取って分析用に集計する（URLだけを見る）
+    重複は正規化キー（url_canon.canonical_key）ごとに数える
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.url_count = Counter()
+        self.domains = Counter()
+        self.protocols = Counter()
+        self.suspicious_count = new_suspicious_count()
+
+    def add(self, url):
+        self.add_info(analyze_url(url))
+
+    def add_info(self, info):
+        """analyze_url(url) の結果を使って集計（結果を使い回す場合）"""
+        category, domain, protocol, key = info
+        self.total += 1
+        self.url_count[key] += 1
 
         # 怪しいURLチェック
-        if not url or url.strip() == '':
-            suspicious_count['empty'] += 1
-            continue
-
-        if url.startswith('chrome://') or url.startswith('chrome-extension://'):
-            suspicious_count['chrome'] += 1
-            continue
+        if category is not None:
+            self.suspicious_count[category] += 1
+            return
+
+        if domain:
+            self.domains[domain] += 1
+        if protocol:
+            self.protocols[protocol] += 1
+        else:
+            self.suspicious_count['invalid'] += 1
+
+    def report(self):
+        """分析結果を表示し、(ドメイン別件数, 怪しいURLの内訳, 重複URL) を返す"""
+
+        # 重複検出
+        duplicates = {url: count for url, count in self.url_count.items() if count > 1}
+
+        print_analysis(
+            self.total,
+            self.domains.most_common(30),
+            self.protocols.most_common(),
+            self.suspicious_count,
+            len(duplicates),
+            sum(duplicates.values()) - len(duplicates),
+            sorted(duplicates.items(), key=lambda x: x[1], reverse=True)[:20]
+        )
+
+        return self.domains, self.suspicious_count, duplicates
 
-        if url.startswith('javascript:'):
-            suspicious_count['javascript'] += 1
-            continue
+def analyze_bookmarks(bookmarks):
+    """ブックマーク分析（リストでもジェネレーターでも1パスで集計）"""
 
-        if url.startswith('file://'):
-            suspicious_count['file'] += 1
-            continue
+    analyzer = BookmarkAnalyzer()
+    for bm in bookmarks:
+        analyzer.add(bm['url'])
+    return analyzer.report()
 
-        if 'localhost' in url or '127.0.0.1' in url:
-            suspicious_count['localhost'] += 1
-            continue
+def print_analysis(total, top_domains, protocols, suspicious_count,
+                   duplicate_urls, duplicate_total, top_duplicates):
+    """分析結果を表示"""
 
-        try:
-            parsed = urlparse(url)
-            domain = parsed.netloc
-            protocol = parsed.scheme
-
-            if domain:
-                domains[domain] += 1
-            if protocol:
-                protocols[protocol] += 1
-            else:
-                suspicious_count['invalid'] += 1
-        except:
-            suspicious_count['invalid'] += 1
+    print(f"\n{'='*70}")
+    print(f"総ブックマーク数: {total}")
+    print(f"{'='*70}\n")
 
     # トップドメイン表示
     print("\n【トップ30ドメイン】")
-    for domain, count in domains.most_common(30):
+    for domain, count in top_domains:
         print(f"  {count:5d} : {domain}")
 
     # プロトコル別
     print("\n【プロトコル別】")
-    for proto, count in protocols.most_common():
+    for proto, count in protocols:
         print(f"  {proto:15s} : {count:5d}")
 
     # 怪しいURL
@@ -105,34 +146,19 @@ def analyze_bookmarks(bookmarks):
             print(f"  {category:15s} : {count:5d}個")
     print(f"\n  合計削除候補: {total_suspicious}個")
 
-    # 重複検出
-    url_count = Counter(bm['url'] for bm in bookmarks)
-    duplicates = {url: count for url, count in url_count.items() if count > 1}
-
-    duplicate_total = sum(duplicates.values()) - len(duplicates)
-
     print(f"\n【重複URL】")
-    print(f"  重複しているユニークURL数: {len(duplicates)}")
+    print(f"  重複しているユニークURL数: {duplicate_urls}")
     print(f"  削除可能な重複数: {duplicate_total}個")
 
-    if duplicates:
+    if top_duplicates:
         print(f"\n  トップ20重複URL:")
-        for url, count in sorted(duplicates.items(), key=lambda x: x[1], reverse=True)[:20]:
+        for url, count in top_duplicates:
             url_display = url[:65] if len(url) > 65 else url
             print(f"    {count:3d}回 : {url_display}")
 
-    return domains, suspicious_count, duplicates
-
-def clean_bookmarks(bookmarks, remove_duplicates=True, remove_suspicious=True):
-    """ブックマークをクリーニング"""
-
-    print(f"\n{'='*70}")
-    print("ブックマーククリーニング開始...")
-    print(f"{'='*70}\n")
-
-    seen_urls = set()
-    cleaned = []
-    removed_count = {
+def new_removed_count():
+    """削除内訳カウンタを作成"""
+    return {
         'duplicate': 0,
         'chrome': 0,
         'javascript': 0,
@@ -142,44 +168,47 @@ def clean_bookmarks(bookmarks, remove_duplicates=True, remove_suspicious=True):
         'invalid': 0
     }
 
+def iter_clean_bookmarks(bookmarks, removed_count, remove_duplicates=True, remove_suspicious=True,
+                         seen_urls=None, key=canonical_key):
+    """
+    ブックマークを1件ずつクリーニングするジェネレーター
+    削除した件数は removed_count に加算する
+    重複は key(URL)（既定は正規化キー）が同じものを重複とみなし、最初の1件を残す
+    seen_urls を渡すと、重複判定に使ったキーをそこに溜める（複数回に分けて呼ぶ場合に共有する）
+    """
+
+    if seen_urls is None:
+        seen_urls = set()
+
     for bm in bookmarks:
         url = bm['url']
+        category = suspicious_category(url)
 
         # 空URLチェック
-        if not url or url.strip() == '':
+        if category == 'empty':
             if remove_suspicious:
                 removed_count['empty'] += 1
                 continue
 
         # 重複チェック
         if remove_duplicates:
-            if url in seen_urls:
+            url_key = key(url)
+            if url_key in seen_urls:
                 removed_count['duplicate'] += 1
                 continue
-            seen_urls.add(url)
+            seen_urls.add(url_key)
 
         # 怪しいURLチェック
-        if remove_suspicious:
-            if url.startswith('chrome://') or url.startswith('chrome-extension://'):
-                removed_count['chrome'] += 1
-                continue
-
-            if url.startswith('javascript:'):
-                removed_count['javascript'] += 1
-                continue
-
-            if url.startswith('file://'):
-                removed_count['file'] += 1
-                continue
-
-            if 'localhost' in url or '127.0.0.1' in url:
-                removed_count['localhost'] += 1
-                continue
+        if remove_suspicious and category is not None and category != 'empty':
+            removed_count[category] += 1
+            continue
 
         # 有効なブックマーク
-        cleaned.append(bm)
+        yield bm
+
+def print_clean_summary(removed_count, kept_count):
+    """クリーニング結果を表示"""
 
-    # 結果表示
     print("【削除内訳】")
     for category, count in removed_count.items():
         if count > 0:
@@ -187,15 +216,29 @@ def clean_bookmarks(bookmarks, remove_duplicates=True, remove_suspicious=True):
 
     total_removed = sum(removed_count.values())
     print(f"\n  合計削除数: {total_removed}個")
-    print(f"  残存ブックマーク数: {len(cleaned)}個")
-    print(f"  削減率: {total_removed / len(bookmarks) * 100:.1f}%")
+    print(f"  残存ブックマーク数: {kept_count}個")
+    print(f"  削減率: {total_removed / (total_removed + kept_count) * 100:.1f}%")
 
-    return cleaned, removed_count
+def clean_bookmarks(bookmarks, remove_duplicates=True, remove_suspicious=True):
+    """ブックマークをクリーニング"""
 
-def save_cleaned_bookmarks(bookmarks, output_file):
-    """クリーニングされたブックマークを保存"""
+    print(f"\n{'='*70}")
+    print("ブックマーククリーニング開始...")
+    print(f"{'='*70}\n")
+
+    removed_count = new_removed_count()
+    cleaned = list(iter_clean_bookmarks(
+        bookmarks,
+        removed_count,
+        remove_duplicates=remove_duplicates,
+        remove_suspicious=remove_suspicious
+    ))
+
+    print_clean_summary(removed_count, len(cleaned))
+
+    return cleaned, removed_count
 
-    html_header = '''<!DOCTYPE NETSCAPE-Bookmark-file-1>
+CLEANED_HTML_HEADER = '''<!DOCTYPE NETSCAPE-Bookmark-file-1>
 <!-- This is an automatically generated file.
      It will be read and overwritten.
      DO NOT EDIT! -->
@@ -207,23 +250,166 @@ def save_cleaned_bookmarks(bookmarks, output_file):
     <DL><p>
 '''
 
-    html_footer = '''    </DL><p>
+CLEANED_HTML_FOOTER = '''    </DL><p>
 </DL><p>
 '''
 
+def escape_cleaned(url, title):
+    """整理済みファイルに書き出すときの (URL, タイトル) の表記"""
+    return url.replace('"', '&quot;'), title.replace('<', '&lt;').replace('>', '&gt;')
+
+def format_cleaned_line(url, title):
+    """escape_cleaned 済みの URL・タイトルから整理済みファイルの1行を作る"""
+    return f'        <DT><A HREF="{url}">{title}</A>\n'
+
+def save_cleaned_bookmarks(bookmarks, output_file):
+    """クリーニングされたブックマークを保存"""
+
+    count = 0
     with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(html_header)
+        f.write(CLEANED_HTML_HEADER)
 
         for bm in bookmarks:
-            url = bm['url'].replace('"', '&quot;')
-            title = bm['title'].replace('<', '&lt;').replace('>', '&gt;')
-            f.write(f'        <DT><A HREF="{url}">{title}</A>\n')
+            f.write(format_cleaned_line(*escape_cleaned(bm['url'], bm['title'])))
+            count += 1
 
-        f.write(html_footer)
+        f.write(CLEANED_HTML_FOOTER)
 
     print(f"\n整理済みブックマークを保存: {output_file}")
+    return count
+
+def clean_external(input_file, output_file, memory_budget):
+    """
+    外部メモリモード: ブックマークを (正規化キー, 出現順, URL, タイトル) のレコードとして外部ソートし、
+    同じキーのまとまりごとに分析・クリーニングする
+    ドメイン別集計と出力順の復元も外部ソートで行うため、使用メモリは memory_budget 程度に収まる
+    （キー順の併合中にドメイン順・出現順のソートが同時に溜まるので、それぞれ予算の1/3ずつ使う）
+    表示・出力はメモリ上で処理した場合（analyze_bookmarks / iter_clean_bookmarks）と同じ
+    (総数, 残存数, 削除内訳) を返す
+    """
+
+    budget = memory_budget // 3
+    by_key = ExternalSorter(budget)
+    for seq, bm in enumerate(iter_bookmarks(input_file, use_mmap=True)):
+        by_key.add((canonical_key(bm.url), seq, bm.url, bm.title))
+    total = by_key.count
+
+    by_domain = ExternalSorter(budget)
+    kept = ExternalSorter(budget)
+    # プロトコル -> [件数, 最初の出現順]（種類は少ないのでメモリ上で数える）
+    protocols = {}
+    suspicious_count = new_suspicious_count()
+    removed = new_removed_count()
+    duplicate_urls = 0
+    duplicate_total = 0
+    # 重複数トップ20（同数なら先に出現したキーを優先）
+    top_duplicates = []
+
+    for key, group in groupby(by_key.sorted(), key=itemgetter(0)):
+        count = 0
+        # 表記の違うURLがまとまるので、分析は1件ずつ行う
+        for _, seq, url, title in group:
+            category = suspicious_category(url)
+            if count == 0:
+                first_seq, first_url, first_title, first_category = seq, url, title, category
+            count += 1
+
+            if category is not None:
+                suspicious_count[category] += 1
+                continue
+            try:
+                parsed = urlparse(url)
+                if parsed.netloc:
+                    by_domain.add((parsed.netloc, seq, 1))
+                if parsed.scheme:
+                    entry = protocols.setdefault(parsed.scheme, [0, seq])
+                    entry[0] += 1
+                    entry[1] = min(entry[1], seq)
+                else:
+                    suspicious_count['invalid'] += 1
+            except:
+                suspicious_count['invalid'] += 1
+
+        if count > 1:
+            duplicate_urls += 1
+            duplicate_total += count - 1
+            item = (count, -first_seq, key)
+            if len(top_duplicates) < 20:
+                heapq.heappush(top_duplicates, item)
+            else:
+                heapq.heappushpop(top_duplicates, item)
+
+        # クリーニング（最初の1件だけを残す候補にする）
+        if first_category == 'empty':
+            removed['empty'] += count
+            continue
+        removed['duplicate'] += count - 1
+        if first_category is not None:
+            removed[first_category] += 1
+            continue
+        kept.add((first_seq, first_url, first_title))
+
+    # ドメインごとに合計（同数なら先に出現したドメインを優先）
+    top_domains = heapq.nlargest(30, _sum_domain_groups(by_domain), key=lambda x: (x[1], -x[2]))
+
+    print_analysis(
+        total,
+        [(domain, count) for domain, count, _ in top_domains],
+        [(proto, count) for proto, (count, _) in
+         sorted(protocols.items(), key=lambda x: (-x[1][0], x[1][1]))],
+        suspicious_count,
+        duplicate_urls,
+        duplicate_total,
+        [(url, count) for count, _, url in sorted(top_duplicates, reverse=True)]
+    )
+
+    # 残すブックマークを元の順序に戻して保存
+    print(f"\n[2/2] ブックマークをクリーニングしながら保存中...")
+    kept_count = save_cleaned_bookmarks(
+        (Bookmark(url, title) for _, url, title in kept.sorted()),
+        output_file
+    )
+    print_clean_summary(removed, kept_count)
+    return total, kept_count, removed
+
+def _sum_domain_groups(by_domain):
+    """(ドメイン, 最初の出現順, 件数) のソート済みレコードをドメインごとの (ドメイン, 合計, 最初の出現順) にする"""
+    for domain, records in groupby(by_domain.sorted(), key=itemgetter(0)):
+        count = 0
+        first_seq = None
+        for _, seq, n in records:
+            count += n
+            if first_seq is None:
+                first_seq = seq
+        yield domain, count, first_seq
+
+def save_cleaning_report(report_file, total_count, kept_count, removed):
+    """整理レポートを保存"""
+    with open(report_file, 'w', encoding='utf-8') as f:
+        f.write(f"ブックマーク整理レポート\n")
+        f.write(f"{'='*70}\n\n")
+        f.write(f"元のブックマーク数: {total_count}\n")
+        f.write(f"整理後のブックマーク数: {kept_count}\n")
+        f.write(f"削除数: {sum(removed.values())}\n")
+        f.write(f"削減率: {sum(removed.values()) / total_count * 100:.1f}%\n\n")
+        f.write(f"削除内訳:\n")
+        for category, count in removed.items():
+            f.write(f"  {category}: {count}個\n")
 
 def main():
+    parser = argparse.ArgumentParser(description='Chromeブックマーク整理スクリプト')
+    parser.add_argument('--memory-budget', type=parse_size,
+                        help='外部メモリモードで処理する（一時ファイルを使い、メモリ使用量をこの値程度に抑える。例: 512M）')
+    parser.add_argument('--seen-db',
+                        help='重複判定に SQLite のファイルを使い、--record-seen で記録した以前の実行のURLも重複として除く')
+    parser.add_argument('--record-seen', action='store_true',
+                        help='この実行で見たURLを --seen-db に記録する（次回以降の整理済みファイルには、それ以前に記録していないURLだけが残る）')
+    args = parser.parse_args()
+    if args.memory_budget and args.seen_db:
+        parser.error('--seen-db は --memory-budget と同時に指定できません')
+    if args.record_seen and not args.seen_db:
+        parser.error('--record-seen には --seen-db が必要です')
+
     input_file = 'bookmarks_2025_12_31.html'
     output_file = 'bookmarks_cleaned.html'
     report_file = 'bookmark_cleaning_report.txt'
@@ -232,37 +418,41 @@ def main():
     print("Chromeブックマーク整理スクリプト")
     print("="*70)
 
-    # パース
-    print(f"\n[1/4] ブックマークファイルを読み込み中: {input_file}")
-    bookmarks = parse_bookmarks_simple(input_file)
-
-    # 分析
-    print(f"\n[2/4] ブックマークを分析中...")
-    domains, suspicious, duplicates = analyze_bookmarks(bookmarks)
-
-    # クリーニング
-    print(f"\n[3/4] ブックマークをクリーニング中...")
-    cleaned_bookmarks, removed = clean_bookmarks(
-        bookmarks,
-        remove_duplicates=True,
-        remove_suspicious=True
-    )
-
-    # 保存
-    print(f"\n[4/4] 整理済みブックマークを保存中...")
-    save_cleaned_bookmarks(cleaned_bookmarks, output_file)
+    if args.memory_budget:
+        # 外部メモリモード（巨大なアーカイブ向け）
+        print(f"\n[1/2] 外部メモリモードで読み込んで分析中: {input_file}"
+              f"（メモリ予算 {format_size(args.memory_budget)}）")
+        total_count, kept_count, removed = clean_external(input_file, output_file, args.memory_budget)
+    else:
+        # パース・分析（解析結果キャッシュがあれば使い、なければリストを作らずにストリーミングで2回読む）
+        print(f"\n[1/2] ブックマークファイルを読み込みながら分析中: {input_file}")
+        bookmarks = load_simple_bookmarks(input_file)
+        domains, suspicious, duplicates = analyze_bookmarks(
+            bookmarks if bookmarks is not None else iter_bookmarks(input_file)
+        )
+
+        # クリーニングしながら保存
+        print(f"\n[2/2] ブックマークをクリーニングしながら保存中...")
+        removed = new_removed_count()
+        seen_urls = open_seen_set(args.seen_db)
+        try:
+            cleaned_bookmarks = iter_clean_bookmarks(
+                bookmarks if bookmarks is not None else iter_bookmarks(input_file),
+                removed,
+                remove_duplicates=True,
+                remove_suspicious=True,
+                seen_urls=seen_urls
+            )
+            kept_count = save_cleaned_bookmarks(cleaned_bookmarks, output_file)
+            # 整理済みファイルを書き終えてから記録する
+            close_seen_set(seen_urls, commit=args.record_seen)
+        finally:
+            close_seen_set(seen_urls)
+        print_clean_summary(removed, kept_count)
+        total_count = kept_count + sum(removed.values())
 
     # レポート保存
-    with open(report_file, 'w', encoding='utf-8') as f:
-        f.write(f"ブックマーク整理レポート\n")
-        f.write(f"{'='*70}\n\n")
-        f.write(f"元のブックマーク数: {len(bookmarks)}\n")
-        f.write(f"整理後のブックマーク数: {len(cleaned_bookmarks)}\n")
-        f.write(f"削除数: {sum(removed.values())}\n")
-        f.write(f"削減率: {sum(removed.values()) / len(bookmarks) * 100:.1f}%\n\n")
-        f.write(f"削除内訳:\n")
-        for category, count in removed.items():
-            f.write(f"  {category}: {count}個\n")
+    save_cleaning_report(report_file, total_count, kept_count, removed)
 
     print(f"\nレポートを保存: {report_file}")
     print(f"\n{'='*70}")
@@ -10,6 +10,9 @@ import re
 from html.parser import HTMLParser
 from datetime import datetime
 
+from bookmark_model import Bookmark, FolderTable
+from bookmark_stream import feed_file
+
 
 class BookmarkParser(HTMLParser):
     """
@@ -19,6 +22,7 @@ class BookmarkParser(HTMLParser):
     def __init__(self):
         super().__init__()
         self.bookmarks = []
+        self.folders = FolderTable()
         self.current_folder = []
         self.folder_stack = []
         self.in_dl = 0
@@ -60,39 +64,37 @@ class BookmarkParser(HTMLParser):
         elif tag == 'a':
             self.in_a = False
             if self.current_text and self.current_url:
-                folder_path = ' > '.join(self.current_folder) if self.current_folder else 'ルート'
-                self.bookmarks.append({
-                    'folder': folder_path,
-                    'name': self.current_text.strip(),
-                    'url': self.current_url,
-                    'level': len(self.current_folder)
-                })
+                self.bookmarks.append(Bookmark(
+                    url=self.current_url,
+                    title=self.current_text.strip(),
+                    folder_id=self.folders.intern(self.current_folder),
+                    folders=self.folders,
+                    level=len(self.current_folder)
+                ))
 
     def handle_data(self, data):
         if self.in_h3 or self.in_a:
             self.current_text += data
 
 
-def parse_bookmarks(html_content):
-    """
-    ブックマークHTMLをパースして階層構造を抽出
-    """
-    parser = BookmarkParser()
-    parser.feed(html_content)
-    return parser.bookmarks
-
-
 def build_folder_tree(bookmarks):
     """
     ブックマークからフォルダツリーを構築
+    フォルダIDでまとめ、表示用のパスはフォルダごとに1回だけ作る
     """
-    folders = {}
+    by_id = {}
+    table = None
 
     for bookmark in bookmarks:
-        folder_path = bookmark['folder']
-        if folder_path not in folders:
-            folders[folder_path] = []
-        folders[folder_path].append(bookmark)
+        table = bookmark.folders
+        if bookmark.folder_id not in by_id:
+            by_id[bookmark.folder_id] = []
+        by_id[bookmark.folder_id].append(bookmark)
+
+    folders = {}
+    for folder_id, items in by_id.items():
+        folder_path = table.path(folder_id, ' > ') or 'ルート'
+        folders.setdefault(folder_path, []).extend(items)
 
     return folders
 
@@ -442,12 +444,8 @@ def create_viewer_html(bookmark_file, output_file):
     """
     ブックマークビューアHTMLを生成
     """
-    # ブックマークHTMLを読み込み
-    with open(bookmark_file, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    # パース
-    bookmarks = parse_bookmarks(content)
+    # ブックマークHTMLをチャンク単位でパース
+    bookmarks = feed_file(BookmarkParser(), bookmark_file).bookmarks
     folders = build_folder_tree(bookmarks)
 
     # HTML生成
@@ -5,10 +5,23 @@
 元のフォルダ構造を保持したまま、ツリー形式で表示します。
 """
 
+import marshal
+import os
 import re
 from html.parser import HTMLParser
 from datetime import datetime
 
+from bookmark_model import Bookmark, FolderTable
+from flat_tree import BOOKMARK, FOLDER, FlatTree
+from parallel_parse import parse_file_parallel
+from parse_cache import decode_folder_table, encode_folder_table, file_digest
+
+# 前回の各フォルダのハッシュとHTMLを出力ファイルの隣（<出力ファイル>.subtrees）に保存する
+SUBTREE_CACHE_SUFFIX = '.subtrees'
+SUBTREE_CACHE_MAGIC = 'hierarchical-viewer-subtrees'
+# 保存する形式を変えたら上げる
+SUBTREE_CACHE_VERSION = 1
+
 
 class HierarchicalBookmarkParser(HTMLParser):
     """
@@ -59,12 +72,11 @@ class HierarchicalBookmarkParser(HTMLParser):
 
         elif tag == 'a':
             self.in_a = False
-            bookmark = {
-                'type': 'bookmark',
-                'name': self.current_text.strip(),
-                'url': self.current_attrs.get('href', ''),
-                'level': len(self.current_path) - 1
-            }
+            bookmark = Bookmark(
+                url=self.current_attrs.get('href', ''),
+                title=self.current_text.strip(),
+                level=len(self.current_path) - 1
+            )
             self.current_path[-1]['children'].append(bookmark)
 
         elif tag == 'dl':
@@ -76,6 +88,94 @@ class HierarchicalBookmarkParser(HTMLParser):
         if self.in_h3 or self.in_a:
             self.current_text += data
 
+    def assign_hashes(self, flat=None, hashes=None):
+        """
+        解析後のツリーの各フォルダに部分木のハッシュ（'hash'、16進文字列）を付け、ルートのハッシュを返す
+        並列解析では範囲ごとの結果をつなぎ合わせた後でないと確定しないため、解析の最後にまとめて計算する
+        フォルダ名の提案（analyze_folder_names）などで手を加える前に呼ぶ
+        flat.subtree_hashes() を計算済みなら hashes に渡す
+        """
+        if flat is None:
+            flat = FlatTree.from_nested(self.tree)
+        if hashes is None:
+            hashes = flat.subtree_hashes()
+        for node, node_kind, digest in zip(flat.nodes, flat.kind, hashes):
+            if node_kind == FOLDER:
+                node['hash'] = digest.hex()
+        return hashes[0].hex()
+
+
+class SubtreeCache:
+    """
+    前回作ったビューアのツリー部分と、各フォルダの部分木のハッシュ
+    フォルダは FolderTable のID（(親のID, 名前) の連なり）で表し、hashes・spans はIDごとの
+    部分木のハッシュと、html の中の (開始, 終了)（区別できないフォルダは None）
+    """
+
+    def __init__(self, root_hash, folders, hashes, spans, html):
+        self.root_hash = root_hash
+        self.folders = folders
+        self.hashes = hashes
+        self.spans = spans
+        self.html = html
+
+    @classmethod
+    def build(cls, flat, hashes, spans, html):
+        folders, ids = flat.folder_ids()
+        folder_hashes = [None] * len(folders)
+        folder_spans = [None] * len(folders)
+        for i, folder_id in enumerate(ids):
+            if folder_id is not None:
+                folder_hashes[folder_id] = hashes[i]
+                folder_spans[folder_id] = spans.get(i)
+        return cls(hashes[0], folders, folder_hashes, folder_spans, html)
+
+    def match(self, flat):
+        """flat の各ノードに対応する前回のフォルダID（フォルダ以外・前回なかったものは None）"""
+        _, ids = flat.folder_ids()
+        old_ids = [None] * len(flat)
+        old_ids[0] = FolderTable.ROOT
+        for i in range(1, len(flat)):
+            parent_id = old_ids[flat.parent[i]]
+            if ids[i] is not None and parent_id is not None:
+                old_ids[i] = self.folders.ids.get((parent_id, flat.nodes[i].get('name') or ''))
+        return old_ids
+
+    @staticmethod
+    def fingerprint():
+        """このスクリプトのハッシュ（HTMLの作り方が変わったら前回の結果は使わない）"""
+        return file_digest(__file__)
+
+    @classmethod
+    def load(cls, output_file):
+        """前回の結果（出力ファイルがないか、保存した結果が使えなければ None）"""
+        if not os.path.exists(output_file):
+            return None
+        try:
+            with open(output_file + SUBTREE_CACHE_SUFFIX, 'rb') as f:
+                if marshal.load(f) != (SUBTREE_CACHE_MAGIC, SUBTREE_CACHE_VERSION, cls.fingerprint()):
+                    return None
+                root_hash, table, hashes, spans, html = marshal.loads(f.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        return cls(root_hash, decode_folder_table(table), hashes, spans, html)
+
+    def save(self, output_file):
+        """保存する（書き込めない場合は何もしない）"""
+        path = output_file + SUBTREE_CACHE_SUFFIX
+        tmp_path = path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                marshal.dump((SUBTREE_CACHE_MAGIC, SUBTREE_CACHE_VERSION, self.fingerprint()), f)
+                marshal.dump((self.root_hash, encode_folder_table(self.folders),
+                              self.hashes, self.spans, self.html), f)
+            os.replace(tmp_path, path)
+        except (OSError, ValueError):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
 
 def analyze_folder_names(tree):
     """
@@ -159,65 +259,96 @@ def suggest_folder_name(bookmarks):
     return None
 
 
-def generate_html_tree_hierarchical(node, level=0):
-    """
-    正しい階層構造でHTMLツリーを生成
-    """
-    html = []
-
-    if node['type'] == 'folder':
-        folder_name = node.get('suggested_name', node.get('name', 'フォルダ'))
-        original_name = node.get('name', '')
-
-        if original_name in ['新しいフォルダ', '仮置き', '名前のないフォルダ', '']:
-            display_name = f"{folder_name} <span style='color:#999;font-size:0.8em;'>(元: {original_name})</span>"
-        else:
-            display_name = folder_name
-
-        children = node.get('children', [])
-        bookmark_count = count_items(children)
-
-        if children:  # 空フォルダは表示しない
-            folder_id = f"folder_{abs(hash(folder_name + str(level)))}"
-
-            html.append(f'<div class="folder level-{level}">')
-            html.append(f'  <div class="folder-header" onclick="toggleFolder(\'{folder_id}\')">')
-            html.append(f'    <span class="folder-icon">📁</span>')
-            html.append(f'    <span class="folder-name">{display_name}</span>')
-            html.append(f'    <span class="bookmark-count">({bookmark_count} items)</span>')
-            html.append(f'  </div>')
-            html.append(f'  <div class="folder-content" id="{folder_id}">')
+def folder_header_html(node, level, bookmark_count):
+    """フォルダの見出しと、子要素を入れる枠の開始タグ（行のリスト）"""
+    folder_name = node.get('suggested_name', node.get('name', 'フォルダ'))
+    original_name = node.get('name', '')
 
-            # 子要素を再帰的に生成
-            for child in children:
-                html.append(generate_html_tree_hierarchical(child, level + 1))
-
-            html.append(f'  </div>')
-            html.append(f'</div>')
-
-    elif node['type'] == 'bookmark':
-        safe_url = node['url'].replace('"', '&quot;')
-        safe_name = node['name'].replace('<', '&lt;').replace('>', '&gt;')
-
-        html.append(f'<div class="bookmark level-{level}">')
-        html.append(f'  <span class="bookmark-icon">🔖</span>')
-        html.append(f'  <a href="{safe_url}" target="_blank" class="bookmark-link">{safe_name}</a>')
-        html.append(f'</div>')
-
-    return '\n'.join(html)
-
-
-def count_items(children):
+    if original_name in ['新しいフォルダ', '仮置き', '名前のないフォルダ', '']:
+        display_name = f"{folder_name} <span style='color:#999;font-size:0.8em;'>(元: {original_name})</span>"
+    else:
+        display_name = folder_name
+
+    folder_id = f"folder_{abs(hash(folder_name + str(level)))}"
+    return [
+        f'<div class="folder level-{level}">',
+        f'  <div class="folder-header" onclick="toggleFolder(\'{folder_id}\')">',
+        f'    <span class="folder-icon">📁</span>',
+        f'    <span class="folder-name">{display_name}</span>',
+        f'    <span class="bookmark-count">({bookmark_count} items)</span>',
+        f'  </div>',
+        f'  <div class="folder-content" id="{folder_id}">',
+    ]
+
+
+def bookmark_html(node, level):
+    safe_url = node['url'].replace('"', '&quot;')
+    safe_name = node['name'].replace('<', '&lt;').replace('>', '&gt;')
+    return '\n'.join([
+        f'<div class="bookmark level-{level}">',
+        f'  <span class="bookmark-icon">🔖</span>',
+        f'  <a href="{safe_url}" target="_blank" class="bookmark-link">{safe_name}</a>',
+        f'</div>',
+    ])
+
+
+def generate_html_tree_hierarchical(flat, counts, previous=None, hashes=None):
     """
-    フォルダ内のアイテム数をカウント（再帰的）
+    正しい階層構造でHTMLツリーを生成（ルートの子から）
+    counts は各ノードの部分木のブックマーク数（ノード番号順）
+    previous（前回の SubtreeCache）と hashes（各ノードの部分木のハッシュ）があれば、
+    前回とハッシュが同じフォルダは作り直さずに前回のHTMLをそのまま使う
+    (HTML, ノード番号 -> HTML内の (開始, 終了) の辞書（フォルダのみ）, 再利用したフォルダ数) を返す
     """
-    count = 0
-    for child in children:
-        if child['type'] == 'bookmark':
-            count += 1
-        elif child['type'] == 'folder':
-            count += count_items(child.get('children', []))
-    return count
+    parts = []
+    spans = {}
+    position = 0
+    reused = 0
+    old_ids = previous.match(flat) if previous is not None else None
+    sizes = flat.subtree_sizes() if previous is not None else None
+
+    def emit(text):
+        nonlocal position
+        parts.append(text)
+        position += len(text)
+
+    def reuse(i):
+        """前回のHTMLを使えたら True（子孫のフォルダの範囲も前回からずらして記録する）"""
+        old_id = old_ids[i]
+        if old_id is None or previous.spans[old_id] is None or previous.hashes[old_id] != hashes[i]:
+            return False
+        old_start, old_end = previous.spans[old_id]
+        start = position
+        emit(previous.html[old_start:old_end])
+        for j in range(i, i + sizes[i]):
+            old_span = previous.spans[old_ids[j]] if old_ids[j] is not None else None
+            if old_span is not None:
+                spans[j] = (start + old_span[0] - old_start, start + old_span[1] - old_start)
+        return True
+
+    def render(i, level):
+        nonlocal reused
+        node = flat.nodes[i]
+        if flat.kind[i] == FOLDER:
+            if old_ids is not None and reuse(i):
+                reused += 1
+                return
+            start = position
+            children = list(flat.children(i))
+            if children:  # 空フォルダは表示しない
+                emit('\n'.join(folder_header_html(node, level, counts[i])) + '\n')
+                # 子要素を再帰的に生成
+                for child in children:
+                    render(child, level + 1)
+                    emit('\n')
+                emit('  </div>\n</div>')
+            spans[i] = (start, position)
+        elif flat.kind[i] == BOOKMARK:
+            emit(bookmark_html(node, level))
+
+    for child in flat.children(0):
+        render(child, 0)
+    return ''.join(parts), spans, reused
 
 
 def count_all_bookmarks(tree):
@@ -250,25 +381,34 @@ def create_hierarchical_viewer(input_file, output_file):
     """
     print("📖 ブックマークファイルを読み込んでいます...")
 
-    with open(input_file, 'r', encoding='utf-8') as f:
-        content = f.read()
-
     print("🔍 階層構造を解析しています...")
-    parser = HierarchicalBookmarkParser()
-    parser.feed(content)
+    parser = parse_file_parallel(HierarchicalBookmarkParser, input_file)
 
     tree = parser.tree
 
+    # 部分木のブックマーク数とハッシュは配列表現でまとめて計算（ハッシュは解析したままのツリーから）
+    flat = FlatTree.from_nested(tree)
+    counts = flat.subtree_counts(BOOKMARK)
+    hashes = flat.subtree_hashes()
+    parser.assign_hashes(flat, hashes)
+
+    # ツリー全体のハッシュが前回と同じなら、ビューアの内容も同じなので作り直さない
+    previous = SubtreeCache.load(output_file)
+    if previous is not None and previous.root_hash == hashes[0]:
+        print(f"\n✅ 前回から変更がないため作り直しません: {output_file}")
+        print(f"   - ツリーのハッシュ: {tree['hash']}")
+        return
+
     print("🏷️  フォルダ名を分析しています...")
     analyze_folder_names(tree)
 
     print("📝 HTMLを生成しています...")
-    tree_html = ''
-    for child in tree.get('children', []):
-        tree_html += generate_html_tree_hierarchical(child)
+    tree_html, spans, reused = generate_html_tree_hierarchical(flat, counts, previous, hashes)
+    if reused:
+        print(f"   前回から変わっていない {reused}個のフォルダはそのまま使いました")
 
-    total_bookmarks = count_all_bookmarks(tree)
-    total_folders = count_all_folders(tree) - 1  # root除く
+    total_bookmarks = flat.count(BOOKMARK)
+    total_folders = flat.count(FOLDER) - 1  # root除く
 
     # 完全なHTMLページを生成
     html_template = f"""<!DOCTYPE html>
@@ -597,11 +737,13 @@ def create_hierarchical_viewer(input_file, output_file):
 
     with open(output_file, 'w', encoding='utf-8') as f:
         f.write(html_template)
+    SubtreeCache.build(flat, hashes, spans, tree_html).save(output_file)
 
     print(f"\n✅ ブックマークビューアを生成しました: {output_file}")
     print(f"📊 統計:")
     print(f"   - フォルダ数: {total_folders}")
     print(f"   - ブックマーク数: {total_bookmarks}")
+    print(f"   - ツリーのハッシュ: {tree['hash']}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+メモリに収まらない件数のレコードを並べ替える外部ソート
+レコード（文字列・整数のタプル）をメモリ予算の分だけ溜めてはソートして一時ファイルに書き出し（ラン）、
+最後にランを heapq.merge で併合しながら順に返す
+
+予算内に収まった場合は一時ファイルを使わずにメモリ上でソートする
+"""
+
+import heapq
+import marshal
+import re
+import sys
+import tempfile
+
+# 既定のメモリ予算
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+# 一時ファイルに1回で書き出すブロックのおおよそのバイト数（読み出しもこの単位）
+RUN_BLOCK_BYTES = 64 * 1024
+
+# 一度に併合するランの最大数（超える場合は段階的に併合する）
+MAX_MERGE_FAN_IN = 64
+
+SIZE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$', re.IGNORECASE)
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_size(text):
+    """'512M' や '2G' のようなサイズ指定をバイト数にする"""
+    match = SIZE_PATTERN.match(text)
+    if not match:
+        raise ValueError(f'サイズの指定が正しくありません: {text}')
+    number, unit = match.groups()
+    return int(float(number) * SIZE_UNITS[unit.upper()])
+
+
+def format_size(size):
+    """バイト数を '512MB' のような表記にする"""
+    for unit in ('T', 'G', 'M', 'K'):
+        if size >= SIZE_UNITS[unit]:
+            return f'{size / SIZE_UNITS[unit]:.0f}{unit}B'
+    return f'{size}B'
+
+
+def record_size(record):
+    """メモリ上のレコードのおおよそのバイト数"""
+    return sys.getsizeof(record) + sum(sys.getsizeof(field) for field in record)
+
+
+def _write_run(records, block_records):
+    """ソート済みのレコードをブロック単位で一時ファイルに書き出す"""
+    run = tempfile.TemporaryFile()
+    for i in range(0, len(records), block_records):
+        marshal.dump(records[i:i + block_records], run)
+    run.seek(0)
+    return run
+
+
+def _read_run(run):
+    """一時ファイルのランをブロック単位で読みながら順に返す"""
+    try:
+        while True:
+            try:
+                block = marshal.load(run)
+            except EOFError:
+                return
+            yield from block
+    finally:
+        run.close()
+
+
+class ExternalSorter:
+    """
+    add() でレコードを追加し、sorted() で昇順に取り出す
+    レコードはタプルの自然な順序（先頭の要素から順に比較）で並ぶ
+    """
+
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET):
+        self.memory_budget = memory_budget
+        self.buffer = []
+        self.buffer_size = 0
+        self.runs = []
+        self.count = 0
+        # 1ブロックのレコード数（最初に書き出すときのレコードの平均サイズから決める）
+        self.block_records = None
+
+    def add(self, record):
+        self.buffer.append(record)
+        self.buffer_size += record_size(record)
+        self.count += 1
+        if self.buffer_size >= self.memory_budget:
+            self._spill()
+
+    def extend(self, records):
+        for record in records:
+            self.add(record)
+
+    def _spill(self):
+        if self.block_records is None:
+            average = self.buffer_size / len(self.buffer)
+            self.block_records = max(1, int(RUN_BLOCK_BYTES / average))
+        self.buffer.sort()
+        self.runs.append(_write_run(self.buffer, self.block_records))
+        self.buffer = []
+        self.buffer_size = 0
+
+    def sorted(self):
+        """全レコードを昇順に返す（一度だけ呼べる）"""
+        if not self.runs:
+            records = self.buffer
+            self.buffer = []
+            records.sort()
+            return iter(records)
+
+        if self.buffer:
+            self._spill()
+
+        # ランが多すぎる場合は、まとめて併合したランに置き換える
+        runs = self.runs
+        self.runs = []
+        while len(runs) > MAX_MERGE_FAN_IN:
+            merged = tempfile.TemporaryFile()
+            block = []
+            for record in heapq.merge(*map(_read_run, runs[:MAX_MERGE_FAN_IN])):
+                block.append(record)
+                if len(block) >= self.block_records:
+                    marshal.dump(block, merged)
+                    block = []
+            if block:
+                marshal.dump(block, merged)
+            merged.seek(0)
+            runs = runs[MAX_MERGE_FAN_IN:] + [merged]
+
+        return heapq.merge(*map(_read_run, runs))
+
+    def close(self):
+        """併合せずに終える場合の後始末"""
+        for run in self.runs:
+            run.close()
+        self.runs = []
+        self.buffer = []
+
+
+def external_sort(records, memory_budget=DEFAULT_MEMORY_BUDGET):
+    """records をメモリ予算内で昇順に並べ替えて返す"""
+    sorter = ExternalSorter(memory_budget)
+    sorter.extend(records)
+    return sorter.sorted()
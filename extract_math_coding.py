@@ -5,17 +5,29 @@
 重複を削除
 """
 
+import argparse
 import re
 from html.parser import HTMLParser
 from collections import defaultdict
 
+from bookmark_model import Bookmark
+from bookmark_visitor import BookmarkVisitor, visit_events
+from parse_cache import cached_events
+from seen_index import close_seen_set, open_seen_set
+from url_canon import canonical_key
 
-class MathCodingExtractor(HTMLParser):
+
+class MathCodingExtractor(HTMLParser, BookmarkVisitor):
     """
     元の構造を保持したまま数学・コーディングのフォルダを抽出
+    タグのハンドラで直接解析するほか、ビジターとして共有パーサーのイベントも受け取れる
     """
 
-    def __init__(self):
+    def __init__(self, seen_urls=None):
+        """
+        重複は正規化キー（url_canon.canonical_key）で判定する
+        seen_urls には重複判定の集合（seen_index.SqliteSeenSet など）を渡せる
+        """
         super().__init__()
         self.tree = {'name': 'root', 'type': 'folder', 'children': []}
         self.folder_stack = [self.tree]
@@ -25,7 +37,7 @@ class MathCodingExtractor(HTMLParser):
         self.current_text = ''
         self.current_attrs = {}
         self.pending_dt = None
-        self.seen_urls = set()  # 重複チェック用
+        self.seen_urls = set() if seen_urls is None else seen_urls  # 重複チェック用
         self.stats = {'total_folders': 0, 'kept_folders': 0, 'total_bookmarks': 0, 'kept_bookmarks': 0, 'duplicates': 0}
 
     def is_math_or_coding_folder(self, folder_name):
@@ -138,6 +150,78 @@ class MathCodingExtractor(HTMLParser):
 
         return False
 
+    def open_folder(self, folder_name, attrs_dict):
+        """フォルダに入る（対象外のフォルダは中身ごと無視する）"""
+        self.stats['total_folders'] += 1
+
+        # 数学・コーディング関連フォルダのみ保持
+        if self.is_math_or_coding_folder(folder_name):
+            self.stats['kept_folders'] += 1
+            new_folder = {
+                'type': 'folder',
+                'name': folder_name,
+                'children': [],
+                'attrs': attrs_dict
+            }
+            self.folder_stack[-1]['children'].append(new_folder)
+            self.folder_stack.append(new_folder)
+        else:
+            # このフォルダは無視（NULLフォルダを追加）
+            null_folder = {
+                'type': 'null_folder',
+                'name': folder_name,
+                'children': []
+            }
+            self.folder_stack.append(null_folder)
+
+    def accept_bookmark(self, url, title):
+        """現在のフォルダにブックマークを追加するか判定"""
+        self.stats['total_bookmarks'] += 1
+
+        # 親フォルダがNULLフォルダなら無視
+        if self.folder_stack[-1].get('type') == 'null_folder':
+            return False
+
+        # 重複チェック
+        url_key = canonical_key(url)
+        if url_key in self.seen_urls:
+            self.stats['duplicates'] += 1
+            return False
+
+        # 数学・コーディング関連のみ保持
+        if self.is_math_or_coding_bookmark(url, title):
+            self.seen_urls.add(url_key)
+            self.stats['kept_bookmarks'] += 1
+            return True
+
+        return False
+
+    def close_folder(self):
+        """階層を一つ戻る"""
+        if len(self.folder_stack) > 1:
+            # 空のフォルダは削除
+            current = self.folder_stack.pop()
+            if current.get('type') != 'null_folder' and not current.get('children'):
+                # 親から削除
+                if self.folder_stack:
+                    self.folder_stack[-1]['children'] = [
+                        c for c in self.folder_stack[-1]['children'] if c != current
+                    ]
+
+    # --- 共有パーサーのイベント ---
+
+    def start_folder(self, folder):
+        self.open_folder(folder['name'], folder['attrs'])
+
+    def visit_bookmark(self, bookmark):
+        if self.accept_bookmark(bookmark.url, bookmark.title):
+            self.folder_stack[-1]['children'].append(bookmark)
+
+    def end_folder(self, folder):
+        self.close_folder()
+
+    # --- タグのハンドラ ---
+
     def handle_starttag(self, tag, attrs):
         attrs_dict = dict(attrs)
 
@@ -161,67 +245,19 @@ class MathCodingExtractor(HTMLParser):
     def handle_endtag(self, tag):
         if tag == 'h3':
             self.in_h3 = False
-            folder_name = self.current_text.strip()
-            self.stats['total_folders'] += 1
-
-            # 数学・コーディング関連フォルダのみ保持
-            if self.is_math_or_coding_folder(folder_name):
-                self.stats['kept_folders'] += 1
-                new_folder = {
-                    'type': 'folder',
-                    'name': folder_name,
-                    'children': [],
-                    'attrs': self.current_attrs
-                }
-                self.folder_stack[-1]['children'].append(new_folder)
-                self.folder_stack.append(new_folder)
-            else:
-                # このフォルダは無視（NULLフォルダを追加）
-                null_folder = {
-                    'type': 'null_folder',
-                    'name': folder_name,
-                    'children': []
-                }
-                self.folder_stack.append(null_folder)
+            self.open_folder(self.current_text.strip(), self.current_attrs)
 
         elif tag == 'a':
             self.in_a = False
             url = self.current_attrs.get('href', '')
             title = self.current_text.strip()
-            self.stats['total_bookmarks'] += 1
-
-            # 親フォルダがNULLフォルダなら無視
-            if self.folder_stack[-1].get('type') == 'null_folder':
-                return
-
-            # 重複チェック
-            if url in self.seen_urls:
-                self.stats['duplicates'] += 1
-                return
-
-            # 数学・コーディング関連のみ保持
-            if self.is_math_or_coding_bookmark(url, title):
-                self.seen_urls.add(url)
-                self.stats['kept_bookmarks'] += 1
-                bookmark = {
-                    'type': 'bookmark',
-                    'name': title,
-                    'url': url,
-                    'attrs': self.current_attrs
-                }
+
+            if self.accept_bookmark(url, title):
+                bookmark = Bookmark.from_attrs(self.current_attrs.items(), title=title)
                 self.folder_stack[-1]['children'].append(bookmark)
 
         elif tag == 'dl':
-            # 階層を一つ戻る
-            if len(self.folder_stack) > 1:
-                # 空のフォルダは削除
-                current = self.folder_stack.pop()
-                if current.get('type') != 'null_folder' and not current.get('children'):
-                    # 親から削除
-                    if self.folder_stack:
-                        self.folder_stack[-1]['children'] = [
-                            c for c in self.folder_stack[-1]['children'] if c != current
-                        ]
+            self.close_folder()
 
     def handle_data(self, data):
         if self.in_h3 or self.in_a:
@@ -286,36 +322,66 @@ def generate_html(tree):
     return '\n'.join(lines)
 
 
-def extract_math_coding(input_file, output_file):
+def parse_math_coding(input_file, seen_urls=None):
     """
-    数学・コーディング関連のフォルダのみを抽出
+    抽出結果のツリーと統計を返す
+    解析結果（イベント列）だけをキャッシュし、抽出（と seen_urls による重複判定）は毎回行う
     """
-    print("📖 元のブックマークファイルを読み込んでいます...")
-    with open(input_file, 'r', encoding='utf-8') as f:
-        content = f.read()
+    extractor = MathCodingExtractor(seen_urls)
+    visit_events(cached_events(input_file), [extractor])
+    return extractor.tree, extractor.stats
 
-    print("🔍 数学・コーディング関連を抽出中...")
-    extractor = MathCodingExtractor()
-    extractor.feed(content)
 
+def save_math_coding(tree, stats, output_file):
+    """
+    抽出結果をHTMLに書き出し、統計を表示
+    """
     print("📝 HTMLを生成しています...")
-    html_content = generate_html(extractor.tree)
+    html_content = generate_html(tree)
 
     with open(output_file, 'w', encoding='utf-8') as f:
         f.write(html_content)
 
     print(f"\n✅ 数学・コーディング専用ブックマークを生成しました: {output_file}")
     print(f"📊 統計:")
-    print(f"   - 元のフォルダ数: {extractor.stats['total_folders']}")
-    print(f"   - 保持したフォルダ数: {extractor.stats['kept_folders']}")
-    print(f"   - 元のブックマーク数: {extractor.stats['total_bookmarks']}")
-    print(f"   - 保持したブックマーク数: {extractor.stats['kept_bookmarks']}")
-    print(f"   - 削除した重複: {extractor.stats['duplicates']}")
-    print(f"   - 削減率: {100 - (extractor.stats['kept_bookmarks'] * 100 / extractor.stats['total_bookmarks']):.1f}%")
+    print(f"   - 元のフォルダ数: {stats['total_folders']}")
+    print(f"   - 保持したフォルダ数: {stats['kept_folders']}")
+    print(f"   - 元のブックマーク数: {stats['total_bookmarks']}")
+    print(f"   - 保持したブックマーク数: {stats['kept_bookmarks']}")
+    print(f"   - 削除した重複: {stats['duplicates']}")
+    print(f"   - 削減率: {100 - (stats['kept_bookmarks'] * 100 / stats['total_bookmarks']):.1f}%")
 
 
-if __name__ == '__main__':
-    input_file = 'bookmarks_2025_12_31_cleaned.html'  # 元のクリーニング済みファイル
-    output_file = 'bookmarks_study.html'
+def extract_math_coding(input_file, output_file, seen_urls=None):
+    """
+    数学・コーディング関連のフォルダのみを抽出
+    """
+    print("📖 元のブックマークファイルを読み込みながら数学・コーディング関連を抽出中...")
+    tree, stats = parse_math_coding(input_file, seen_urls)
+    save_math_coding(tree, stats, output_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数学・コーディング関連のフォルダのみを抽出')
+    parser.add_argument('input', nargs='?', default='bookmarks_2025_12_31_cleaned.html',
+                        help='元のクリーニング済みファイル')
+    parser.add_argument('-o', '--output', default='bookmarks_study.html', help='出力するHTML')
+    parser.add_argument('--seen-db',
+                        help='重複判定に SQLite のファイルを使い、--record-seen で記録した以前の実行のURLも重複として除く')
+    parser.add_argument('--record-seen', action='store_true',
+                        help='この実行で残したURLを --seen-db に記録する（次回以降はそれ以前に記録していないURLだけが残る）')
+    args = parser.parse_args()
+    if args.record_seen and not args.seen_db:
+        parser.error('--record-seen には --seen-db が必要です')
+
+    seen_urls = open_seen_set(args.seen_db)
+    try:
+        extract_math_coding(args.input, args.output, seen_urls)
+        # 出力を書き終えてから記録する
+        close_seen_set(seen_urls, commit=args.record_seen)
+    finally:
+        close_seen_set(seen_urls)
+
 
-    extract_math_coding(input_file, output_file)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+勉強用・数学コーディング用・最近のブックマーク・スマート分類の4つを1回の解析でまとめて作成
+各フィルター・分類器をビジターとして共有パーサーに登録し、入力ファイルを1回だけ読む
+（個別のスクリプトはそれぞれ入力を読み直す）
+
+使い方:
+    python3 filter_all_bookmarks.py bookmarks_2025_12_31_cleaned.html
+"""
+
+import argparse
+
+from bookmark_visitor import visit_file
+from extract_math_coding import MathCodingExtractor, save_math_coding
+from filter_recent_bookmarks import (
+    RecentBookmarkFilter, cutoff_timestamp_for, print_recent_stats, save_recent_bookmarks
+)
+from filter_study_bookmarks import StudyBookmarkFilter, save_study_bookmarks
+from smart_categorize_bookmarks import SmartBookmarkCategorizer, save_smart_categories
+
+DEFAULT_INPUT = 'bookmarks_2025_12_31_cleaned.html'
+
+
+def filter_all_bookmarks(input_file, study_output, math_coding_output, recent_output,
+                         organized_output, cutoff_year=2024):
+    """
+    input_file を1回だけ解析し、4つの出力をまとめて書き出す
+    """
+    study_filter = StudyBookmarkFilter()
+    extractor = MathCodingExtractor()
+    recent_filter = RecentBookmarkFilter(cutoff_timestamp_for(cutoff_year))
+    categorizer = SmartBookmarkCategorizer()
+
+    print(f"📖 {input_file} を1回だけ読み込みながら、4つのフィルター・分類器に配信中...")
+    visit_file(input_file, [study_filter, extractor, recent_filter, categorizer])
+
+    print("\n=== 勉強用 ===")
+    save_study_bookmarks(study_filter, study_output)
+
+    print("\n=== 数学・コーディング ===")
+    save_math_coding(extractor.tree, extractor.stats, math_coding_output)
+
+    print(f"\n=== {cutoff_year}年以降 ===")
+    save_recent_bookmarks(recent_filter.header_lines, recent_filter.events,
+                          recent_filter.cutoff_timestamp, recent_output)
+    print(f"✅ フィルタリング完了！")
+    print_recent_stats(recent_output, recent_filter.total_count, recent_filter.recent_count, cutoff_year)
+
+    print("\n=== スマート分類 ===")
+    save_smart_categories(categorizer.categories, organized_output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='4つのフィルター・分類器を1回の解析でまとめて実行')
+    parser.add_argument('input', nargs='?', default=DEFAULT_INPUT, help='入力するブックマークファイル')
+    parser.add_argument('--study', default='bookmarks_study.html', help='勉強用ブックマークの出力')
+    parser.add_argument('--math-coding', default='bookmarks_math_coding.html',
+                        help='数学・コーディング専用ブックマークの出力')
+    parser.add_argument('--recent', default='bookmarks_recent_2024.html', help='最近のブックマークの出力')
+    parser.add_argument('--organized', default='bookmarks_organized.html', help='スマート分類の出力')
+    parser.add_argument('--cutoff-year', type=int, default=2024, help='最近のブックマークとみなす年')
+    args = parser.parse_args()
+
+    filter_all_bookmarks(args.input, args.study, args.math_coding, args.recent, args.organized,
+                         args.cutoff_year)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,51 +7,85 @@
 
 import re
 from datetime import datetime
-from html.parser import HTMLParser
 
+from bookmark_document import HTML_HEADER, escape_attr
+from bookmark_replay import escape_title
+from bookmark_visitor import BookmarkVisitor
+from parse_cache import cached_parse
 
-class RecentBookmarkFilter(HTMLParser):
+# 共有パーサーから作る場合のヘッダー行（元のファイルの行は残らないため固定）
+RECENT_HEADER_LINES = HTML_HEADER.splitlines() + ['<TITLE>Bookmarks</TITLE>', '<H1>Bookmarks</H1>', '<DL><p>']
+
+
+def cutoff_timestamp_for(cutoff_year):
+    """カットオフ日時（cutoff_year-01-01 00:00:00）のUnixタイムスタンプ"""
+    return int(datetime(cutoff_year, 1, 1).timestamp())
+
+
+def format_bookmark_line(bookmark):
+    """Bookmark を <DT><A …>…</A> の1行にする（属性は元の名前を大文字で並べる）"""
+    parts = []
+    for name, value in bookmark.attrs.items():
+        if value is None:
+            parts.append(f' {name.upper()}')
+        else:
+            parts.append(f' {name.upper()}="{escape_attr(name, value)}"')
+    return f'<DT><A{"".join(parts)}>{escape_title(bookmark.title)}</A>'
+
+
+class RecentBookmarkFilter(BookmarkVisitor):
     """
-    最近のブックマークのみを抽出するパーサー
+    最近のブックマークのみを抽出するビジター
+    共有パーサーのイベントから scan_bookmark_lines と同じ形の (ヘッダー行, イベント) を組み立て、
+    build_recent_html で書き出せるようにする
+    ブックマークバー以降のフォルダを ' > ' 区切りのパスで扱い、ブックマークバー自身の名前はパスに含めない
     """
 
     def __init__(self, cutoff_timestamp):
-        super().__init__()
         self.cutoff_timestamp = cutoff_timestamp
-        self.output = []
-        self.current_folder_stack = []
-        self.current_folder_dates = []
-        self.in_bookmark_bar = False
-        self.folder_has_recent = {}
+        self.header_lines = list(RECENT_HEADER_LINES)
+        self.events = []
+        self.folder_stack = []
+        # フォルダごとの (パスに積んだか, 入る前の current_folder)
+        self.folder_states = []
+        self.current_folder = None
+        self.bookmark_bar_started = False
         self.recent_count = 0
         self.total_count = 0
 
-    def handle_starttag(self, tag, attrs):
-        attrs_dict = dict(attrs)
-
-        if tag == 'h3':
-            # フォルダの開始
-            add_date = attrs_dict.get('add_date', '0')
-            last_modified = attrs_dict.get('last_modified', '0')
-
-            # フォルダ情報をスタックに追加
-            self.current_folder_dates.append((add_date, last_modified))
-
-        elif tag == 'a':
-            # ブックマーク
-            self.total_count += 1
-            add_date = int(attrs_dict.get('add_date', '0'))
-
-            # 2024年以降かチェック
-            if add_date >= self.cutoff_timestamp:
-                self.recent_count += 1
-                # このブックマークを含む全ての親フォルダをマーク
-                for i in range(len(self.current_folder_stack)):
-                    self.folder_has_recent[tuple(self.current_folder_stack[:i+1])] = True
-
-    def handle_endtag(self, tag):
-        if tag == 'dl' and self.current_folder_dates:
-            self.current_folder_dates.pop()
+    def start_folder(self, folder):
+        name = folder['name']
+        self.folder_states.append((False, self.current_folder))
+        if not name:
+            return
+
+        if folder['attrs'].get('personal_toolbar_folder') == 'true':
+            # ブックマークバー
+            self.bookmark_bar_started = True
+            self.current_folder = name
+            self.events.append(('folder', name))
+
+        elif self.bookmark_bar_started:
+            self.folder_stack.append(name)
+            self.current_folder = ' > '.join(self.folder_stack)
+            self.folder_states[-1] = (True, self.folder_states[-1][1])
+            self.events.append(('folder', self.current_folder))
+
+    def visit_bookmark(self, bookmark):
+        # scan_recent_bookmarks と同じく、ADD_DATE のあるブックマークだけを数える
+        if bookmark.add_date is None:
+            return
+        self.total_count += 1
+        if bookmark.add_date >= self.cutoff_timestamp:
+            self.recent_count += 1
+        # build_recent_html がカットオフで選ぶので、日付のあるブックマークはすべて残す
+        if self.current_folder is not None:
+            self.events.append(('bookmark', bookmark.add_date, format_bookmark_line(bookmark), self.current_folder))
+
+    def end_folder(self, folder):
+        pushed, self.current_folder = self.folder_states.pop()
+        if pushed:
+            self.folder_stack.pop()
 
 
 def filter_bookmarks_by_date(input_file, output_file, cutoff_year=2024):
@@ -59,184 +93,87 @@ def filter_bookmarks_by_date(input_file, output_file, cutoff_year=2024):
     指定された年以降のブックマークのみを抽出
     """
     # カットオフ日時（2024-01-01 00:00:00 UTC）のUnixタイムスタンプ
-    cutoff_timestamp = int(datetime(cutoff_year, 1, 1).timestamp())
+    cutoff_timestamp = cutoff_timestamp_for(cutoff_year)
 
     print(f"📅 {cutoff_year}年以降のブックマークを抽出します")
     print(f"   カットオフタイムスタンプ: {cutoff_timestamp}")
 
-    # まず、ファイルを読み込んで最近のブックマークを含むフォルダを特定
-    with open(input_file, 'r', encoding='utf-8') as f:
-        content = f.read()
+    # 解析結果（同じ内容のファイルはキャッシュから読み込む）
+    header_lines, events, add_dates = cached_parse(
+        input_file, 'recent_lines', scan_recent_bookmarks, _encode_scan, _decode_scan
+    )
 
-    # HTMLを解析して最近のブックマークのみを抽出
-    lines = content.split('\n')
-    output_lines = []
+    total_bookmarks = len(add_dates)
+    recent_count = sum(1 for add_date in add_dates if add_date >= cutoff_timestamp)
 
-    folder_stack = []
-    keep_current_folder = False
-    in_dl = 0
-    skip_mode = False
-
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-
-        # ヘッダー部分はそのまま保持
-        if i < 10 or '<H1>' in line or '<!DOCTYPE' in line or '<META' in line or '<TITLE>' in line:
-            output_lines.append(line)
-            i += 1
-            continue
-
-        # H3タグ（フォルダ）の処理
-        if '<H3' in line and 'ADD_DATE' in line:
-            # ADD_DATEを抽出
-            match = re.search(r'ADD_DATE="(\d+)"', line)
-            if match:
-                add_date = int(match.group(1))
+    save_recent_bookmarks(header_lines, events, cutoff_timestamp, output_file)
 
-                # 次の行でDLが始まるか確認
-                next_i = i + 1
-                while next_i < len(lines) and lines[next_i].strip() == '':
-                    next_i += 1
+    print(f"\n✅ フィルタリング完了！")
+    print(f"   入力ファイル: {input_file}")
+    print_recent_stats(output_file, total_bookmarks, recent_count, cutoff_year)
 
-                # フォルダ内のブックマークをチェック
-                folder_has_recent = check_folder_has_recent(lines, next_i, cutoff_timestamp)
 
-                if folder_has_recent or add_date >= cutoff_timestamp:
-                    output_lines.append(line)
-                    folder_stack.append(True)
-                else:
-                    # このフォルダはスキップ
-                    folder_stack.append(False)
-                    skip_mode = True
-            else:
-                output_lines.append(line)
+def save_recent_bookmarks(header_lines, events, cutoff_timestamp, output_file):
+    """最近のブックマークをフォルダ構造で整理して書き出す"""
+    filtered_html = build_recent_html(header_lines, events, cutoff_timestamp)
 
-        # Aタグ（ブックマーク）の処理
-        elif '<A ' in line and 'HREF' in line:
-            if folder_stack and not folder_stack[-1]:
-                # スキップ対象のフォルダ内
-                pass
-            else:
-                # ADD_DATEを抽出
-                match = re.search(r'ADD_DATE="(\d+)"', line)
-                if match:
-                    add_date = int(match.group(1))
-                    if add_date >= cutoff_timestamp:
-                        # DTタグから該当行までを追加
-                        if i > 0 and '<DT>' in lines[i-1]:
-                            output_lines.append(lines[i-1])
-                        output_lines.append(line)
-                # ADD_DATEがない場合は保持
-                else:
-                    if i > 0 and '<DT>' in lines[i-1]:
-                        output_lines.append(lines[i-1])
-                    output_lines.append(line)
-
-        # DLタグの処理
-        elif '<DL>' in line:
-            if not folder_stack or folder_stack[-1]:
-                output_lines.append(line)
-            in_dl += 1
-
-        elif '</DL>' in line:
-            in_dl -= 1
-            if not folder_stack or folder_stack[-1]:
-                output_lines.append(line)
-            if folder_stack:
-                folder_stack.pop()
-                if folder_stack and not folder_stack[-1]:
-                    skip_mode = True
-                else:
-                    skip_mode = False
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(filtered_html)
 
-        # その他のタグ
-        elif '<DT>' not in line:
-            if not skip_mode:
-                output_lines.append(line)
 
-        i += 1
+def print_recent_stats(output_file, total_bookmarks, recent_count, cutoff_year):
+    """抽出結果の統計を表示"""
+    print(f"   出力ファイル: {output_file}")
+    print(f"   総ブックマーク数: {total_bookmarks}")
+    print(f"   {cutoff_year}年以降: {recent_count} 個")
+    print(f"   削減率: {100 - (recent_count * 100 / total_bookmarks):.1f}%")
 
-    # より簡単なアプローチ：正規表現で直接フィルタリング
-    print("\n🔍 簡易フィルタリングを実行します...")
 
+def scan_recent_bookmarks(input_file):
+    """
+    ファイルを解析し、(ヘッダー行, 行イベント, 全ブックマークのADD_DATE) を返す
+    カットオフに依存しないのでキャッシュできる
+    """
     with open(input_file, 'r', encoding='utf-8') as f:
         content = f.read()
 
-    # ブックマーク（Aタグ）を抽出して日付でフィルタ
+    # ブックマーク（Aタグ）の日付
     bookmark_pattern = r'<DT><A[^>]*ADD_DATE="(\d+)"[^>]*>.*?</A>'
+    add_dates = [int(match.group(1)) for match in re.finditer(bookmark_pattern, content, re.DOTALL)]
 
-    filtered_content = []
-    header_end = content.find('<DL><p>')
+    header_lines, events = scan_bookmark_lines(content)
+    return header_lines, events, add_dates
 
-    if header_end > 0:
-        filtered_content.append(content[:header_end + 7])
 
-    recent_bookmarks = []
-    total_bookmarks = 0
+def _encode_scan(result):
+    return result
 
-    for match in re.finditer(bookmark_pattern, content, re.DOTALL):
-        total_bookmarks += 1
-        add_date = int(match.group(1))
-        if add_date >= cutoff_timestamp:
-            recent_bookmarks.append(match.group(0))
 
-    # 最近のブックマークをフォルダ構造で整理
-    filtered_html = reconstruct_bookmarks(content, cutoff_timestamp)
-
-    # ファイルに書き込み
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(filtered_html)
-
-    print(f"\n✅ フィルタリング完了！")
-    print(f"   入力ファイル: {input_file}")
-    print(f"   出力ファイル: {output_file}")
-    print(f"   総ブックマーク数: {total_bookmarks}")
-    print(f"   {cutoff_year}年以降: {len(recent_bookmarks)} 個")
-    print(f"   削減率: {100 - (len(recent_bookmarks) * 100 / total_bookmarks):.1f}%")
+def _decode_scan(filepath, data):
+    return data
 
 
-def check_folder_has_recent(lines, start_idx, cutoff_timestamp):
+def scan_bookmark_lines(html_content):
     """
-    フォルダ内に最近のブックマークがあるかチェック
-    """
-    depth = 0
-    for i in range(start_idx, len(lines)):
-        line = lines[i]
-
-        if '<DL>' in line:
-            depth += 1
-        elif '</DL>' in line:
-            depth -= 1
-            if depth < 0:
-                return False
-        elif '<A ' in line and 'ADD_DATE' in line:
-            match = re.search(r'ADD_DATE="(\d+)"', line)
-            if match and int(match.group(1)) >= cutoff_timestamp:
-                return True
-
-    return False
-
-
-def reconstruct_bookmarks(html_content, cutoff_timestamp):
-    """
-    HTMLを解析して最近のブックマークのみで再構築
+    HTMLを行単位で解析し、(ヘッダー行, イベント) を返す
+    イベントは ('folder', フォルダパス) と
+    ('bookmark', ADD_DATE, ブックマーク行, その時点のフォルダパス)
     """
     lines = html_content.split('\n')
-    output = []
+    header_lines = []
 
     # ヘッダー部分
     for i, line in enumerate(lines):
         if '<DL><p>' in line:
-            output.append(line)
+            header_lines.append(line)
             break
-        output.append(line)
+        header_lines.append(line)
 
     # ブックマークバーを探す
     bookmark_bar_started = False
     current_folder = None
     folder_stack = []
-    folder_bookmarks = {}
+    events = []
 
     for i, line in enumerate(lines):
         # ブックマークバーの開始
@@ -246,7 +183,7 @@ def reconstruct_bookmarks(html_content, cutoff_timestamp):
             match = re.search(r'>([^<]+)</H3>', line)
             if match:
                 current_folder = match.group(1)
-                folder_bookmarks[current_folder] = []
+                events.append(('folder', current_folder))
 
         # サブフォルダの処理
         elif '<H3' in line and bookmark_bar_started:
@@ -255,7 +192,7 @@ def reconstruct_bookmarks(html_content, cutoff_timestamp):
                 folder_name = match.group(1)
                 folder_stack.append(folder_name)
                 full_path = ' > '.join(folder_stack)
-                folder_bookmarks[full_path] = []
+                events.append(('folder', full_path))
                 current_folder = full_path
 
         # ブックマークの処理
@@ -263,15 +200,12 @@ def reconstruct_bookmarks(html_content, cutoff_timestamp):
             match = re.search(r'ADD_DATE="(\d+)"', line)
             if match:
                 add_date = int(match.group(1))
-                if add_date >= cutoff_timestamp:
-                    # DTタグも含める
-                    if i > 0 and '<DT>' in lines[i-1]:
-                        bookmark_line = lines[i-1] + '\n' + line
-                    else:
-                        bookmark_line = '        <DT>' + line
-
-                    if current_folder and current_folder in folder_bookmarks:
-                        folder_bookmarks[current_folder].append(bookmark_line)
+                # DTタグも含める
+                if i > 0 and '<DT>' in lines[i-1]:
+                    bookmark_line = lines[i-1] + '\n' + line
+                else:
+                    bookmark_line = '        <DT>' + line
+                events.append(('bookmark', add_date, bookmark_line, current_folder))
 
         # フォルダの終了
         elif '</DL>' in line and folder_stack:
@@ -281,6 +215,33 @@ def reconstruct_bookmarks(html_content, cutoff_timestamp):
             else:
                 current_folder = None
 
+    return header_lines, events
+
+
+def reconstruct_bookmarks(html_content, cutoff_timestamp):
+    """
+    HTMLを解析して最近のブックマークのみで再構築
+    """
+    header_lines, events = scan_bookmark_lines(html_content)
+    return build_recent_html(header_lines, events, cutoff_timestamp)
+
+
+def build_recent_html(header_lines, events, cutoff_timestamp):
+    """
+    scan_bookmark_lines の結果から最近のブックマークのみで再構築
+    """
+    output = list(header_lines)
+    folder_bookmarks = {}
+
+    for event in events:
+        if event[0] == 'folder':
+            folder_bookmarks[event[1]] = []
+        else:
+            _, add_date, bookmark_line, current_folder = event
+            if add_date >= cutoff_timestamp:
+                if current_folder and current_folder in folder_bookmarks:
+                    folder_bookmarks[current_folder].append(bookmark_line)
+
     # 最近のブックマークがあるフォルダのみで再構築
     output.append('    <DT><H3 ADD_DATE="1704067200" LAST_MODIFIED="1735606800" PERSONAL_TOOLBAR_FOLDER="true">ブックマーク バー（2024年以降）</H3>')
     output.append('    <DL><p>')
@@ -9,10 +9,21 @@ import re
 from html.parser import HTMLParser
 from datetime import datetime
 
+from bookmark_model import Bookmark
+from bookmark_visitor import BookmarkVisitor
+from parallel_parse import parse_file_parallel
 
-class StudyBookmarkFilter(HTMLParser):
+# ブックマークバーに残す必須のサイト
+ESSENTIAL_DOMAINS = [
+    'atcoder.jp', 'letus.ed.tus.ac.jp', 'mail.google.com',
+    'gmail.com', 'quizlet.com', 'chatgpt.com', 'github.com'
+]
+
+
+class StudyBookmarkFilter(HTMLParser, BookmarkVisitor):
     """
     勉強用ブックマークのみをフィルタリング
+    タグのハンドラで直接解析するほか、ビジターとして共有パーサーのイベントも受け取れる
     """
 
     def __init__(self):
@@ -129,6 +140,49 @@ class StudyBookmarkFilter(HTMLParser):
 
         return True
 
+    def new_folder(self, attrs_dict, name=None):
+        """現在の階層に置くフォルダの辞書"""
+        folder = {
+            'type': 'folder',
+            'children': [],
+            'level': len(self.current_path) - 1,
+            'attrs': attrs_dict,
+            'is_bookmark_bar': attrs_dict.get('personal_toolbar_folder') == 'true'
+        }
+        if name is not None:
+            folder['name'] = name
+        return folder
+
+    def accept_bookmark(self, url, title, add_date):
+        """現在のフォルダにブックマークを追加するか判定"""
+        # ブックマークバーの場合は厳選
+        if self.current_path and len(self.current_path) > 1:
+            parent = self.current_path[-1]
+            if parent.get('is_bookmark_bar'):
+                # ブックマークバーに必須のサイトのみ保持
+                if not any(domain in url.lower() for domain in ESSENTIAL_DOMAINS):
+                    return False
+
+        return self.should_keep_bookmark(url, title, add_date)
+
+    # --- 共有パーサーのイベント ---
+
+    def start_folder(self, folder):
+        node = self.new_folder(folder['attrs'], folder['name'])
+        self.current_path[-1]['children'].append(node)
+        self.current_path.append(node)
+
+    def visit_bookmark(self, bookmark):
+        add_date = '' if bookmark.add_date is None else str(bookmark.add_date)
+        if self.accept_bookmark(bookmark.url, bookmark.title, add_date):
+            self.current_path[-1]['children'].append(bookmark)
+
+    def end_folder(self, folder):
+        if len(self.current_path) > 1:
+            self.current_path.pop()
+
+    # --- タグのハンドラ ---
+
     def handle_starttag(self, tag, attrs):
         attrs_dict = dict(attrs)
 
@@ -136,13 +190,7 @@ class StudyBookmarkFilter(HTMLParser):
             self.in_h3 = True
             self.current_text = ''
             self.current_attrs = attrs_dict
-            self.pending_folder = {
-                'type': 'folder',
-                'children': [],
-                'level': len(self.current_path) - 1,
-                'attrs': attrs_dict,
-                'is_bookmark_bar': attrs_dict.get('personal_toolbar_folder') == 'true'
-            }
+            self.pending_folder = self.new_folder(attrs_dict)
 
         elif tag == 'dl':
             if self.pending_folder:
@@ -167,26 +215,12 @@ class StudyBookmarkFilter(HTMLParser):
             add_date = self.current_attrs.get('add_date', '')
             title = self.current_text.strip()
 
-            # ブックマークバーの場合は厳選
-            if self.current_path and len(self.current_path) > 1:
-                parent = self.current_path[-1]
-                if parent.get('is_bookmark_bar'):
-                    # ブックマークバーに必須のサイトのみ保持
-                    essential_domains = [
-                        'atcoder.jp', 'letus.ed.tus.ac.jp', 'mail.google.com',
-                        'gmail.com', 'quizlet.com', 'chatgpt.com', 'github.com'
-                    ]
-                    if not any(domain in url.lower() for domain in essential_domains):
-                        return
-
-            if self.should_keep_bookmark(url, title, add_date):
-                bookmark = {
-                    'type': 'bookmark',
-                    'name': title,
-                    'url': url,
-                    'attrs': self.current_attrs,
-                    'level': len(self.current_path) - 1
-                }
+            if self.accept_bookmark(url, title, add_date):
+                bookmark = Bookmark.from_attrs(
+                    self.current_attrs.items(),
+                    title=title,
+                    level=len(self.current_path) - 1
+                )
                 self.current_path[-1]['children'].append(bookmark)
 
         elif tag == 'dl':
@@ -239,9 +273,10 @@ def categorize_unnamed_folder(folder):
     return folder['name']
 
 
-def generate_filtered_html(tree):
+def generate_filtered_html(tree, study_filter):
     """
     フィルタリングされたHTMLを生成
+    フォルダ名での除外は study_filter.should_keep_folder で判定する
     """
     lines = [
         '<!DOCTYPE NETSCAPE-Bookmark-file-1>',
@@ -278,7 +313,7 @@ def generate_filtered_html(tree):
         for child in children:
             if child['type'] == 'folder':
                 # フォルダ名で除外判定
-                if not filter_obj.should_keep_folder(child.get('name', '')):
+                if not study_filter.should_keep_folder(child.get('name', '')):
                     continue
                 result.extend(write_folder(child, indent + '    '))
             elif child['type'] == 'bookmark':
@@ -303,33 +338,33 @@ def generate_filtered_html(tree):
     return '\n'.join(lines)
 
 
-def filter_study_bookmarks(input_file, output_file):
+def save_study_bookmarks(study_filter, output_file):
     """
-    勉強用ブックマークのみを抽出
+    フィルタリング結果をHTMLに書き出し、統計を表示
     """
-    global filter_obj
-
-    print("📖 ブックマークファイルを読み込んでいます...")
-    with open(input_file, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    print("🔍 フィルタリング中...")
-    filter_obj = StudyBookmarkFilter()
-    filter_obj.feed(content)
-
     print("📝 HTMLを生成しています...")
-    html_content = generate_filtered_html(filter_obj.tree)
+    html_content = generate_filtered_html(study_filter.tree, study_filter)
 
     with open(output_file, 'w', encoding='utf-8') as f:
         f.write(html_content)
 
+    stats = study_filter.stats
     print(f"\n✅ 勉強用ブックマークを生成しました: {output_file}")
     print(f"📊 統計:")
-    print(f"   - 総ブックマーク数: {filter_obj.stats['total']}")
-    print(f"   - 保持: {filter_obj.stats['kept']}")
-    print(f"   - 削除（古い）: {filter_obj.stats['removed_old']}")
-    print(f"   - 削除（カテゴリ）: {filter_obj.stats['removed_category']}")
-    print(f"   - 削減率: {100 - (filter_obj.stats['kept'] * 100 / filter_obj.stats['total']):.1f}%")
+    print(f"   - 総ブックマーク数: {stats['total']}")
+    print(f"   - 保持: {stats['kept']}")
+    print(f"   - 削除（古い）: {stats['removed_old']}")
+    print(f"   - 削除（カテゴリ）: {stats['removed_category']}")
+    print(f"   - 削減率: {100 - (stats['kept'] * 100 / stats['total']):.1f}%")
+
+
+def filter_study_bookmarks(input_file, output_file):
+    """
+    勉強用ブックマークのみを抽出
+    """
+    print("📖 ブックマークファイルを読み込みながらフィルタリング中...")
+    study_filter = parse_file_parallel(StudyBookmarkFilter, input_file)
+    save_study_bookmarks(study_filter, output_file)
 
 
 if __name__ == '__main__':
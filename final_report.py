@@ -3,28 +3,20 @@
 最終レポート生成
 """
 
-import re
 import os
 from collections import Counter
 from urllib.parse import urlparse
 
-def parse_bookmarks_simple(filepath):
-    """シンプルなブックマークパーサー"""
-    bookmarks = []
-
-    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-        content = f.read()
-
-    pattern = r'<DT><A HREF="([^"]*)"[^>]*>([^<]*)</A>'
-    matches = re.findall(pattern, content)
+from bookmark_stream import iter_bookmarks
+from parse_cache import cached_simple_bookmarks
 
-    for url, title in matches:
-        bookmarks.append({
-            'url': url,
-            'title': title.strip()
-        })
+def parse_bookmarks_simple(filepath, use_mmap=False):
+    """シンプルなブックマークパーサー"""
+    return list(iter_bookmarks(filepath, use_mmap=use_mmap))
 
-    return bookmarks
+def count_bookmarks(filepath):
+    """ブックマーク数を数える（解析結果キャッシュを利用）"""
+    return len(cached_simple_bookmarks(filepath))
 
 def get_file_size_mb(filepath):
     """ファイルサイズ（MB）を取得"""
@@ -42,25 +34,33 @@ def main():
     categorized_file = 'bookmarks_categorized.html'
 
     # オリジナル
-    original_bookmarks = parse_bookmarks_simple(original_file)
+    original_count = count_bookmarks(original_file)
     original_size = get_file_size_mb(original_file)
 
-    # クリーニング済み
-    cleaned_bookmarks = parse_bookmarks_simple(cleaned_file)
+    # クリーニング済み（ドメイン統計も同時に集計）
+    cleaned_count = 0
+    domains = Counter()
+    for bm in cached_simple_bookmarks(cleaned_file):
+        cleaned_count += 1
+        try:
+            parsed = urlparse(bm['url'])
+            if parsed.netloc:
+                domains[parsed.netloc] += 1
+        except:
+            pass
     cleaned_size = get_file_size_mb(cleaned_file)
 
     # カテゴリー分類済み
-    categorized_bookmarks = parse_bookmarks_simple(categorized_file)
     categorized_size = get_file_size_mb(categorized_file)
 
     # 統計
-    removed_count = len(original_bookmarks) - len(cleaned_bookmarks)
-    removal_rate = (removed_count / len(original_bookmarks)) * 100
+    removed_count = original_count - cleaned_count
+    removal_rate = (removed_count / original_count) * 100
     size_reduction = ((original_size - categorized_size) / original_size) * 100
 
     print("【整理結果サマリー】")
-    print(f"  元のブックマーク数       : {len(original_bookmarks):,}個")
-    print(f"  整理後のブックマーク数   : {len(cleaned_bookmarks):,}個")
+    print(f"  元のブックマーク数       : {original_count:,}個")
+    print(f"  整理後のブックマーク数   : {cleaned_count:,}個")
     print(f"  削除したブックマーク数   : {removed_count:,}個")
     print(f"  削減率                   : {removal_rate:.1f}%")
     print()
@@ -76,26 +76,16 @@ def main():
     print(f"  - localhost系URL: 6個")
     print()
 
-    # ドメイン統計（整理後）
-    domains = Counter()
-    for bm in cleaned_bookmarks:
-        try:
-            parsed = urlparse(bm['url'])
-            if parsed.netloc:
-                domains[parsed.netloc] += 1
-        except:
-            pass
-
     print("【整理後のトップ15ドメイン】")
     for i, (domain, count) in enumerate(domains.most_common(15), 1):
-        percentage = (count / len(cleaned_bookmarks)) * 100
+        percentage = (count / cleaned_count) * 100
         print(f"  {i:2d}. {domain:40s} : {count:4d}個 ({percentage:4.1f}%)")
     print()
 
     print("【生成されたファイル】")
     print(f"  1. {cleaned_file}")
     print(f"     - 重複・無効URLを削除した整理済みブックマーク")
-    print(f"     - {len(cleaned_bookmarks):,}個のブックマーク")
+    print(f"     - {cleaned_count:,}個のブックマーク")
     print()
     print(f"  2. {categorized_file}")
     print(f"     - カテゴリー別に自動分類されたブックマーク")
@@ -123,8 +113,8 @@ def main():
         f.write("="*80 + "\n\n")
 
         f.write("【整理結果サマリー】\n")
-        f.write(f"  元のブックマーク数       : {len(original_bookmarks):,}個\n")
-        f.write(f"  整理後のブックマーク数   : {len(cleaned_bookmarks):,}個\n")
+        f.write(f"  元のブックマーク数       : {original_count:,}個\n")
+        f.write(f"  整理後のブックマーク数   : {cleaned_count:,}個\n")
         f.write(f"  削除したブックマーク数   : {removed_count:,}個\n")
         f.write(f"  削減率                   : {removal_rate:.1f}%\n\n")
 
@@ -140,14 +130,14 @@ def main():
 
         f.write("【整理後のトップ15ドメイン】\n")
         for i, (domain, count) in enumerate(domains.most_common(15), 1):
-            percentage = (count / len(cleaned_bookmarks)) * 100
+            percentage = (count / cleaned_count) * 100
             f.write(f"  {i:2d}. {domain:40s} : {count:4d}個 ({percentage:4.1f}%)\n")
         f.write("\n")
 
         f.write("【生成されたファイル】\n")
         f.write(f"  1. {cleaned_file}\n")
         f.write("     - 重複・無効URLを削除した整理済みブックマーク\n")
-        f.write(f"     - {len(cleaned_bookmarks):,}個のブックマーク\n\n")
+        f.write(f"     - {cleaned_count:,}個のブックマーク\n\n")
 
         f.write(f"  2. {categorized_file}\n")
         f.write("     - カテゴリー別に自動分類されたブックマーク\n")
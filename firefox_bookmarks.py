@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Firefoxプロファイルの places.sqlite を直接読み込む
+Firefox起動中はデータベースがロックされているため、コピーを作って読み取り専用で開く
+ブックマーク・フォルダ・日付は moz_bookmarks と moz_places を結合した1つのクエリで
+(parent, position) のインデックス順にまとめて取得する
+
+HTMLエクスポートと同じく、ブックマークメニューの中身はルート直下、
+ツールバーは PERSONAL_TOOLBAR_FOLDER、他のブックマークは UNFILED_BOOKMARKS_FOLDER 付きのフォルダ
+（タグは出力しない）
+
+使い方:
+    python3 firefox_bookmarks.py [places.sqliteのパス]
+"""
+
+import glob
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.request import pathname2url
+
+from bookmark_replay import iter_tree_bookmarks, replay_roots
+
+SQLITE_HEADER = b'SQLite format 3\x00'
+
+# fetchmany で一度に取り出す行数
+FETCH_BATCH_SIZE = 10000
+
+TYPE_FOLDER = 2
+
+# ルートフォルダのGUID
+MENU_GUID = 'menu________'
+TOOLBAR_GUID = 'toolbar_____'
+UNFILED_GUID = 'unfiled_____'
+MOBILE_GUID = 'mobile______'
+
+# 内部名のままのルートフォルダの表示名
+ROOT_TITLES = {
+    'toolbar': 'ブックマークツールバー',
+    'unfiled': '他のブックマーク',
+    'mobile': 'モバイルのブックマーク',
+}
+
+# 日付（1970-01-01からのマイクロ秒）はSQLで秒に変換する
+BOOKMARKS_QUERY = '''
+    SELECT b.id, b.type, b.parent, b.title, b.guid,
+           b.dateAdded / 1000000, b.lastModified / 1000000, p.url
+    FROM moz_bookmarks AS b
+    LEFT JOIN moz_places AS p ON p.id = b.fk
+    WHERE b.type IN (1, 2)
+    ORDER BY b.parent, b.position
+'''
+
+
+def default_places_path():
+    """既定のFirefoxプロファイルの places.sqlite のパス（見つからなければ None）"""
+    if sys.platform == 'win32':
+        base = os.path.join(os.environ.get('APPDATA', ''), 'Mozilla', 'Firefox', 'Profiles')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Application Support/Firefox/Profiles')
+    else:
+        base = os.path.expanduser('~/.mozilla/firefox')
+
+    candidates = glob.glob(os.path.join(base, '*.default*', 'places.sqlite'))
+    if not candidates:
+        return None
+    # 最近使われたプロファイルを優先
+    return max(candidates, key=os.path.getmtime)
+
+
+def is_places_sqlite(filepath):
+    """ファイルがSQLiteデータベースかどうかをヘッダーで判定"""
+    try:
+        with open(filepath, 'rb') as f:
+            return f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+    except OSError:
+        return False
+
+
+@contextmanager
+def open_places_copy(filepath):
+    """places.sqlite（と未反映の -wal）を一時ディレクトリにコピーし、読み取り専用で開く"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        copy_path = os.path.join(tmpdir, 'places.sqlite')
+        shutil.copyfile(filepath, copy_path)
+        if os.path.exists(filepath + '-wal'):
+            shutil.copyfile(filepath + '-wal', copy_path + '-wal')
+
+        conn = sqlite3.connect(f'file:{pathname2url(copy_path)}?mode=ro', uri=True)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+
+def load_roots(filepath):
+    """
+    ((ノード, フォルダとして出力するか, 追加の属性リスト) のリスト, 日付の辞書) を返す
+    """
+    children = {}
+    dates = {}
+    guids = {}
+
+    with open_places_copy(filepath) as conn:
+        cursor = conn.execute(BOOKMARKS_QUERY)
+        while True:
+            rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+            if not rows:
+                break
+
+            for item_id, item_type, parent, title, guid, add_date, last_modified, url in rows:
+                if item_type == TYPE_FOLDER:
+                    node = {'type': 'folder', 'name': title or '', 'children': children.setdefault(item_id, [])}
+                    guids[guid] = node
+                else:
+                    node = {'type': 'url', 'name': title or '', 'url': url or ''}
+                children.setdefault(parent, []).append(node)
+                dates[id(node)] = (add_date or None, last_modified or None)
+
+    def root(guid):
+        node = guids.get(guid)
+        if node is not None and node['name'] in ROOT_TITLES:
+            node['name'] = ROOT_TITLES[node['name']]
+        return node
+
+    roots = []
+    menu = root(MENU_GUID)
+    if menu is not None:
+        roots.append((menu, False, []))
+    toolbar = root(TOOLBAR_GUID)
+    if toolbar is not None:
+        roots.append((toolbar, True, [('personal_toolbar_folder', 'true')]))
+    unfiled = root(UNFILED_GUID)
+    if unfiled is not None and unfiled['children']:
+        roots.append((unfiled, True, [('unfiled_bookmarks_folder', 'true')]))
+    mobile = root(MOBILE_GUID)
+    if mobile is not None and mobile['children']:
+        roots.append((mobile, True, []))
+    return roots, dates
+
+
+def iter_replay(handler, filepath):
+    """
+    places.sqlite を読み、handler をHTMLエクスポートを解析したときと同じ順序で呼び出す
+    フォルダを1つ閉じるごとに yield する
+    """
+    roots, dates = load_roots(filepath)
+    yield from replay_roots(handler, roots, dates)
+
+
+def iter_firefox_bookmarks(filepath):
+    """ブックマーク（URLを持つノード）を出力順に Bookmark で返す"""
+    roots, dates = load_roots(filepath)
+    return iter_tree_bookmarks(roots, dates)
+
+
+def main():
+    filepath = sys.argv[1] if len(sys.argv) > 1 else default_places_path()
+    if not filepath or not os.path.exists(filepath):
+        print(f"places.sqlite が見つかりません: {filepath}")
+        sys.exit(1)
+
+    print(f"📖 読み込み中: {filepath}")
+    bookmarks = list(iter_firefox_bookmarks(filepath))
+    dates = [bm.add_date for bm in bookmarks if bm.add_date is not None]
+
+    print(f"   ブックマーク数: {len(bookmarks):,}")
+    if dates:
+        oldest = datetime.fromtimestamp(min(dates)).strftime('%Y-%m-%d')
+        newest = datetime.fromtimestamp(max(dates)).strftime('%Y-%m-%d')
+        print(f"   追加日: {oldest} 〜 {newest}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+フォルダツリーの配列表現
+入れ子の辞書ツリー（HierarchicalBookmarkParser / StudyBookmarkFilter / MathCodingExtractor の tree）を
+前順に番号付けし、親・深さ・最初の子・次の兄弟・種別・追加日を並列の配列で持つ
+
+前順では子孫の番号が必ず祖先より大きいので、部分木の件数や最新の追加日は
+末尾から1回たどるだけで求まる（NumPyがあれば深さごとにまとめて計算する）
+
+部分木のハッシュ（Merkle形式）も同じく末尾からの1回で求める
+ブックマークは URL とタイトル、フォルダは名前と子のハッシュを順に連結したものから計算するので、
+2つのエクスポートで同じハッシュのフォルダは中身（並び順を含む）も同じとみなせる
+別の実行の結果と比べるときは、folder_ids で各フォルダを FolderTable の (親のID, 名前) の連なりに対応させる
+（'/' で連結したパスと違い、名前に '/' を含むフォルダも区別できる）
+"""
+
+import hashlib
+from array import array
+
+from bookmark_model import Bookmark, FolderTable
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 種別
+FOLDER = 0
+BOOKMARK = 1
+OTHER = 2
+
+NO_NODE = -1
+
+
+KIND_CODES = {'folder': FOLDER, 'bookmark': BOOKMARK}
+
+# 部分木のハッシュのバイト数
+HASH_DIGEST_SIZE = 16
+
+# ハッシュの種別ごとの接頭辞（ブックマークとフォルダで同じバイト列にならないようにする）
+HASH_PREFIXES = {FOLDER: b'F\0', BOOKMARK: b'B\0', OTHER: b'O\0'}
+
+
+class FlatTree:
+    """
+    配列で表したツリー
+    nodes[i] は元のノード（辞書または Bookmark）、index は id(ノード) -> 番号
+    """
+
+    def __init__(self):
+        self.nodes = []
+        self.index = {}
+        self.parent = array('l')
+        self.depth = array('l')
+        self.first_child = array('l')
+        self.next_sibling = array('l')
+        self.kind = array('b')
+        # 追加日（不明は 0）
+        self.add_date = array('q')
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @classmethod
+    def from_nested(cls, root):
+        """
+        入れ子のツリーから作成
+        子をたどるのは type が 'folder' のノードのみ
+        """
+        nodes = []
+        parent = []
+        depth = []
+        kind = []
+        add_date = []
+        first_child = []
+        next_sibling = []
+
+        # (ノード, 親の番号, 深さ)
+        stack = [(root, NO_NODE, 0)]
+        while stack:
+            node, node_parent, node_depth = stack.pop()
+            i = len(nodes)
+            nodes.append(node)
+            parent.append(node_parent)
+            depth.append(node_depth)
+            first_child.append(NO_NODE)
+            next_sibling.append(NO_NODE)
+
+            if isinstance(node, Bookmark):
+                kind.append(BOOKMARK)
+                add_date.append(node.add_date or 0)
+                continue
+
+            node_kind = KIND_CODES.get(node.get('type'), OTHER)
+            kind.append(node_kind)
+            add_date.append(_folder_add_date(node))
+            if node_kind != FOLDER:
+                continue
+
+            children = node.get('children', [])
+            stack.extend((child, i, node_depth + 1) for child in reversed(children))
+
+        # 兄弟のつながりは親の番号から求める（前順なので同じ親の子は番号順に並ぶ）
+        last_child = {}
+        for i in range(1, len(nodes)):
+            p = parent[i]
+            previous = last_child.get(p)
+            if previous is None:
+                first_child[p] = i
+            else:
+                next_sibling[previous] = i
+            last_child[p] = i
+
+        tree = cls()
+        tree.nodes = nodes
+        tree.index = {id(node): i for i, node in enumerate(nodes)}
+        tree.parent = array('l', parent)
+        tree.depth = array('l', depth)
+        tree.first_child = array('l', first_child)
+        tree.next_sibling = array('l', next_sibling)
+        tree.kind = array('b', kind)
+        tree.add_date = array('q', add_date)
+        return tree
+
+    def count(self, kind):
+        """種別ごとの総数"""
+        return self.kind.count(kind)
+
+    def max_depth(self):
+        return max(self.depth) if self.depth else 0
+
+    def children(self, i):
+        """子の番号を順に返す"""
+        child = self.first_child[i]
+        while child != NO_NODE:
+            yield child
+            child = self.next_sibling[child]
+
+    def subtree_counts(self, kind=BOOKMARK):
+        """各ノードの部分木に含まれる kind の数（自分自身を含む）"""
+        values = [1 if k == kind else 0 for k in self.kind]
+        return self._aggregate(values, 'sum')
+
+    def subtree_max_dates(self):
+        """各ノードの部分木で最も新しい追加日（不明は 0）"""
+        return self._aggregate(list(self.add_date), 'max')
+
+    def subtree_depths(self):
+        """各ノードの部分木の深さ（葉は 0）"""
+        values = list(self.depth)
+        deepest = self._aggregate(values, 'max')
+        return [d - depth for d, depth in zip(deepest, self.depth)]
+
+    def _aggregate(self, values, how):
+        """子の値を親へ末尾から畳み込む"""
+        if np is not None and len(values) > 1:
+            return self._aggregate_numpy(values, how)
+
+        parent = self.parent
+        if how == 'sum':
+            for i in range(len(values) - 1, 0, -1):
+                values[parent[i]] += values[i]
+        else:
+            for i in range(len(values) - 1, 0, -1):
+                p = parent[i]
+                if values[i] > values[p]:
+                    values[p] = values[i]
+        return values
+
+    def _aggregate_numpy(self, values, how):
+        """深い階層から順に、同じ深さのノードをまとめて親へ畳み込む"""
+        result = np.array(values, dtype=np.int64)
+        parent = np.array(self.parent, dtype=np.int64)
+        depth = np.array(self.depth, dtype=np.int64)
+        max_depth = int(depth.max())
+        order = np.argsort(depth, kind='stable')
+        boundaries = np.searchsorted(depth[order], np.arange(max_depth + 2))
+        ufunc = np.add if how == 'sum' else np.maximum
+
+        for d in range(max_depth, 0, -1):
+            nodes = order[boundaries[d]:boundaries[d + 1]]
+            ufunc.at(result, parent[nodes], result[nodes])
+        return result.tolist()
+
+    def subtree_sizes(self):
+        """各ノードの部分木のノード数（自分自身を含む。前順なので部分木は i から i + 大きさ - 1 まで）"""
+        return self._aggregate([1] * len(self.nodes), 'sum')
+
+    def folder_ids(self, folders=None):
+        """
+        各フォルダを folders（FolderTable、省略時は新しく作る）に (親のID, 名前) で登録し、
+        (folders, ノード番号 -> フォルダID のリスト) を返す（ルートは FolderTable.ROOT、フォルダ以外は None）
+        同じ親の下に同じ名前のフォルダが複数あるものは区別できないので、それと子孫のフォルダも None
+        """
+        if folders is None:
+            folders = FolderTable()
+        ids = [None] * len(self.nodes)
+        if not ids:
+            return folders, ids
+        ids[0] = FolderTable.ROOT
+        used = set()
+        ambiguous = set()
+        for i in range(1, len(self.nodes)):
+            parent_id = ids[self.parent[i]]
+            if self.kind[i] != FOLDER or parent_id is None:
+                continue
+            folder_id = folders.child(parent_id, self.nodes[i].get('name') or '')
+            if folder_id in used:
+                ambiguous.add(folder_id)
+            used.add(folder_id)
+            ids[i] = folder_id
+        if ambiguous:
+            # 前順にたどるので、親が None になったフォルダの子孫も順に None になる
+            ids = [None if folder_id in ambiguous else folder_id for folder_id in ids]
+            for i in range(1, len(self.nodes)):
+                if ids[i] is not None and ids[self.parent[i]] is None:
+                    ids[i] = None
+        return folders, ids
+
+    def subtree_hashes(self):
+        """
+        各ノードの部分木のハッシュ（bytes）
+        ブックマークは URL とタイトル、フォルダは名前と子のハッシュ（並び順どおり）から計算する
+        """
+        nodes = self.nodes
+        kind = self.kind
+        first_child = self.first_child
+        next_sibling = self.next_sibling
+        digests = [None] * len(nodes)
+
+        for i in range(len(nodes) - 1, -1, -1):
+            node = nodes[i]
+            node_kind = kind[i]
+            digest = hashlib.blake2b(HASH_PREFIXES[node_kind], digest_size=HASH_DIGEST_SIZE)
+            if node_kind == BOOKMARK:
+                digest.update(node.url.encode('utf-8', 'surrogatepass'))
+                digest.update(b'\0')
+                digest.update(node.title.encode('utf-8', 'surrogatepass'))
+            else:
+                digest.update((node.get('name') or '').encode('utf-8', 'surrogatepass'))
+                digest.update(b'\0')
+                child = first_child[i]
+                while child != NO_NODE:
+                    digest.update(digests[child])
+                    child = next_sibling[child]
+            digests[i] = digest.digest()
+
+        return digests
+
+    def by_node(self, values, kind=None):
+        """配列の値を id(ノード) -> 値 の辞書にする（kind を指定するとその種別のみ）"""
+        if kind is None:
+            return {id(node): value for node, value in zip(self.nodes, values)}
+        return {
+            id(node): value
+            for node, value, node_kind in zip(self.nodes, values, self.kind)
+            if node_kind == kind
+        }
+
+
+def _folder_add_date(node):
+    """フォルダ（辞書）の attrs の add_date（文字列）"""
+    value = (node.get('attrs') or {}).get('add_date')
+    try:
+        return int(value) if value else 0
+    except ValueError:
+        return 0
@@ -3,28 +3,15 @@
 ブックマークをWebビュー用に変換
 """
 
-import re
 from collections import defaultdict
 from urllib.parse import urlparse
 import json
 
-def parse_bookmarks_simple(filepath):
-    """シンプルなブックマークパーサー"""
-    bookmarks = []
-
-    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-        content = f.read()
-
-    pattern = r'<DT><A HREF="([^"]*)"[^>]*>([^<]*)</A>'
-    matches = re.findall(pattern, content)
-
-    for url, title in matches:
-        bookmarks.append({
-            'url': url,
-            'title': title.strip()
-        })
+from bookmark_stream import iter_bookmarks
 
-    return bookmarks
+def parse_bookmarks_simple(filepath, use_mmap=False):
+    """シンプルなブックマークパーサー"""
+    return list(iter_bookmarks(filepath, use_mmap=use_mmap))
 
 def categorize_bookmark(bm):
     """ブックマークをカテゴリー分け"""
@@ -89,8 +76,16 @@ def categorize_bookmark(bm):
 
     return 'その他'
 
-def generate_web_view(categorized_bookmarks, output_file):
-    """Webビュー用HTMLを生成"""
+# 各カテゴリーで表示するブックマーク数
+DISPLAY_LIMIT = 100
+
+def generate_web_view(categorized_bookmarks, output_file, counts=None):
+    """
+    Webビュー用HTMLを生成
+    counts を渡した場合、categorized_bookmarks は表示分だけでよい
+    """
+    if counts is None:
+        counts = {category: len(bms) for category, bms in categorized_bookmarks.items()}
 
     html_header = '''<!DOCTYPE html>
 <html lang="ja">
@@ -373,19 +368,20 @@ def generate_web_view(categorized_bookmarks, output_file):
         f.write(html_header)
 
         # カテゴリーをソート
-        sorted_categories = sorted(categorized_bookmarks.items(), key=lambda x: len(x[1]), reverse=True)
+        sorted_categories = sorted(categorized_bookmarks.items(), key=lambda x: counts[x[0]], reverse=True)
 
         for category, bookmarks in sorted_categories:
+            total = counts[category]
             f.write(f'''
                 <div class="category">
                     <div class="category-header" onclick="toggleCategory(this)">
                         <span class="category-title">{category}</span>
-                        <span class="category-count">{len(bookmarks)}個</span>
+                        <span class="category-count">{total}個</span>
                     </div>
                     <div class="bookmarks">
 ''')
 
-            for bm in bookmarks[:100]:  # 各カテゴリー最初の100件のみ表示
+            for bm in bookmarks[:DISPLAY_LIMIT]:  # 各カテゴリー最初の100件のみ表示
                 url = bm['url'].replace('"', '&quot;').replace('<', '&lt;').replace('>', '&gt;')
                 title = bm['title'].replace('<', '&lt;').replace('>', '&gt;')
 
@@ -396,10 +392,10 @@ def generate_web_view(categorized_bookmarks, output_file):
                         </div>
 ''')
 
-            if len(bookmarks) > 100:
+            if total > DISPLAY_LIMIT:
                 f.write(f'''
                         <div style="text-align: center; padding: 20px; color: #999;">
-                            ... さらに {len(bookmarks) - 100}個のブックマーク
+                            ... さらに {total - DISPLAY_LIMIT}個のブックマーク
                         </div>
 ''')
 
@@ -410,22 +406,24 @@ def generate_web_view(categorized_bookmarks, output_file):
 
         f.write(html_footer)
 
-def main():
-    print("Web表示用HTMLを生成中...")
-
-    # ブックマークを読み込み
-    bookmarks = parse_bookmarks_simple('bookmarks_cleaned.html')
-    print(f"  {len(bookmarks)}個のブックマークを読み込みました")
-
-    # カテゴリー分類
+def create_web_view(input_file, output_file):
+    """ブックマークを読み込みながらカテゴリー分類し、Web表示用HTMLを生成（表示する分だけ保持）"""
     categorized = defaultdict(list)
-    for bm in bookmarks:
+    counts = defaultdict(int)
+    for bm in iter_bookmarks(input_file):
         category = categorize_bookmark(bm)
-        categorized[category].append(bm)
+        counts[category] += 1
+        if counts[category] <= DISPLAY_LIMIT:
+            categorized[category].append(bm)
+    print(f"  {sum(counts.values())}個のブックマークを読み込みました")
+
+    generate_web_view(categorized, output_file, counts)
+    print(f"  {output_file} を生成しました")
+
+def main():
+    print("Web表示用HTMLを生成中...")
 
-    # Web表示用HTMLを生成
-    generate_web_view(categorized, 'bookmarks_web.html')
-    print(f"  bookmarks_web.html を生成しました")
+    create_web_view('bookmarks_cleaned.html', 'bookmarks_web.html')
 
     print("\n完了！")
 
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+前回処理したエクスポートとの差分だけを処理し直す増分モード
+clean_bookmarks.py → categorize_bookmarks.py / smart_categorize_bookmarks.py（整理済みファイルを入力）を
+続けて実行した場合と同じ出力を作る
+
+前回のエクスポートのブックマークの並びと、URLごとの分析結果・ブックマークごとの分類結果を
+状態ファイル（marshal 形式）に保存しておき、次の実行では
+    - 追加・削除されたブックマーク（URLとタイトルの組の多重集合の差）
+    - 移動したブックマーク（両方にあるもののうち、並び順が前後したもの）
+を求める。URLの解析と2種類の分類は、前回の結果がないもの（追加分）だけに行う
+差分がなく出力も揃っていれば、何も書き直さずに終える
+分類・判定の規則（RULE_MODULES のソース）が前回と変わっていれば、前回の結果は使わずにすべて処理し直す
+
+使い方:
+    python3 incremental_update.py bookmarks_2026_01_31.html
+"""
+
+import argparse
+import hashlib
+import importlib
+import marshal
+import os
+from bisect import bisect_left
+from collections import Counter
+
+from bookmark_model import Bookmark
+from bookmark_stream import iter_bookmarks, profile_reader
+from categorize_bookmarks import categorize_bookmark, print_category_stats, save_categorized_stream
+from clean_bookmarks import (
+    BookmarkAnalyzer, analyze_url, escape_cleaned, iter_clean_bookmarks, new_removed_count,
+    print_clean_summary, save_cleaned_bookmarks, save_cleaning_report
+)
+from parse_cache import cached_simple_bookmarks, file_digest
+from smart_categorize_bookmarks import SmartBookmarkCategorizer, save_smart_categories
+
+# 状態ファイルの形式を変えたら上げる
+STATE_VERSION = 2
+STATE_MAGIC = 'bookmark-incremental-state'
+
+DEFAULT_STATE_FILE = 'bookmarks.incremental_state'
+
+# 状態に保存する分析・分類の結果を決める規則のモジュール（ソースが変わったら前回の結果を使わない）
+RULE_MODULES = ('categorize_bookmarks', 'smart_categorize_bookmarks', 'clean_bookmarks', 'url_classify', 'url_canon')
+
+# 差分として表示する件数
+SHOW_CHANGES = 10
+
+
+class IncrementalState:
+    """
+    前回処理したエクスポートの状態
+    keys: ブックマークの (URL, タイトル) の並び
+    url_info: URL -> analyze_url の結果
+    categories: (URL, タイトル) -> (カテゴリー, スマート分類のカテゴリー)
+    outputs: 前回書き出したファイルのパス
+    """
+
+    def __init__(self):
+        self.input_digest = None
+        self.keys = []
+        self.url_info = {}
+        self.categories = {}
+        self.outputs = None
+
+    def encode(self):
+        return (
+            self.input_digest,
+            [url for url, _ in self.keys],
+            [title for _, title in self.keys],
+            self.url_info,
+            self.categories,
+            self.outputs,
+        )
+
+    @classmethod
+    def decode(cls, data):
+        state = cls()
+        state.input_digest, urls, titles, state.url_info, state.categories, state.outputs = data
+        state.keys = list(zip(urls, titles))
+        return state
+
+
+def rules_fingerprint():
+    """RULE_MODULES のソースのハッシュ"""
+    digest = hashlib.blake2b(digest_size=16)
+    for name in RULE_MODULES:
+        digest.update(name.encode('utf-8') + b'\0')
+        digest.update(file_digest(importlib.import_module(name).__file__).encode('ascii'))
+    return digest.hexdigest()
+
+
+def load_state(path):
+    """状態ファイルを読み込む（ないか壊れているか、規則が変わっていれば空の状態）"""
+    try:
+        with open(path, 'rb') as f:
+            header = marshal.load(f)
+            if header[:2] != (STATE_MAGIC, STATE_VERSION):
+                return IncrementalState()
+            if header[2:] != (rules_fingerprint(),):
+                print(f"\n分析・分類の規則が前回から変わったため、すべて処理し直します")
+                return IncrementalState()
+            return IncrementalState.decode(marshal.loads(f.read()))
+    except (OSError, EOFError, ValueError, TypeError):
+        return IncrementalState()
+
+
+def save_state(path, state):
+    """状態ファイルを書き込む（途中で止まっても前回の状態が壊れないよう置き換える）"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        marshal.dump((STATE_MAGIC, STATE_VERSION, rules_fingerprint()), f)
+        marshal.dump(state.encode(), f)
+    os.replace(tmp_path, path)
+
+
+def _numbered(keys):
+    """同じキーの何回目の出現かを付けた (キー, 回数) の並び"""
+    seen = Counter()
+    numbered = []
+    for key in keys:
+        seen[key] += 1
+        numbered.append((key, seen[key]))
+    return numbered
+
+
+def _longest_increasing(values):
+    """values の最長増加部分列に含まれる位置の集合（O(n log n)）"""
+    tails = []
+    tail_positions = []
+    previous = [None] * len(values)
+    for i, value in enumerate(values):
+        k = bisect_left(tails, value)
+        if k == len(tails):
+            tails.append(value)
+            tail_positions.append(i)
+        else:
+            tails[k] = value
+            tail_positions[k] = i
+        previous[i] = tail_positions[k - 1] if k else None
+
+    members = set()
+    i = tail_positions[-1] if tail_positions else None
+    while i is not None:
+        members.add(i)
+        i = previous[i]
+    return members
+
+
+def compute_delta(old_keys, new_keys):
+    """
+    前回と今回の (URL, タイトル) の並びの差分
+    {'added', 'removed', 'moved'}（それぞれキーのリスト）を返す
+    移動は、両方にあるものを今回の順に並べたときに前回の順序と食い違う最小限のもの
+    """
+    old_numbered = _numbered(old_keys)
+    new_numbered = _numbered(new_keys)
+    old_positions = {key: i for i, key in enumerate(old_numbered)}
+    new_set = set(new_numbered)
+
+    added = [key for key, n in new_numbered if (key, n) not in old_positions]
+    removed = [key for key, n in old_numbered if (key, n) not in new_set]
+
+    common = [key for key in new_numbered if key in old_positions]
+    staying = _longest_increasing([old_positions[key] for key in common])
+    moved = [key for i, (key, _) in enumerate(common) if i not in staying]
+
+    return {'added': added, 'removed': removed, 'moved': moved}
+
+
+def print_delta(delta):
+    """差分の件数と先頭の数件を表示"""
+    labels = {'added': '追加', 'removed': '削除', 'moved': '移動'}
+    print(f"\n【前回からの差分】")
+    for kind, label in labels.items():
+        keys = delta[kind]
+        print(f"  {label}: {len(keys):6,}個")
+        for url, title in keys[:SHOW_CHANGES]:
+            title_display = title[:40] if len(title) > 40 else title
+            print(f"      {title_display} : {url[:60]}")
+
+
+def load_bookmarks(input_file):
+    """
+    (URL, タイトル) だけのブックマークを読み込む
+    ブラウザのプロファイルファイルは、プロファイルのフォルダに解析キャッシュを書かないよう直接読む
+    """
+    if profile_reader(input_file) is not None:
+        return list(iter_bookmarks(input_file))
+    return cached_simple_bookmarks(input_file)
+
+
+def incremental_update(input_file, cleaned_file, categorized_file, organized_file, report_file,
+                       state_file=DEFAULT_STATE_FILE, full=False):
+    """
+    差分だけを解析・分類し直して出力を更新する
+    差分がなく出力も揃っている場合は何も書き直さずに False を返す
+    """
+    state = IncrementalState() if full else load_state(state_file)
+    outputs = (cleaned_file, categorized_file, organized_file, report_file)
+
+    print(f"\n読み込み中: {input_file}")
+    digest = file_digest(input_file)
+    outputs_ready = state.outputs == outputs and all(os.path.exists(path) for path in outputs)
+    if digest == state.input_digest and outputs_ready:
+        print(f"\n前回と同じ内容のため、出力はそのままにします")
+        return False
+
+    bookmarks = load_bookmarks(input_file)
+    keys = [(bm.url, bm.title) for bm in bookmarks]
+
+    delta = compute_delta(state.keys, keys)
+    print_delta(delta)
+
+    unchanged = not (delta['added'] or delta['removed'] or delta['moved'])
+    if unchanged and outputs_ready:
+        print(f"\n変更がないため、出力はそのままにします")
+        state.input_digest = digest
+        save_state(state_file, state)
+        return False
+
+    # 分析（URLの解析は前回の結果がないものだけ）
+    url_info = {}
+    analyzer = BookmarkAnalyzer()
+    parsed_urls = 0
+    for url, _ in keys:
+        info = url_info.get(url)
+        if info is None:
+            info = state.url_info.get(url)
+            if info is None:
+                info = analyze_url(url)
+                parsed_urls += 1
+            url_info[url] = info
+        analyzer.add_info(info)
+    analyzer.report()
+
+    # クリーニング（重複・怪しいURLの判定は件数に比例するが軽い）
+    removed = new_removed_count()
+    kept = list(iter_clean_bookmarks(bookmarks, removed, key=lambda url: url_info[url][3]))
+    print(f"\n{'='*70}")
+    print("クリーニング結果")
+    print(f"{'='*70}\n")
+    print_clean_summary(removed, len(kept))
+    save_cleaned_bookmarks(kept, cleaned_file)
+    save_cleaning_report(report_file, len(keys), len(kept), removed)
+    print(f"レポートを保存: {report_file}")
+    cleaned = [escape_cleaned(bm.url, bm.title) for bm in kept]
+
+    # 分類（前回の結果がないものだけ分類する）
+    # 整理済みファイルを読み直した場合と同じく、書き出し後の表記で分類する
+    categories = {}
+    smart = SmartBookmarkCategorizer()
+    classified = 0
+    for key in cleaned:
+        result = categories.get(key)
+        if result is None:
+            result = state.categories.get(key)
+            if result is None:
+                url, title = key
+                result = (
+                    categorize_bookmark(Bookmark(url, title)),
+                    smart.categorize_bookmark(url, title) if url and title else None
+                )
+                classified += 1
+            categories[key] = result
+
+    counts = save_categorized_stream(
+        ((categories[key][0], Bookmark(*key)) for key in cleaned),
+        categorized_file
+    )
+    print_category_stats(counts)
+    print(f"\nカテゴリー別ブックマークを保存しました: {categorized_file}")
+
+    for key in cleaned:
+        smart_category = categories[key][1]
+        if smart_category is not None:
+            smart.categories[smart_category].append(key)
+    save_smart_categories(smart.categories, organized_file)
+
+    print(f"\n  URLを解析: {parsed_urls:,}個 / 分類: {classified:,}個"
+          f"（残りの {len(url_info) - parsed_urls:,}個・{len(categories) - classified:,}個は前回の結果を利用）")
+
+    state.input_digest = digest
+    state.keys = keys
+    state.url_info = url_info
+    state.categories = categories
+    state.outputs = outputs
+    save_state(state_file, state)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='前回からの差分だけを処理し直して整理済みファイルを更新')
+    parser.add_argument('input', nargs='?', default='bookmarks_2025_12_31.html', help='新しいエクスポート')
+    parser.add_argument('--cleaned', default='bookmarks_cleaned.html', help='整理済みブックマークの出力')
+    parser.add_argument('--categorized', default='bookmarks_categorized.html', help='カテゴリー別ブックマークの出力')
+    parser.add_argument('--organized', default='bookmarks_organized.html', help='スマート分類の出力')
+    parser.add_argument('--report', default='bookmark_cleaning_report.txt', help='整理レポートの出力')
+    parser.add_argument('--state', default=DEFAULT_STATE_FILE, help='前回の状態を保存するファイル')
+    parser.add_argument('--full', action='store_true', help='前回の状態を使わずにすべて処理し直す')
+    args = parser.parse_args()
+
+    print("="*70)
+    print("ブックマーク増分更新")
+    print("="*70)
+
+    incremental_update(args.input, args.cleaned, args.categorized, args.organized, args.report,
+                       state_file=args.state, full=args.full)
+
+    print(f"\n{'='*70}")
+    print("完了！")
+    print(f"{'='*70}\n")
+
+
+if __name__ == '__main__':
+    main()
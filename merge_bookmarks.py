@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+複数のブックマークファイル（ノートPC・デスクトップ・職場のプロファイルなど）を1つに統合する
+各ファイルをストリーミングで読みながら (正規化キー, 入力番号, 出現順, …) のレコードとして外部ソートし、
+入力ごとのソート済みストリームを heapq.merge（k-way マージ）で正規化キー順に併合して重複を除く
+同じURLは先に指定した入力のものを残し、どの入力に含まれていたかを SOURCES 属性に記録する
+残したブックマークはフォルダ順に並べ直し、フォルダ構造を保った1つのツリーとして書き出す
+
+正規化キーは url_canon.canonical_key（http/https・www・utm_* などの違いを同じURLとみなす）
+
+入力にはHTMLエクスポートのほか、Chromeの Bookmarks や Firefoxの places.sqlite も指定できる
+
+使い方:
+    python3 merge_bookmarks.py laptop.html desktop.html work.html -o bookmarks_merged.html
+"""
+
+import argparse
+import heapq
+import os
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
+
+from bookmark_document import NetscapeWriter
+from bookmark_model import Bookmark, FolderTable
+from bookmark_stream import BOOKMARK, FOLDER_END, FOLDER_START, iter_events
+from external_sort import DEFAULT_MEMORY_BUDGET, ExternalSorter, format_size, parse_size
+from netscape_tokenizer import AttributeRef
+from url_canon import canonical_key
+
+DEFAULT_OUTPUT = 'bookmarks_merged.html'
+
+
+def _encode_icon(icon):
+    if isinstance(icon, AttributeRef):
+        return (icon.offset, icon.length)
+    return icon
+
+
+class MergeState:
+    """全入力で共有するフォルダ表と、フォルダごとの最初に見た属性"""
+
+    def __init__(self):
+        self.folders = FolderTable()
+        self.folder_attrs = {}
+        self.chains = {FolderTable.ROOT: ()}
+
+    def chain(self, folder_id):
+        """ルートから folder_id までのフォルダIDのタプル（ツリー順に並べるキー）"""
+        chain = self.chains.get(folder_id)
+        if chain is None:
+            chain = self.chains[folder_id] = self.chain(self.folders.parents[folder_id]) + (folder_id,)
+        return chain
+
+
+def sort_source(state, source, filepath, memory_budget):
+    """
+    1つの入力をストリーミングで読み、正規化キー順に並べ替えるソーターを返す
+    レコードは (正規化キー, 入力番号, 出現順, フォルダID, URL, タイトル, 追加日, ICON, その他の属性)
+    """
+    sorter = ExternalSorter(memory_budget)
+    folder_stack = [FolderTable.ROOT]
+    seq = 0
+
+    for kind, data in iter_events(filepath, lazy_icons=True):
+        if kind == FOLDER_START:
+            folder_id = state.folders.child(folder_stack[-1], data['name'])
+            state.folder_attrs.setdefault(folder_id, tuple(data['attrs'].items()))
+            folder_stack.append(folder_id)
+        elif kind == FOLDER_END:
+            folder_stack.pop()
+        elif kind == BOOKMARK:
+            sorter.add((
+                canonical_key(data.url), source, seq, folder_stack[-1],
+                data.url, data.title, data.add_date, _encode_icon(data.icon), data.extra
+            ))
+            seq += 1
+
+    return sorter
+
+
+def source_labels(filepaths):
+    """
+    SOURCES に記録する入力の名前（ファイル名）
+    ファイル名が重なる入力（laptop/bookmarks.html と desktop/bookmarks.html など）は指定したパスのまま、
+    パスも同じなら入力の番号を付けて区別する
+    """
+    basenames = Counter(os.path.basename(path) for path in filepaths)
+    labels = [path if basenames[os.path.basename(path)] > 1 else os.path.basename(path) for path in filepaths]
+    counts = Counter(labels)
+    return [f'{label}#{source + 1}' if counts[label] > 1 else label for source, label in enumerate(labels)]
+
+
+def merge_sources(filepaths, output_file, memory_budget=DEFAULT_MEMORY_BUDGET):
+    """
+    filepaths を1つに統合して output_file に書き出す
+    入力ごとの統計 [{'total', 'kept', 'duplicates'}, ...] と統合後の件数を返す
+    """
+    state = MergeState()
+    labels = source_labels(filepaths)
+    # 入力ごとのソーターと、フォルダ順に並べ直すソーターで予算を分ける
+    budget = memory_budget // (len(filepaths) + 1)
+
+    sorters = []
+    for source, filepath in enumerate(filepaths):
+        print(f"  [{source + 1}/{len(filepaths)}] 読み込み中: {filepath}")
+        sorters.append(sort_source(state, source, filepath, budget))
+
+    stats = [{'total': sorter.count, 'kept': 0, 'duplicates': 0} for sorter in sorters]
+
+    # k-way マージで正規化キーごとにまとめ、先頭（入力番号・出現順が最小）のものを残す
+    by_folder = ExternalSorter(budget)
+    merged = heapq.merge(*(sorter.sorted() for sorter in sorters))
+    for _, group in groupby(merged, key=itemgetter(0)):
+        first = next(group)
+        sources = {first[1]}
+        for record in group:
+            sources.add(record[1])
+            stats[record[1]]['duplicates'] += 1
+        stats[first[1]]['kept'] += 1
+
+        _, source, seq, folder_id = first[:4]
+        by_folder.add((state.chain(folder_id), source, seq, ','.join(labels[i] for i in sorted(sources)))
+                      + first[4:])
+
+    # フォルダ順に書き出す
+    count = 0
+    with open(output_file, 'w', encoding='utf-8') as f, NetscapeWriter(f) as writer:
+        open_chain = ()
+        for chain, source, _, sources, url, title, add_date, icon, extra in by_folder.sorted():
+            if chain != open_chain:
+                common = 0
+                while common < min(len(chain), len(open_chain)) and chain[common] == open_chain[common]:
+                    common += 1
+                for _ in range(len(open_chain) - common):
+                    writer.close_folder()
+                for folder_id in chain[common:]:
+                    writer.open_folder(state.folders.names[folder_id], state.folder_attrs.get(folder_id, ()))
+                open_chain = chain
+
+            if isinstance(icon, tuple):
+                icon = AttributeRef(filepaths[source], icon[0], icon[1])
+            writer.bookmark(Bookmark(url, title, add_date, icon, extra=extra), [('sources', sources)])
+            count += 1
+
+    return stats, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='複数のブックマークファイルを重複なく1つに統合')
+    parser.add_argument('files', nargs='+', help='統合するブックマークファイル（先に指定したものを優先）')
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT, help='出力するHTML')
+    parser.add_argument('--memory-budget', type=parse_size, default=DEFAULT_MEMORY_BUDGET,
+                        help='使用メモリの目安（超えた分は一時ファイルに書き出す。例: 512M）')
+    args = parser.parse_args()
+
+    print("="*70)
+    print("ブックマーク統合")
+    print("="*70)
+    print(f"\n{len(args.files)}個のファイルを統合中（メモリ予算 {format_size(args.memory_budget)}）")
+
+    stats, count = merge_sources(args.files, args.output, args.memory_budget)
+
+    print(f"\n【入力別】")
+    for label, stat in zip(source_labels(args.files), stats):
+        print(f"  {label:30s} : {stat['total']:6,}個"
+              f"（採用 {stat['kept']:6,}個 / 重複 {stat['duplicates']:6,}個）")
+
+    total = sum(stat['total'] for stat in stats)
+    print(f"\n  合計: {total:,}個 → 統合後: {count:,}個（重複 {total - count:,}個を削除）")
+    print(f"\n統合したブックマークを保存: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
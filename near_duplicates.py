@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ほぼ重複したブックマークの検出（MinHash + LSH）
+クエリ文字列やミラー先が違う・タイトルが少し違うだけの同じ記事を、候補のまとまり（クラスタ）として報告する
+
+各ブックマークの特徴は ホスト名・URLのパスとパラメータの単語・タイトルの文字3-gram で、
+その集合の MinHash シグネチャを帯（band）に分けてバケットに入れる
+同じバケットに入ったものだけを比べるので、全ペアを比べず件数にほぼ比例する時間で済む
+候補はシグネチャの一致率（Jaccard係数の推定値）がしきい値以上のときだけまとめる
+
+正規化キー（url_canon.canonical_key）が同じものは完全な重複なので1件として扱う（clean_bookmarks.py で削除される）
+
+使い方:
+    python3 near_duplicates.py bookmarks_cleaned.html --threshold 0.7
+"""
+
+import argparse
+import hashlib
+import re
+import struct
+import unicodedata
+from array import array
+from collections import defaultdict
+from functools import lru_cache
+
+from bookmark_stream import iter_bookmarks
+from url_canon import canonical_key
+
+DEFAULT_INPUT = 'bookmarks_cleaned.html'
+
+DEFAULT_THRESHOLD = 0.8
+# シグネチャの長さ（16の倍数。blake2b 1回で32ビットのハッシュが16個取れる）
+DEFAULT_NUM_PERM = 64
+HASHES_PER_DIGEST = 16
+
+# 1つのバケットで比べる代表の上限（同じホストのページが大量にある場合に二乗にならないようにする）
+MAX_BUCKET_REPS = 32
+
+# タイトルの n-gram の長さ（日本語は空白で区切れないので文字単位）
+TITLE_SHINGLE = 3
+
+FEATURE_CACHE_SIZE = 1 << 16
+
+TOKEN_PATTERN = re.compile(r'[0-9a-z]+|[^\x00-\x7f]+')
+TITLE_STRIP_PATTERN = re.compile(r'[\s\W_]+')
+
+
+@lru_cache(maxsize=FEATURE_CACHE_SIZE)
+def feature_hashes(feature, num_perm):
+    """特徴1つの num_perm 個のハッシュ値（MinHashの各成分の候補）"""
+    data = feature.encode('utf-8')
+    digests = b''.join(
+        hashlib.blake2b(data, digest_size=64, salt=i.to_bytes(16, 'little')).digest()
+        for i in range(num_perm // HASHES_PER_DIGEST)
+    )
+    return struct.unpack(f'<{num_perm}I', digests)
+
+
+def url_features(key):
+    """正規化キーの特徴（ホスト名と、パス・パラメータの単語）"""
+    if '://' in key:
+        key = key.split('://', 1)[1]
+    host, _, rest = key.partition('/')
+    features = {'h:' + host.split('?', 1)[0]}
+    features.update('p:' + token for token in TOKEN_PATTERN.findall(rest.lower()))
+    return features
+
+
+def title_features(title):
+    """タイトルの特徴（空白・記号を除いた文字 n-gram）"""
+    text = TITLE_STRIP_PATTERN.sub('', unicodedata.normalize('NFKC', title).lower())
+    if len(text) <= TITLE_SHINGLE:
+        return {'t:' + text} if text else set()
+    return {'t:' + text[i:i + TITLE_SHINGLE] for i in range(len(text) - TITLE_SHINGLE + 1)}
+
+
+def choose_bands(threshold, num_perm):
+    """
+    しきい値に合う (帯の数, 1帯の行数)
+    2件が同じバケットに入る確率が50%前後になる類似度 (1/帯の数)^(1/行数) を threshold に近づける
+    """
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = []
+
+    def add(self):
+        self.parent.append(len(self.parent))
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i, j):
+        i, j = self.find(i), self.find(j)
+        if i != j:
+            self.parent[max(i, j)] = min(i, j)
+
+
+class NearDuplicateIndex:
+    """
+    ブックマークを1件ずつ受け取り、LSHバケットに振り分けながらほぼ重複をまとめる
+    シグネチャは1つの array('I') に並べて持つ（1件あたり num_perm * 4 バイト）
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM):
+        if not 0 < threshold <= 1:
+            raise ValueError(f'threshold は 0 より大きく 1 以下: {threshold}')
+        if num_perm <= 0 or num_perm % HASHES_PER_DIGEST:
+            raise ValueError(f'num_perm は {HASHES_PER_DIGEST} の倍数: {num_perm}')
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands, self.rows = choose_bands(threshold, num_perm)
+        self.signatures = array('I')
+        # 正規化キー -> 番号、番号 -> 同じキーのブックマーク
+        self.keys = {}
+        self.bookmarks = []
+        # (帯, 帯の値) -> そのバケットの代表の番号
+        self.buckets = defaultdict(list)
+        self.groups = _UnionFind()
+        self.skipped = 0
+
+    def __len__(self):
+        return len(self.bookmarks)
+
+    def signature(self, i):
+        return self.signatures[i * self.num_perm:(i + 1) * self.num_perm]
+
+    def similarity(self, i, j):
+        """シグネチャの一致率（Jaccard係数の推定値）"""
+        return sum(a == b for a, b in zip(self.signature(i), self.signature(j))) / self.num_perm
+
+    def add(self, bm):
+        """ブックマークを追加（特徴のないもの・完全な重複は代表に含めるだけ）"""
+        key = canonical_key(bm.url)
+        index = self.keys.get(key)
+        if index is not None:
+            self.bookmarks[index].append(bm)
+            return
+
+        features = url_features(key) | title_features(bm.title) if '://' in bm.url else set()
+        if not features:
+            self.skipped += 1
+            return
+
+        index = self.keys[key] = len(self.bookmarks)
+        self.bookmarks.append([bm])
+        self.groups.add()
+        num_perm = self.num_perm
+        signature = list(map(min, zip(*(feature_hashes(f, num_perm) for f in features))))
+        self.signatures.extend(signature)
+
+        rows = self.rows
+        for band in range(self.bands):
+            reps = self.buckets[band, tuple(signature[band * rows:(band + 1) * rows])]
+            for rep in reps:
+                if self.similarity(rep, index) >= self.threshold:
+                    self.groups.union(rep, index)
+                    break
+            else:
+                if len(reps) < MAX_BUCKET_REPS:
+                    reps.append(index)
+
+    def clusters(self):
+        """
+        2件以上の正規化キーを含むまとまり [[Bookmark, ...], ...]（大きい順）
+        各まとまりは出現順で、同じキーのブックマークも含む
+        """
+        members = defaultdict(list)
+        for index in range(len(self.bookmarks)):
+            members[self.groups.find(index)].append(index)
+        clusters = [
+            [bm for index in indices for bm in self.bookmarks[index]]
+            for _, indices in sorted(members.items()) if len(indices) > 1
+        ]
+        clusters.sort(key=len, reverse=True)
+        return clusters
+
+
+def find_near_duplicates(bookmarks, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM):
+    """ほぼ重複のまとまりを返す（リストでもジェネレーターでも1パス）"""
+    index = NearDuplicateIndex(threshold, num_perm)
+    for bm in bookmarks:
+        index.add(bm)
+    return index.clusters()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ほぼ重複したブックマークを検出（MinHash + LSH）')
+    parser.add_argument('input', nargs='?', default=DEFAULT_INPUT, help='ブックマークファイル')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'まとめる類似度（Jaccard係数、既定 {DEFAULT_THRESHOLD}）')
+    parser.add_argument('--num-perm', type=int, default=DEFAULT_NUM_PERM,
+                        help=f'MinHashシグネチャの長さ（{HASHES_PER_DIGEST}の倍数、既定 {DEFAULT_NUM_PERM}）')
+    parser.add_argument('--top', type=int, default=20, help='表示するまとまりの数')
+    args = parser.parse_args()
+
+    print("="*70)
+    print("ほぼ重複したブックマークの検出")
+    print("="*70)
+
+    index = NearDuplicateIndex(args.threshold, args.num_perm)
+    print(f"\n読み込み中: {args.input}（{index.bands}帯 x {index.rows}行）")
+    total = 0
+    for bm in iter_bookmarks(args.input, use_mmap=True):
+        index.add(bm)
+        total += 1
+    clusters = index.clusters()
+
+    print(f"\n  ブックマーク数: {total:,}個（正規化キー {len(index):,}種類、対象外 {index.skipped:,}個）")
+    print(f"  ほぼ重複のまとまり: {len(clusters):,}個"
+          f"（合計 {sum(len(cluster) for cluster in clusters):,}個のブックマーク）")
+
+    for i, cluster in enumerate(clusters[:args.top], 1):
+        print(f"\n【{i}】 {len(cluster)}個")
+        for bm in cluster[:10]:
+            title = bm.title[:40] + '...' if len(bm.title) > 40 else bm.title
+            url = bm.url[:70] + '...' if len(bm.url) > 70 else bm.url
+            print(f"  {title}\n    {url}")
+        if len(cluster) > 10:
+            print(f"  ...ほか {len(cluster) - 10}個")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Netscapeブックマーク形式専用のトークナイザー
+HTMLParserの代わりに、<DL>/<DT>/<H3>/<A> などの単純なタグだけを想定した
+状態機械でバイト列を走査し、HTMLParser互換のハンドラを呼び出す
+ICON のような大きな属性値は、デコードせずファイル内の位置だけを記録することもできる
+"""
+
+import re
+from html import unescape
+
+# タグ名
+TAG_NAME_PATTERN = re.compile(rb'[A-Za-z][^\s/>]*')
+
+# 属性（名前、'=' の有無、ダブルクォート・シングルクォート・クォートなしの値）
+ATTR_PATTERN = re.compile(
+    rb'([^\s"\'>/=]+)(\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'>]+)))?'
+)
+
+DECODE_ERRORS = 'replace'
+
+# タグ名・属性名のデコード結果（種類が少ないので使い回す）
+_names = {}
+
+
+def _name(raw):
+    name = _names.get(raw)
+    if name is None:
+        name = _names[raw] = raw.lower().decode('ascii', DECODE_ERRORS)
+    return name
+
+
+def _decode(raw):
+    """バイト列を文字列にし、必要な場合のみ文字参照を展開"""
+    text = raw.decode('utf-8', DECODE_ERRORS)
+    if '&' in text:
+        # URLに多い '&amp;' だけなら正規表現を使わずに置換
+        if text.count('&') == text.count('&amp;'):
+            return text.replace('&amp;', '&')
+        return unescape(text)
+    return text
+
+
+class AttributeRef:
+    """
+    デコードしていない属性値への参照（ファイル内のバイト位置と長さ）
+    値が必要になったときに read() でファイルから読み出す
+    """
+
+    __slots__ = ('source', 'offset', 'length')
+
+    def __init__(self, source, offset, length):
+        self.source = source
+        self.offset = offset
+        self.length = length
+
+    def read(self):
+        """属性値を読み出してデコード"""
+        with open(self.source, 'rb') as f:
+            f.seek(self.offset)
+            return _decode(f.read(self.length))
+
+    def read_from(self, data):
+        """ファイル全体を開いたバッファ（mmap など）から読み出してデコード"""
+        return _decode(data[self.offset:self.offset + self.length])
+
+    def __repr__(self):
+        return f'AttributeRef({self.source!r}, offset={self.offset}, length={self.length})'
+
+
+class NetscapeTokenizer:
+    """
+    ブックマークHTMLをチャンク単位で受け取り、タグ・テキストごとに
+    handler.handle_starttag / handle_endtag / handle_data を呼び出す
+
+    タグ名・属性名は HTMLParser と同じく小文字、属性値とテキストは文字参照を展開済み
+    テキストは次の '<' が届くまで保留するため、途中で分割されない
+
+    lazy_attrs に属性名（小文字）を指定すると、その値は文字列の代わりに
+    AttributeRef として渡される（source は読み込み中のファイルパス）
+
+    handler が handle_position(開始, 終了) を持つ場合は、各タグのハンドラを呼ぶ直前に
+    そのタグのファイル内バイト範囲を渡す
+    """
+
+    def __init__(self, handler, lazy_attrs=(), source=None):
+        self.handler = handler
+        self.handle_position = getattr(handler, 'handle_position', None)
+        self.lazy_attrs = frozenset(lazy_attrs) if source is not None else frozenset()
+        self.source = source
+        self.buffer = b''
+        # buffer先頭のファイル内バイト位置
+        self.offset = 0
+
+    def feed(self, data):
+        buf = self.buffer + data if self.buffer else data
+        pos = self._scan(buf, final=False)
+        self.offset += pos
+        self.buffer = buf[pos:]
+
+    def close(self):
+        if self.buffer:
+            pos = self._scan(self.buffer, final=True)
+            self.offset += pos
+        self.buffer = b''
+
+    def _scan(self, buf, final):
+        """buf を走査し、処理し終えた位置を返す"""
+        handler = self.handler
+        n = len(buf)
+        pos = 0
+
+        while pos < n:
+            lt = buf.find(b'<', pos)
+            if lt < 0:
+                if final:
+                    handler.handle_data(_decode(buf[pos:]))
+                    pos = n
+                break
+
+            if lt + 1 >= n and not final:
+                break
+
+            if lt > pos:
+                handler.handle_data(_decode(buf[pos:lt]))
+                pos = lt
+
+            kind = buf[lt + 1:lt + 2]
+
+            # コメント・DOCTYPE
+            if kind == b'!':
+                if buf.startswith(b'<!--', lt):
+                    end = buf.find(b'-->', lt + 4)
+                    if end < 0:
+                        break
+                    pos = end + 3
+                else:
+                    gt = buf.find(b'>', lt)
+                    if gt < 0:
+                        break
+                    pos = gt + 1
+                continue
+
+            # タグでない '<' はテキスト扱い
+            if kind != b'/' and not kind.isalpha():
+                handler.handle_data('<')
+                pos = lt + 1
+                continue
+
+            # 引用符内の '>' を飛ばしてタグの終端を探す
+            gt = buf.find(b'>', lt)
+            while gt >= 0 and buf.count(b'"', lt, gt) % 2:
+                gt = buf.find(b'>', gt + 1)
+            if gt < 0:
+                break
+
+            if self.handle_position is not None:
+                self.handle_position(self.offset + lt, self.offset + gt + 1)
+
+            if kind == b'/':
+                handler.handle_endtag(_name(buf[lt + 2:gt].strip()))
+            else:
+                self._handle_starttag(buf, lt, gt)
+
+            pos = gt + 1
+
+        return pos
+
+    def _handle_starttag(self, buf, lt, gt):
+        match = TAG_NAME_PATTERN.match(buf, lt + 1, gt)
+        if self.lazy_attrs:
+            attrs = self._lazy_attrs(buf, match.end(), gt)
+        else:
+            attrs = [
+                (_name(name), _decode(quoted or single or bare) if eq else None)
+                for name, eq, quoted, single, bare in ATTR_PATTERN.findall(buf, match.end(), gt)
+            ]
+        self.handler.handle_starttag(_name(match.group(0)), attrs)
+
+    def _lazy_attrs(self, buf, start, end):
+        """lazy_attrs の値は AttributeRef にし、それ以外は通常どおりデコード"""
+        lazy_attrs = self.lazy_attrs
+        attrs = []
+        for match in ATTR_PATTERN.finditer(buf, start, end):
+            raw_name, eq, quoted, single, bare = match.groups()
+            name = _name(raw_name)
+            if not eq:
+                attrs.append((name, None))
+            elif name in lazy_attrs:
+                group = 3 if quoted is not None else 4 if single is not None else 5
+                value_start, value_end = match.span(group)
+                if value_end > value_start:
+                    value = AttributeRef(self.source, self.offset + value_start, value_end - value_start)
+                else:
+                    value = ''
+                attrs.append((name, value))
+            else:
+                attrs.append((name, _decode(quoted or single or bare or b'')))
+        return attrs
+
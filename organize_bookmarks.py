@@ -4,94 +4,151 @@ Chromeブックマーク整理スクリプト
 重複、無効なリンク、不要なブックマークを削除して整理済みHTMLを生成
 """
 
-import re
 from collections import defaultdict, Counter
 from html.parser import HTMLParser
 from urllib.parse import urlparse
 import sys
 
+from bookmark_document import FOLDER_END, BookmarkDocument, FolderEntry
+from bookmark_model import Bookmark, FolderTable
+from bookmark_stream import feed_file
+from parse_cache import cached_document
+from url_canon import canonical_key
+from url_classify import VALID, classify_url, classify_urls
+
+# url_classify の理由コード -> 無効な理由
+INVALID_REASONS = ('valid', 'empty', 'chrome_url', 'javascript', 'file', 'localhost', 'invalid_protocol')
+
 class BookmarkParser(HTMLParser):
-    """ブックマークHTMLをパースするクラス"""
+    """ブックマークHTMLをパースするクラス（属性を保持した文書モデルも組み立てる）"""
 
     def __init__(self):
         super().__init__()
         self.bookmarks = []
-        self.folder_stack = []
+        self.document = BookmarkDocument()
+        self.folders = self.document.folders
+        self.folder_stack = [FolderTable.ROOT]
+        # DLごとにフォルダを開いたかどうか
+        self.dl_stack = []
         self.current_bookmark = None
         self.pending_folder = None
         self.in_h3 = False
+        # TITLE / H1 の中
+        self.header_tag = None
+        self.current_text = ''
+        # 直前のタグのバイト範囲と、ブックマークの <DT> の開始位置
+        self.tag_span = None
+        self.entry_start = None
+
+    def handle_position(self, start, end):
+        """NetscapeTokenizer から各タグの元ファイル内の範囲を受け取る"""
+        self.tag_span = (start, end)
 
     def handle_starttag(self, tag, attrs):
-        attrs_dict = dict(attrs)
+        if self.tag_span is not None:
+            # <DT> の直後の <A> なら <DT> から、そうでなければ <A> からをブックマークの範囲にする
+            if tag == 'a' and self.entry_start is None:
+                self.entry_start = self.tag_span[0]
+            elif tag != 'a':
+                self.entry_start = self.tag_span[0] if tag == 'dt' else None
 
         if tag == 'h3':
-            # フォルダ開始
+            # フォルダ開始（属性は元の順序のまま保持）
             self.in_h3 = True
             self.pending_folder = {
                 'name': '',
-                'attrs': attrs_dict
+                'attrs': tuple(attrs)
             }
 
         elif tag == 'a':
-            # ブックマーク
-            self.current_bookmark = {
-                'url': attrs_dict.get('href', ''),
-                'add_date': attrs_dict.get('add_date', ''),
-                'icon': attrs_dict.get('icon', ''),
-                'folder_path': '/'.join(self.folder_stack),
-                'title': '',
-                'attrs': attrs_dict
-            }
+            # ブックマーク（属性は Bookmark.attrs で復元できるので重複して持たない）
+            self.current_text = ''
+            self.current_bookmark = Bookmark.from_attrs(
+                attrs,
+                folder_id=self.folder_stack[-1],
+                folders=self.folders
+            )
 
         elif tag == 'dl':
             # 新しいフォルダ階層開始
-            if self.pending_folder:
-                self.folder_stack.append(self.pending_folder['name'])
-                self.pending_folder = None
+            folder = self.pending_folder
+            self.pending_folder = None
+            self.dl_stack.append(folder is not None)
+            if folder is not None:
+                folder_id = self.folders.child(self.folder_stack[-1], folder['name'])
+                self.folder_stack.append(folder_id)
+                self.document.entries.append(FolderEntry(folder['name'], folder['attrs'], folder_id))
+
+        elif tag in ('title', 'h1'):
+            self.header_tag = tag
+            self.current_text = ''
 
     def handle_endtag(self, tag):
         if tag == 'h3':
             self.in_h3 = False
 
+        elif tag == 'a':
+            if self.current_bookmark is not None:
+                # ブックマークタイトル（タイトルのないものは文書にだけ残す）
+                bookmark = self.current_bookmark
+                bookmark.title = self.current_text.strip()
+                self.document.entries.append(bookmark)
+                if self.tag_span is not None:
+                    self.document.spans.extend((self.entry_start, self.tag_span[1]))
+                    self.entry_start = None
+                if bookmark.title:
+                    self.bookmarks.append(bookmark)
+                self.current_bookmark = None
+
         elif tag == 'dl':
             # フォルダ階層終了
-            if self.folder_stack:
+            if self.dl_stack and self.dl_stack.pop():
                 self.folder_stack.pop()
+                self.document.entries.append(FOLDER_END)
+
+        elif tag == self.header_tag:
+            if tag == 'title':
+                self.document.title = self.current_text.strip()
+            else:
+                self.document.heading = self.current_text.strip()
+            self.header_tag = None
 
     def handle_data(self, data):
-        data = data.strip()
-        if not data:
+        if self.current_bookmark is not None or self.header_tag is not None:
+            self.current_text += data
             return
 
-        if self.in_h3 and self.pending_folder:
+        data = data.strip()
+        if data and self.in_h3 and self.pending_folder:
             # フォルダ名
             self.pending_folder['name'] = data
 
-        elif self.current_bookmark is not None:
-            # ブックマークタイトル
-            self.current_bookmark['title'] = data
-            self.bookmarks.append(self.current_bookmark)
-            self.current_bookmark = None
+def parse_bookmark_document(filepath):
+    """
+    ブックマークHTMLを解析して BookmarkDocument を返す（ICONは遅延読み込み）
+    HTMLの場合は各ブックマークの元ファイル内の範囲も記録する
+    """
+    parser = BookmarkParser()
+    feed_file(parser, filepath, lazy_icons=True)
+    if parser.tag_span is not None:
+        # 範囲はトークナイザーで読んだHTMLのときだけ記録される
+        parser.document.source = filepath
+    return parser.document
+
+def parse_bookmark_file(filepath):
+    """ブックマークHTMLを解析して Bookmark のリストを返す（ICONは遅延読み込み）"""
+    parser = BookmarkParser()
+    feed_file(parser, filepath, lazy_icons=True)
+    return parser.bookmarks
+
+def titled_bookmarks(document):
+    """分析対象のブックマーク（タイトルのあるもの）"""
+    return [bm for bm in document.bookmarks() if bm.title]
 
 def is_valid_url(url):
     """URLが有効かチェック"""
-    if not url or not url.strip():
-        return False, 'empty'
-
-    url = url.strip()
-
-    if url.startswith('chrome://') or url.startswith('chrome-extension://'):
-        return False, 'chrome_url'
-    if url.startswith('javascript:'):
-        return False, 'javascript'
-    if url.startswith('file://'):
-        return False, 'file'
-    if 'localhost' in url or '127.0.0.1' in url:
-        return False, 'localhost'
-    if not url.startswith('http'):
-        return False, 'invalid_protocol'
-
-    return True, 'valid'
+    code = classify_url(url)
+    return code == VALID, INVALID_REASONS[code]
 
 def analyze_bookmarks(bookmarks):
     """ブックマークを詳細分析"""
@@ -103,20 +160,22 @@ def analyze_bookmarks(bookmarks):
     # 統計情報
     domains = Counter()
     protocols = Counter()
-    folder_counts = Counter()
     invalid_reasons = Counter()
 
     valid_count = 0
     invalid_bookmarks = []
+    folders = None
+    folder_ids = []
 
-    for bm in bookmarks:
+    # URL検証（まとめて理由コードにする）
+    codes = classify_urls([bm['url'] for bm in bookmarks])
+
+    for bm, code in zip(bookmarks, codes):
         url = bm['url']
-        folder = bm['folder_path'] or '(ルート)'
-        folder_counts[folder] += 1
+        folders = bm.folders
+        folder_ids.append(bm.folder_id)
 
-        # URL検証
-        is_valid, reason = is_valid_url(url)
-        if is_valid:
+        if code == VALID:
             valid_count += 1
             try:
                 parsed = urlparse(url)
@@ -125,9 +184,14 @@ def analyze_bookmarks(bookmarks):
             except:
                 pass
         else:
-            invalid_reasons[reason] += 1
+            invalid_reasons[INVALID_REASONS[code]] += 1
             invalid_bookmarks.append(bm)
 
+    # フォルダ別集計（パス文字列はフォルダごとに1回だけ作る）
+    folder_counts = Counter()
+    if folders is not None:
+        folder_counts.update(folders.path_counts(folders.bincount(folder_ids), root_label='(ルート)'))
+
     # ドメイン別集計
     print("\n【トップ30ドメイン】")
     for i, (domain, count) in enumerate(domains.most_common(30), 1):
@@ -162,11 +226,11 @@ def analyze_bookmarks(bookmarks):
     }
 
 def find_duplicates(bookmarks):
-    """重複URLを検出"""
+    """重複URLを検出（正規化キーが同じものを重複とみなす）"""
 
     url_to_bookmarks = defaultdict(list)
     for bm in bookmarks:
-        url_to_bookmarks[bm['url']].append(bm)
+        url_to_bookmarks[canonical_key(bm['url'])].append(bm)
 
     duplicates = {url: bms for url, bms in url_to_bookmarks.items() if len(bms) > 1}
     total_duplicate_count = sum(len(bms) for bms in duplicates.values())
@@ -198,9 +262,10 @@ def clean_bookmarks(bookmarks, duplicates):
 
     for bm in bookmarks:
         url = bm['url']
+        url_key = canonical_key(url)
 
         # 重複チェック
-        if url in seen_urls:
+        if url_key in seen_urls:
             removed_count['duplicate'] += 1
             continue
 
@@ -210,7 +275,7 @@ def clean_bookmarks(bookmarks, duplicates):
             removed_count['invalid'] += 1
             continue
 
-        seen_urls.add(url)
+        seen_urls.add(url_key)
         cleaned.append(bm)
 
     print(f"\n{'='*70}")
@@ -226,44 +291,26 @@ def clean_bookmarks(bookmarks, duplicates):
 
     return cleaned
 
-def generate_cleaned_html(original_html_path, cleaned_bookmarks):
-    """整理済みHTMLを生成"""
+def generate_cleaned_html(original_html_path, document, cleaned_bookmarks):
+    """
+    整理済みHTMLを生成
+    元のファイル内の位置が記録されていれば、削除するブックマークの行以外をそのままコピーし、
+    なければ文書モデルから書き出す
+    """
 
-    # URLセットを作成（高速検索用）
-    valid_urls = {bm['url'] for bm in cleaned_bookmarks}
+    # clean_bookmarks が残したブックマークそのもの（重複は最初の1つ）だけを残す
+    kept = {id(bm) for bm in cleaned_bookmarks}
 
-    # 元のHTMLを読み込み
-    with open(original_html_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
+    def keep(bm):
+        return id(bm) in kept
 
-    # 新しいHTMLを生成
-    output_lines = []
-    skip_next_line = False
-
-    for i, line in enumerate(lines):
-        if skip_next_line:
-            skip_next_line = False
-            continue
-
-        # ブックマーク行かチェック
-        if '<A HREF=' in line or '<A href=' in line:
-            # URLを抽出
-            href_match = re.search(r'HREF="([^"]*)"', line, re.IGNORECASE)
-            if href_match:
-                url = href_match.group(1)
-                # 有効なURLのみ残す
-                if url in valid_urls:
-                    output_lines.append(line)
-                # else: この行はスキップ（削除）
-            else:
-                output_lines.append(line)
-        else:
-            output_lines.append(line)
-
-    # ファイルに書き出し
     output_path = original_html_path.replace('.html', '_cleaned.html')
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.writelines(output_lines)
+    if document.has_spans():
+        with open(output_path, 'wb') as f:
+            document.splice(f, keep)
+    else:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            document.write(f, keep=keep)
 
     print(f"整理済みブックマークを保存: {output_path}\n")
     return output_path
@@ -319,12 +366,8 @@ def main():
 
     # ステップ1: HTMLパース
     print(f"[1/5] ブックマークファイル読み込み中... ({input_file})")
-    with open(input_file, 'r', encoding='utf-8') as f:
-        html_content = f.read()
-
-    parser = BookmarkParser()
-    parser.feed(html_content)
-    bookmarks = parser.bookmarks
+    document = cached_document(input_file, 'document', parse_bookmark_document)
+    bookmarks = titled_bookmarks(document)
     print(f"      完了: {len(bookmarks):,}個のブックマークを検出\n")
 
     # ステップ2: 分析
@@ -341,7 +384,7 @@ def main():
 
     # ステップ5: 整理済みHTML生成
     print("[5/5] 整理済みHTMLファイル生成中...")
-    output_path = generate_cleaned_html(input_file, cleaned_bookmarks)
+    output_path = generate_cleaned_html(input_file, document, cleaned_bookmarks)
 
     # レポート保存
     save_analysis_report(bookmarks, analysis, duplicates)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大きなブックマークファイルの並列解析
+<DT><H3>…<DL>…</DL> のフォルダ範囲（バイト位置）を簡易走査で求め、
+範囲ごとにプロセスプールで解析してから1つのツリーにつなぎ合わせる
+
+対象のパーサーは HierarchicalBookmarkParser / StudyBookmarkFilter のように
+tree と current_path（フォルダ辞書のスタック）を持ち、子要素を
+current_path[-1]['children'] に追加するもの。stats（整数の辞書）があれば合算する
+"""
+
+import heapq
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from bookmark_stream import feed_file, profile_reader
+from netscape_tokenizer import NetscapeTokenizer
+
+# これより小さいファイルは並列化しない
+PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+
+# 1タスクの最小サイズ
+MIN_TASK_BYTES = 256 * 1024
+
+# 1ワーカーあたりのタスク数の目安
+TASKS_PER_WORKER = 4
+
+FOLDER_TAG_PATTERN = re.compile(rb'<(/?)(DL|H3)[\s>]', re.IGNORECASE)
+
+
+def scan_folder_ranges(data):
+    """
+    フォルダのバイト範囲を求める
+    各フォルダは [開始(<DT>), 見出し終了(<DL>の直後), 終了(</DL>の直後), 親, 子のリスト]
+    タグの対応が取れない場合は None
+    """
+    folders = []
+    stack = []
+    pending = None
+
+    for match in FOLDER_TAG_PATTERN.finditer(data):
+        pos = match.start()
+        closing, tag = match.groups()
+        tag = tag.upper()
+
+        if tag == b'H3':
+            if not closing:
+                pending = pos - 4 if data[pos - 4:pos].upper() == b'<DT>' else pos
+
+        elif not closing:
+            if pending is None:
+                # フォルダでないDL（ルート）
+                stack.append(None)
+                continue
+            parent = next((i for i in reversed(stack) if i is not None), None)
+            header_end = data.find(b'>', pos) + 1
+            folders.append([pending, header_end, None, parent, []])
+            if parent is not None:
+                folders[parent][4].append(len(folders) - 1)
+            stack.append(len(folders) - 1)
+            pending = None
+
+        else:
+            if not stack:
+                return None
+            index = stack.pop()
+            if index is not None:
+                folders[index][2] = data.find(b'>', pos) + 1
+
+    if stack or any(folder[2] is None for folder in folders):
+        return None
+    return folders
+
+
+def split_tasks(folders, target_size):
+    """
+    フォルダ範囲をタスクに分ける
+    大きすぎるフォルダは子フォルダに分解し、同じ親の隣り合う範囲はまとめる
+    (親フォルダ, 開始, 終了) のリストを返す
+    """
+    def size(i):
+        return folders[i][2] - folders[i][0]
+
+    top_level = [i for i, folder in enumerate(folders) if folder[3] is None]
+    heap = [(-size(i), i) for i in top_level]
+    heapq.heapify(heap)
+    units = []
+
+    while heap:
+        neg_size, i = heapq.heappop(heap)
+        children = folders[i][4]
+        if -neg_size > target_size and children:
+            for child in children:
+                heapq.heappush(heap, (-size(child), child))
+        else:
+            units.append(i)
+
+    units.sort(key=lambda i: folders[i][0])
+
+    tasks = []
+    for i in units:
+        start, _, end, parent, _ = folders[i]
+        if tasks:
+            last_parent, last_start, last_end = tasks[-1]
+            if last_parent == parent and end - last_start <= target_size:
+                tasks[-1] = (parent, last_start, end)
+                continue
+        tasks.append((parent, start, end))
+    return tasks
+
+
+def ancestor_prefix(data, folders, parent):
+    """親フォルダまでの見出し（<DT><H3>…</H3><DL>）を連結したバイト列と深さ"""
+    chain = []
+    while parent is not None:
+        chain.append(parent)
+        parent = folders[parent][3]
+    chain.reverse()
+    return b''.join(data[folders[i][0]:folders[i][1]] for i in chain), len(chain)
+
+
+def _parse_task(args):
+    """ワーカー: 祖先の見出しに続けて範囲を解析し、追加された子要素と統計を返す"""
+    parser_class, filepath, prefix, start, end, depth = args
+    with open(filepath, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    parser = parser_class()
+    tokenizer = NetscapeTokenizer(parser)
+    tokenizer.feed(prefix + data)
+    tokenizer.close()
+
+    node = parser.tree
+    for _ in range(depth):
+        node = node['children'][-1]
+    return node['children'], getattr(parser, 'stats', None)
+
+
+class _Slot:
+    """並列解析の結果を差し込む位置"""
+
+
+def parse_file_parallel(parser_class, filepath, workers=None, min_bytes=PARALLEL_MIN_BYTES):
+    """
+    parser_class のパーサーでファイルを解析して返す
+    小さなファイルや範囲に分けられない場合は通常の feed_file で解析する
+    """
+    workers = workers or os.cpu_count() or 1
+    file_size = os.path.getsize(filepath)
+    parser = parser_class()
+
+    if workers < 2 or file_size < min_bytes or profile_reader(filepath) is not None:
+        return feed_file(parser, filepath)
+
+    with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        folders = scan_folder_ranges(data)
+        if not folders:
+            return feed_file(parser, filepath)
+
+        target_size = max(file_size // (workers * TASKS_PER_WORKER), MIN_TASK_BYTES)
+        tasks = split_tasks(folders, target_size)
+        if len(tasks) < 2:
+            return feed_file(parser, filepath)
+
+        jobs = []
+        for parent, start, end in tasks:
+            prefix, depth = ancestor_prefix(data, folders, parent)
+            jobs.append((parser_class, filepath, prefix, start, end, depth))
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(_parse_task, jobs)
+
+            # 範囲以外の部分（骨組み）をこのプロセスで解析し、範囲の位置に目印を置く
+            tokenizer = NetscapeTokenizer(parser)
+            slots = []
+            pos = 0
+            for _, start, end in tasks:
+                tokenizer.feed(data[pos:start])
+                slot = _Slot()
+                siblings = parser.current_path[-1]['children']
+                siblings.append(slot)
+                slots.append((siblings, slot))
+                pos = end
+            tokenizer.feed(data[pos:])
+            tokenizer.close()
+
+            # 目印を解析結果に置き換える
+            stats = getattr(parser, 'stats', None)
+            for (siblings, slot), (children, task_stats) in zip(slots, results):
+                index = next(i for i, child in enumerate(siblings) if child is slot)
+                siblings[index:index + 1] = children
+                if stats is not None and task_stats:
+                    for key, value in task_stats.items():
+                        stats[key] = stats.get(key, 0) + value
+
+    return parser
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ブックマークHTMLの解析結果キャッシュ
+入力ファイルの内容ハッシュとパーサーのバージョンをキーに、解析結果を
+入力ファイルの隣（<入力ファイル>.<種類>.parsecache）へ marshal 形式で保存する
+同じ内容のファイルを再度読むときはHTMLを解析せずにキャッシュから復元する
+
+環境変数 BOOKMARK_PARSE_CACHE=0 でキャッシュを無効にできる
+"""
+
+import hashlib
+import marshal
+import os
+
+from bookmark_document import FOLDER_END, BookmarkDocument, FolderEntry
+from bookmark_model import Bookmark, FolderTable
+from bookmark_stream import BOOKMARK, FOLDER_START, iter_bookmarks, iter_events
+from bookmark_stream import FOLDER_END as EVENT_FOLDER_END
+from netscape_tokenizer import AttributeRef
+
+# 解析結果の形式を変えたら上げる
+PARSER_VERSION = 3
+
+CACHE_SUFFIX = '.parsecache'
+CACHE_MAGIC = 'bookmark-parse-cache'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def cache_enabled():
+    return os.environ.get('BOOKMARK_PARSE_CACHE', '1') != '0'
+
+
+def file_digest(filepath):
+    """ファイル内容のハッシュ値"""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(filepath, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_path(filepath, kind):
+    return f'{filepath}.{kind}{CACHE_SUFFIX}'
+
+
+def load_cache(filepath, kind, digest, version=PARSER_VERSION):
+    """キャッシュが有効ならデータを返し、なければ None"""
+    try:
+        with open(cache_path(filepath, kind), 'rb') as f:
+            # ヘッダーだけ先に読み、キーが一致したときだけ本体を読む
+            header = marshal.load(f)
+            if header != (CACHE_MAGIC, kind, version, digest):
+                return None
+            # marshal.load(f) は少しずつ読むため、本体はまとめて読んでから復元する
+            return marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def save_cache(filepath, kind, digest, data, version=PARSER_VERSION):
+    """キャッシュを書き込む（書き込めない場合は何もしない）"""
+    path = cache_path(filepath, kind)
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            marshal.dump((CACHE_MAGIC, kind, version, digest), f)
+            marshal.dump(data, f)
+        os.replace(tmp_path, path)
+    except (OSError, ValueError):
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def load_cached(filepath, kind, decode, version=PARSER_VERSION):
+    """キャッシュがあればその結果を返し、なければ None（解析はしない）"""
+    if not cache_enabled():
+        return None
+    data = load_cache(filepath, kind, file_digest(filepath), version)
+    if data is None:
+        return None
+    return decode(filepath, data)
+
+
+def cached_parse(filepath, kind, parse, encode, decode, version=PARSER_VERSION):
+    """
+    parse(filepath) の結果をキャッシュ付きで返す
+    encode は結果を marshal 可能な値に、decode はその逆に変換する関数
+    """
+    if not cache_enabled():
+        return parse(filepath)
+
+    digest = file_digest(filepath)
+    data = load_cache(filepath, kind, digest, version)
+    if data is not None:
+        return decode(filepath, data)
+
+    result = parse(filepath)
+    save_cache(filepath, kind, digest, encode(result), version)
+    return result
+
+
+# --- Bookmark の変換 ---
+
+def _encode_icon(icon):
+    if isinstance(icon, AttributeRef):
+        return (icon.offset, icon.length)
+    return icon
+
+
+def _decode_icon(filepath, icon):
+    if isinstance(icon, tuple):
+        return AttributeRef(filepath, icon[0], icon[1])
+    return icon
+
+
+def encode_bookmark(bm):
+    """フォルダ表を除いた Bookmark をタプルにする"""
+    return (bm.url, bm.title, bm.add_date, _encode_icon(bm.icon), bm.folder_id, bm.level, bm.extra)
+
+
+def decode_bookmark(filepath, data, folders=None):
+    url, title, add_date, icon, folder_id, level, extra = data
+    return Bookmark(url, title, add_date, _decode_icon(filepath, icon), folder_id, folders, level, extra)
+
+
+def encode_folder_table(folders):
+    return (list(folders.parents), folders.names)
+
+
+def encode_bookmarks(bookmarks):
+    """
+    Bookmark のリストを列ごとのリストにする
+    フォルダ表は全件で共有されている前提で1回だけ保存する
+    """
+    folders = next((bm.folders for bm in bookmarks if bm.folders is not None), None)
+    table = encode_folder_table(folders) if folders is not None else None
+    return (
+        table,
+        [bm.url for bm in bookmarks],
+        [bm.title for bm in bookmarks],
+        [bm.add_date for bm in bookmarks],
+        [_encode_icon(bm.icon) for bm in bookmarks],
+        [bm.folder_id for bm in bookmarks],
+        [bm.level for bm in bookmarks],
+        [bm.extra for bm in bookmarks],
+    )
+
+
+def decode_folder_table(table):
+    parents, names = table
+    folders = FolderTable()
+    folders.parents.extend(parents[1:])
+    folders.names.extend(names[1:])
+    folders.ids = {
+        (parent_id, name): folder_id
+        for folder_id, (parent_id, name) in enumerate(zip(parents, names)) if folder_id
+    }
+    return folders
+
+
+def decode_bookmarks(filepath, data):
+    table, urls, titles, add_dates, icons, folder_ids, levels, extras = data
+    folders = decode_folder_table(table) if table is not None else None
+    return [
+        Bookmark(url, title, add_date, _decode_icon(filepath, icon), folder_id, folders, level, extra)
+        for url, title, add_date, icon, folder_id, level, extra
+        in zip(urls, titles, add_dates, icons, folder_ids, levels, extras)
+    ]
+
+
+def cached_bookmarks(filepath, kind, parse, version=PARSER_VERSION):
+    """Bookmark のリストを返す parse の結果をキャッシュ付きで返す"""
+    return cached_parse(filepath, kind, parse, encode_bookmarks, decode_bookmarks, version)
+
+
+# --- BookmarkDocument の変換 ---
+
+def encode_document(document):
+    """
+    文書を (タイトル, 見出し, フォルダ表, 並び, フォルダの列, ブックマークの列, 範囲) にする
+    並びは文書の順に 'F'（フォルダ開始）/ 'B'（ブックマーク）/ 'E'（フォルダ終了）を並べた文字列
+    範囲は元ファイルの位置を記録していない場合 None
+    """
+    layout = []
+    folders = []
+    bookmarks = []
+    for entry in document.entries:
+        if entry is FOLDER_END:
+            layout.append('E')
+        elif isinstance(entry, FolderEntry):
+            layout.append('F')
+            folders.append(entry)
+        else:
+            layout.append('B')
+            bookmarks.append(entry)
+
+    return (
+        document.title,
+        document.heading,
+        encode_folder_table(document.folders),
+        ''.join(layout),
+        (
+            [entry.name for entry in folders],
+            [tuple((name, _encode_icon(value)) for name, value in entry.attrs) for entry in folders],
+            [entry.folder_id for entry in folders],
+        ),
+        encode_bookmarks(bookmarks)[1:],
+        document.spans.tobytes() if document.source is not None else None,
+    )
+
+
+def decode_document(filepath, data):
+    title, heading, table, layout, folder_columns, bookmark_columns, spans = data
+    document = BookmarkDocument(title, heading, decode_folder_table(table))
+    if spans is not None:
+        document.source = filepath
+        document.spans.frombytes(spans)
+    folders = iter([
+        FolderEntry(name, tuple((key, _decode_icon(filepath, value)) for key, value in attrs), folder_id)
+        for name, attrs, folder_id in zip(*folder_columns)
+    ])
+    # フォルダ表は文書のものを共有する
+    bookmarks = iter(decode_bookmarks(filepath, (None,) + bookmark_columns))
+    entries = document.entries
+    for kind in layout:
+        if kind == 'E':
+            entries.append(FOLDER_END)
+        elif kind == 'F':
+            entries.append(next(folders))
+        else:
+            bookmark = next(bookmarks)
+            bookmark.folders = document.folders
+            entries.append(bookmark)
+    return document
+
+
+def cached_document(filepath, kind, parse, version=PARSER_VERSION):
+    """BookmarkDocument を返す parse の結果をキャッシュ付きで返す"""
+    return cached_parse(filepath, kind, parse, encode_document, decode_document, version)
+
+
+# --- parse_bookmarks_simple（URLとタイトルのみ）---
+
+def _parse_simple(filepath):
+    return list(iter_bookmarks(filepath, use_mmap=True))
+
+
+def _encode_simple(bookmarks):
+    return ([bm.url for bm in bookmarks], [bm.title for bm in bookmarks])
+
+
+def _decode_simple(filepath, data):
+    urls, titles = data
+    return [Bookmark(url, title) for url, title in zip(urls, titles)]
+
+
+def cached_simple_bookmarks(filepath):
+    """parse_bookmarks_simple と同じ結果（URLとタイトルのみ）をキャッシュ付きで返す"""
+    return cached_parse(filepath, 'simple', _parse_simple, _encode_simple, _decode_simple)
+
+
+def load_simple_bookmarks(filepath):
+    """cached_simple_bookmarks のキャッシュがあればその結果、なければ None"""
+    return load_cached(filepath, 'simple', _decode_simple)
+
+
+# --- iter_events のイベント列 ---
+
+def _parse_events(filepath):
+    return list(iter_events(filepath, lazy_icons=True))
+
+
+def _encode_events(events):
+    """
+    イベント列を (並び, フォルダの列, ブックマークの列) にする
+    並びはイベントの順に 'F'（フォルダ開始）/ 'B'（ブックマーク）/ 'E'（フォルダ終了）を並べた文字列
+    """
+    layout = []
+    folders = []
+    bookmarks = []
+    for kind, data in events:
+        if kind == FOLDER_START:
+            layout.append('F')
+            folders.append(data)
+        elif kind == BOOKMARK:
+            layout.append('B')
+            bookmarks.append(data)
+        else:
+            layout.append('E')
+
+    return (
+        ''.join(layout),
+        (
+            [folder['name'] for folder in folders],
+            [tuple((name, _encode_icon(value)) for name, value in folder['attrs'].items()) for folder in folders],
+            [folder['id'] for folder in folders],
+        ),
+        encode_bookmarks(bookmarks),
+    )
+
+
+def _decode_events(filepath, data):
+    layout, folder_columns, bookmark_columns = data
+    folders = iter([
+        {'name': name, 'attrs': {key: _decode_icon(filepath, value) for key, value in attrs}, 'id': folder_id}
+        for name, attrs, folder_id in zip(*folder_columns)
+    ])
+    bookmarks = iter(decode_bookmarks(filepath, bookmark_columns))
+    events = []
+    for kind in layout:
+        if kind == 'F':
+            events.append((FOLDER_START, next(folders)))
+        elif kind == 'B':
+            events.append((BOOKMARK, next(bookmarks)))
+        else:
+            events.append((EVENT_FOLDER_END, None))
+    return events
+
+
+def cached_events(filepath):
+    """
+    iter_events(filepath, lazy_icons=True) と同じイベントのリストをキャッシュ付きで返す
+    フィルター・分類器の結果ではなく解析結果を保存するので、判定の規則を変えても古い結果は使われない
+    """
+    return cached_parse(filepath, 'events', _parse_events, _encode_events, _decode_events)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+重複判定に使う「見たURL」の集合（seen_urls）の置き場所
+既定はメモリ上の set で、ファイルを指定すると SqliteSeenSet を使う
+
+SqliteSeenSet は正規化キーの64ビットハッシュを SQLite の表に保存し、その手前に大きさ固定の
+Bloomフィルターを置く。Bloomフィルターで「見ていない」と分かったものは表を引かずに済み、
+「見たかもしれない」ときだけ表で確かめるので誤判定はない（64ビットハッシュの衝突を除く）
+メモリ使用量は Bloomフィルターと書き込み待ちのバッファ分で一定
+
+この実行で追加したキーは別の表（run）に溜め、commit() を呼んだときだけ以前の実行の表（seen）に移す
+commit() せずに閉じると、この実行のキーは捨てられ、次の実行には引き継がれない
+Bloomフィルターは commit() のときに表と一緒に保存する。途中で終わった場合は次に開いたときに表から作り直す
+
+使い方:
+    python3 seen_index.py bookmarks.seen.sqlite
+"""
+
+import hashlib
+import os
+import sqlite3
+import struct
+import sys
+
+# Bloomフィルターのビット数と、1件あたりに立てるビット数
+# 8MB（2^26ビット）・7ビットで、500万件まで誤検出率（表を引く割合）がおよそ1%
+DEFAULT_BLOOM_BITS = 1 << 26
+DEFAULT_BLOOM_HASHES = 7
+
+# この件数ごとに表へまとめて書き込む
+DEFAULT_BATCH_SIZE = 10000
+
+SEEN_MAGIC = 'bookmark-seen-index'
+# 表の形式を変えたら上げる
+SEEN_VERSION = 2
+
+
+def key_hash(key):
+    """正規化キーの64ビットハッシュ（SQLite の INTEGER に入るよう符号付き）"""
+    digest = hashlib.blake2b(key.encode('utf-8', 'surrogatepass'), digest_size=8).digest()
+    return struct.unpack('<q', digest)[0]
+
+
+class SqliteSeenSet:
+    """
+    SQLite の表に保存する seen_urls（set と同じく in と add が使える）
+    in は以前の実行で記録したキーとこの実行で add したキーの両方を見る
+    with 文で使うか、最後に close() を呼ぶ（記録するなら先に commit() を呼ぶ）
+    """
+
+    def __init__(self, path, bloom_bits=DEFAULT_BLOOM_BITS, bloom_hashes=DEFAULT_BLOOM_HASHES,
+                 batch_size=DEFAULT_BATCH_SIZE):
+        self.path = path
+        self.bloom_bits = bloom_bits
+        self.bloom_hashes = bloom_hashes
+        self.batch_size = batch_size
+        self.pending = set()
+
+        # 開いたスレッドとは別の1本のスレッドから使う場合がある（bookmark_pipeline.py のクリーニング）
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS seen (hash INTEGER PRIMARY KEY) WITHOUT ROWID')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS run (hash INTEGER PRIMARY KEY) WITHOUT ROWID')
+
+        meta = dict(self.conn.execute('SELECT name, value FROM meta'))
+        if meta.get('magic', SEEN_MAGIC) != SEEN_MAGIC or meta.get('version', SEEN_VERSION) != SEEN_VERSION:
+            self.conn.close()
+            raise ValueError(f'重複判定の状態ファイルではないか、形式が違います: {path}')
+
+        bloom = meta.get('bloom')
+        if (bloom is not None and not meta.get('dirty') and len(bloom) * 8 == bloom_bits
+                and meta.get('bloom_hashes') == bloom_hashes):
+            self.bloom = bytearray(bloom)
+        else:
+            self.bloom = bytearray(bloom_bits // 8)
+            for (value,) in self.conn.execute('SELECT hash FROM seen'):
+                self._set_bits(value)
+
+        # 前回 commit() せずに終わった実行のキーを捨てる
+        self.conn.execute('DELETE FROM run')
+        self._set_meta(magic=SEEN_MAGIC, version=SEEN_VERSION)
+        self.conn.commit()
+
+    def _set_meta(self, **values):
+        self.conn.executemany('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', values.items())
+
+    def _positions(self, value):
+        """Bloomフィルターのビット位置（ハッシュの上下32ビットから二重ハッシュで作る）"""
+        first = value & 0xFFFFFFFF
+        second = ((value >> 32) & 0xFFFFFFFF) | 1
+        bits = self.bloom_bits
+        return [(first + i * second) % bits for i in range(self.bloom_hashes)]
+
+    def _set_bits(self, value):
+        bloom = self.bloom
+        for position in self._positions(value):
+            bloom[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        value = key_hash(key)
+        bloom = self.bloom
+        for position in self._positions(value):
+            if not bloom[position >> 3] & (1 << (position & 7)):
+                return False
+        if value in self.pending:
+            return True
+        return self.conn.execute(
+            'SELECT 1 FROM seen WHERE hash = ? UNION ALL SELECT 1 FROM run WHERE hash = ? LIMIT 1',
+            (value, value)
+        ).fetchone() is not None
+
+    def add(self, key):
+        value = key_hash(key)
+        self._set_bits(value)
+        self.pending.add(value)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def __len__(self):
+        """以前の実行で記録したキーの数"""
+        return self.conn.execute('SELECT count(*) FROM seen').fetchone()[0]
+
+    def flush(self):
+        """書き込み待ちのハッシュをこの実行の表に書き込む"""
+        if self.pending:
+            self.conn.executemany('INSERT OR IGNORE INTO run (hash) VALUES (?)',
+                                  ((value,) for value in self.pending))
+            self.conn.commit()
+            self.pending.clear()
+
+    def commit(self):
+        """この実行で add したキーを記録し、次の実行に引き継ぐ"""
+        self.flush()
+        # 移し終えるまでは保存済みの Bloomフィルターが表と一致しない
+        self._set_meta(dirty=1)
+        self.conn.commit()
+        self.conn.execute('INSERT OR IGNORE INTO seen (hash) SELECT hash FROM run')
+        self.conn.execute('DELETE FROM run')
+        self._set_meta(bloom=bytes(self.bloom), bloom_hashes=self.bloom_hashes, dirty=0)
+        self.conn.commit()
+
+    def close(self):
+        """閉じる（commit() していないこの実行のキーは捨てる）"""
+        if self.conn is None:
+            return
+        self.pending.clear()
+        self.conn.execute('DELETE FROM run')
+        self.conn.commit()
+        self.conn.close()
+        self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_seen_set(path=None):
+    """path を指定すれば SqliteSeenSet、なければメモリ上の set"""
+    if path is None:
+        return set()
+    return SqliteSeenSet(path)
+
+
+def close_seen_set(seen, commit=False):
+    """
+    open_seen_set で開いたものを閉じる（set なら何もしない）
+    commit=True ならこの実行で見たキーを記録してから閉じる（出力を書き終えてから呼ぶ）
+    """
+    if isinstance(seen, SqliteSeenSet):
+        if commit:
+            seen.commit()
+        seen.close()
+
+
+def main():
+    if len(sys.argv) != 2:
+        print(f"使い方: python3 {os.path.basename(sys.argv[0])} <状態ファイル>")
+        sys.exit(1)
+    with SqliteSeenSet(sys.argv[1]) as seen:
+        print(f"{sys.argv[1]}: {len(seen):,}件のURLを記録済み")
+
+
+if __name__ == '__main__':
+    main()
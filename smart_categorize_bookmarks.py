@@ -10,15 +10,28 @@ from html.parser import HTMLParser
 from datetime import datetime
 from collections import defaultdict
 
+from bookmark_replay import escape_title
+from bookmark_visitor import BookmarkVisitor
 
-class SmartBookmarkCategorizer:
+
+class SmartBookmarkCategorizer(BookmarkVisitor):
     """
     ブックマークをコンテンツ分析して適切に分類
+    ビジターとして共有パーサーのイベントも受け取れる
     """
 
     def __init__(self):
         self.categories = defaultdict(list)
 
+    def add(self, url, title):
+        """分類して categories に追加"""
+        self.categories[self.categorize_bookmark(url, title)].append((url, title))
+
+    def visit_bookmark(self, bookmark):
+        # 正規表現での抽出と同じく、URL・タイトルのないものは除き、タイトルはHTML上の表記で扱う
+        if bookmark.url and bookmark.title:
+            self.add(bookmark.url, escape_title(bookmark.title))
+
     def categorize_bookmark(self, url, title):
         """
         URLとタイトルから最適なカテゴリを判定
@@ -212,11 +225,16 @@ def smart_categorize_bookmarks(input_file, output_file):
     print(f"📊 {len(bookmarks)}個のブックマークを分析中...")
 
     # カテゴリごとに分類
-    categories = defaultdict(list)
     for url, title in bookmarks:
-        category = categorizer.categorize_bookmark(url, title)
-        categories[category].append((url, title))
+        categorizer.add(url, title)
+
+    save_smart_categories(categorizer.categories, output_file)
 
+
+def save_smart_categories(categories, output_file):
+    """
+    カテゴリ別の件数を表示し、分類結果をHTMLに書き出す
+    """
     # カテゴリ別の件数を表示
     print("\n=== カテゴリ別件数 ===")
     for category, items in sorted(categories.items(), key=lambda x: len(x[1]), reverse=True):
@@ -314,7 +332,7 @@ def smart_categorize_bookmarks(input_file, output_file):
 
     print(f"\n✅ 整理済みブックマークを生成しました: {output_file}")
     print(f"   カテゴリ数: {len(categories)}")
-    print(f"   ブックマーク数: {len(bookmarks)}")
+    print(f"   ブックマーク数: {sum(len(items) for items in categories.values())}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+重複判定用のURL正規化
+表記が違うだけで同じページを指すURLを、1つの短いキー（正規化キー）にまとめる
+
+    - http:// と https:// は区別しない（キーにスキームを含めない）
+    - ホスト名は小文字にし、先頭の www. と末尾の '.'、既定のポートを除く
+    - パスの末尾の '/' を除き、%xx の表記をそろえる
+    - utm_* などの計測用パラメータを除き、残りのパラメータを名前順に並べる
+    - ページ内の位置を表すフラグメント（#見出し など）は除く
+      '/'・'?'・'='・'&' を含むもの（'#!'・'#/'・'#inbox/ID' など）やトップページ（パスが '/'）のものは
+      画面を切り替えるアプリの表示先とみなして残す（'#:~:text=' の強調表示は除く）
+    - ドメインごとの規則（DOMAIN_RULES）: youtu.be/ID・/shorts/ID → youtube.com/watch?v=ID、
+      Amazonの商品ページ → /dp/ASIN、Google検索 → q だけ、モバイル版のホスト → 通常のホスト
+
+同じURLが何度も出てくるので、canonical_key は LRU キャッシュでメモ化する
+
+使い方:
+    python3 url_canon.py "https://youtu.be/dQw4w9WgXcQ?si=abc" "http://www.youtube.com/watch?v=dQw4w9WgXcQ&t=10"
+    python3 url_canon.py "https://mail.google.com/mail/u/0/#inbox/FMfcgzA" "https://mail.google.com/mail/u/0/#inbox/FMfcgzB"
+"""
+
+import re
+import sys
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+# メモ化するURLの数
+CANON_CACHE_SIZE = 1 << 16
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# 除く計測用パラメータ（utm_ で始まるものはすべて除く）
+TRACKING_PARAMS = frozenset({
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid',
+    '_ga', '_gl', 'ref_src', 'spm',
+})
+
+# これらを含むフラグメントは画面遷移用とみなして残す
+ROUTE_FRAGMENT_CHARS = frozenset('/?=&!')
+
+# YouTubeの動画ページで残すパラメータ（再生位置・共有元などは除く）
+YOUTUBE_WATCH_PARAMS = ('v', 'list')
+
+# Google検索で残すパラメータ
+GOOGLE_SEARCH_PARAMS = ('q', 'tbm')
+
+AMAZON_ASIN_PATTERN = re.compile(r'/(?:dp|gp/product|gp/aw/d)/([A-Z0-9]{10})(?:[/?]|$)')
+PERCENT_PATTERN = re.compile(r'%[0-9A-Fa-f]{2}')
+
+# %xx のうち、デコードしても意味が変わらない文字
+UNRESERVED = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~')
+
+
+def _normalize_percent(match):
+    char = chr(int(match.group()[1:], 16))
+    return char if char in UNRESERVED else match.group().upper()
+
+
+def _keep_params(params, names):
+    return [(name, value) for name, value in params if name in names]
+
+
+def _youtube(host, path, params):
+    if host in ('youtube.com', 'm.youtube.com'):
+        host = 'youtube.com'
+    for prefix in ('/shorts/', '/embed/', '/live/', '/v/'):
+        if path.startswith(prefix):
+            video_id = path[len(prefix):].split('/', 1)[0]
+            return host, '/watch', [('v', video_id)] + _keep_params(params, ('list',))
+    if path == '/watch':
+        params = _keep_params(params, YOUTUBE_WATCH_PARAMS)
+    return host, path, params
+
+
+def _youtu_be(host, path, params):
+    video_id = path.lstrip('/').split('/', 1)[0]
+    if not video_id:
+        return host, path, params
+    return 'youtube.com', '/watch', [('v', video_id)] + _keep_params(params, ('list',))
+
+
+def _amazon(host, path, params):
+    match = AMAZON_ASIN_PATTERN.search(path)
+    if match:
+        return host, f'/dp/{match.group(1)}', []
+    return host, path, params
+
+
+def _google(host, path, params):
+    if host == 'google.com' and path == '/search':
+        params = _keep_params(params, GOOGLE_SEARCH_PARAMS)
+    return host, path, params
+
+
+def _mobile_host(host, path, params):
+    # ja.m.wikipedia.org -> ja.wikipedia.org, mobile.twitter.com -> twitter.com
+    labels = host.split('.')
+    return '.'.join(label for label in labels if label not in ('m', 'mobile')), path, params
+
+
+# 登録ドメイン -> (ホスト, パス, パラメータ) を受け取って正規化したものを返す関数
+# ホストに一致するものがなければ、親ドメインの規則を順に探す
+DOMAIN_RULES = {
+    'youtube.com': _youtube,
+    'youtu.be': _youtu_be,
+    'amazon.co.jp': _amazon,
+    'amazon.com': _amazon,
+    'google.com': _google,
+    'wikipedia.org': _mobile_host,
+    'twitter.com': _mobile_host,
+    'x.com': _mobile_host,
+}
+
+
+def domain_rule(host):
+    """ホストに適用する規則（なければ None）"""
+    while True:
+        rule = DOMAIN_RULES.get(host)
+        if rule is not None:
+            return rule
+        if '.' not in host:
+            return None
+        host = host.split('.', 1)[1]
+
+
+def _split_query(query):
+    params = []
+    for param in query.split('&'):
+        if not param:
+            continue
+        name, _, value = param.partition('=')
+        lower = name.lower()
+        if lower.startswith('utm_') or lower in TRACKING_PARAMS:
+            continue
+        params.append((name, value))
+    return params
+
+
+def is_route_fragment(path, fragment):
+    """フラグメントがページ内の位置ではなく、アプリの表示先（別のページ）を表しているか"""
+    if not fragment or fragment.startswith(':~:'):
+        return False
+    return path in ('', '/') or not ROUTE_FRAGMENT_CHARS.isdisjoint(fragment)
+
+
+@lru_cache(maxsize=CANON_CACHE_SIZE)
+def canonical_key(url):
+    """
+    URLの正規化キー（空のURLは ''）
+    http(s) のURLは 'ホスト/パス?パラメータ' の形、それ以外のスキームで
+    ホストを持つものは 'スキーム://ホスト/パス?パラメータ'、ホストのないもの（javascript: など）は前後の空白を除いたURL
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    if not parts.netloc:
+        return url
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').rstrip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+    path = PERCENT_PATTERN.sub(_normalize_percent, parts.path)
+    params = _split_query(parts.query)
+
+    rule = domain_rule(host)
+    if rule is not None:
+        host, path, params = rule(host, path, params)
+
+    key = host
+    if parts.username or parts.password:
+        key = parts.netloc.rsplit('@', 1)[0] + '@' + key
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        key = f'{key}:{port}'
+    key += path.rstrip('/')
+    if params:
+        params.sort()
+        key += '?' + '&'.join(f'{name}={value}' if value else name for name, value in params)
+    if is_route_fragment(parts.path, parts.fragment):
+        key += '#' + parts.fragment
+    if scheme not in DEFAULT_PORTS:
+        key = f'{scheme}://{key}'
+    return key
+
+
+def main():
+    for url in sys.argv[1:]:
+        print(f"{canonical_key(url)}\t{url}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+URLの有効性の判定
+スキームで振り分け、http(s) などホストを持つURLはホスト名を集合で照合して、理由コード（整数）を返す
+clean_bookmarks.suspicious_category・organize_bookmarks.is_valid_url・analyze_bookmarks.find_suspicious が共通で使う
+
+'localhost' という文字列を含むだけのURL（https://example.com/localhost-setup など）は、
+ホストがループバックでなければ有効とみなす
+
+使い方:
+    python3 url_classify.py "http://localhost:8080/" "https://example.com/localhost-setup"
+"""
+
+import re
+import sys
+from array import array
+from functools import lru_cache
+
+# 理由コード
+VALID = 0
+EMPTY = 1
+CHROME = 2
+JAVASCRIPT = 3
+FILE = 4
+LOCALHOST = 5
+INVALID_PROTOCOL = 6
+
+REASON_NAMES = ('valid', 'empty', 'chrome', 'javascript', 'file', 'localhost', 'invalid_protocol')
+
+CLASSIFY_CACHE_SIZE = 1 << 16
+
+# スキームごとの理由コード（ここにないスキームはホストを見て LOCALHOST か INVALID_PROTOCOL）
+SCHEME_CODES = {
+    'http': VALID,
+    'https': VALID,
+    'chrome': CHROME,
+    'chrome-extension': CHROME,
+    'javascript': JAVASCRIPT,
+    'file': FILE,
+}
+
+LOOPBACK_HOSTS = frozenset({'localhost', '127.0.0.1', '::1', '0.0.0.0'})
+
+# スキームと、'//' があればその後のホスト部分（ユーザー情報・ポートを含む）
+URL_PATTERN = re.compile(r'([A-Za-z][A-Za-z0-9+.\-]*):(?://([^/?#]*))?')
+LOOPBACK_V4_PATTERN = re.compile(r'127(?:\.\d{1,3}){3}')
+
+
+def _host(authority):
+    """ホスト部分からユーザー情報・ポートを除いた小文字のホスト名"""
+    host = authority.rpartition('@')[2].lower()
+    if host.startswith('['):
+        return host[1:].split(']', 1)[0]
+    return host.split(':', 1)[0].rstrip('.')
+
+
+def is_loopback(host):
+    return (host in LOOPBACK_HOSTS or host.endswith('.localhost')
+            or LOOPBACK_V4_PATTERN.fullmatch(host) is not None)
+
+
+@lru_cache(maxsize=CLASSIFY_CACHE_SIZE)
+def classify_url(url):
+    """URLの理由コード（VALID なら有効）"""
+    url = url.strip() if url else ''
+    if not url:
+        return EMPTY
+
+    match = URL_PATTERN.match(url)
+    code = INVALID_PROTOCOL if match is None else SCHEME_CODES.get(match.group(1).lower(), INVALID_PROTOCOL)
+    if code in (VALID, INVALID_PROTOCOL):
+        authority = match and match.group(2)
+        if authority is None:
+            # スキームのないURL（localhost:3000/ など）は先頭をホストとみなす
+            authority = url.split('/', 1)[0] if code == INVALID_PROTOCOL else ''
+        if authority and is_loopback(_host(authority)):
+            return LOCALHOST
+    return code
+
+
+def classify_urls(urls):
+    """複数のURLの理由コードを array('B') で返す（1件1バイト）"""
+    return array('B', map(classify_url, urls))
+
+
+def main():
+    for url, code in zip(sys.argv[1:], classify_urls(sys.argv[1:])):
+        print(f"{REASON_NAMES[code]}\t{url}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chromeプロファイルの Bookmarks（またはエクスポートを置くフォルダ）を監視し、
+変更されるたびに整理済み・カテゴリー別ファイルとビューアを更新し続ける
+
+Linuxでは inotify でファイルの書き込み・置き換えを待ち、それ以外ではファイルの更新日時を定期的に調べる
+Chromeは Bookmarks を一時ファイルに書いてから置き換えるので、ファイルではなくフォルダを監視する
+短い間に続けて書き込まれた場合は、書き込みが落ち着いてから（--debounce 秒）1回だけ更新する
+
+更新は incremental_update.py と同じく前回からの差分だけを解析・分類し、
+ビューアは入力になるファイルの内容が変わったものだけ作り直す
+    bookmarks_organized.html -> index.html（create_hierarchical_viewer.py）
+    bookmarks_cleaned.html   -> bookmarks_web.html（generate_web_view.py）
+
+使い方:
+    python3 watch_bookmarks.py                      # 既定のChromeプロファイルの Bookmarks
+    python3 watch_bookmarks.py ~/Downloads/exports  # フォルダ内の最新の .html エクスポート
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import glob
+import os
+import select
+import struct
+import time
+
+from chrome_bookmarks import default_bookmarks_path
+from create_hierarchical_viewer import create_hierarchical_viewer
+from generate_web_view import create_web_view
+from incremental_update import DEFAULT_STATE_FILE, incremental_update
+from parse_cache import file_digest
+
+# inotify のイベント（<sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+INOTIFY_EVENT = struct.Struct('iIII')
+INOTIFY_READ_SIZE = 64 * 1024
+
+DEFAULT_DEBOUNCE = 2.0
+DEFAULT_POLL_INTERVAL = 1.0
+
+
+class InotifyWatcher:
+    """inotify でフォルダ内のファイルの変更を待つ（Linuxのみ）"""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 に失敗しました')
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f'{directory} を監視できません')
+
+    def wait(self, timeout=None):
+        """変更されたファイル名の集合を返す（timeout 秒待っても変更がなければ空）"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        names = set()
+        data = os.read(self.fd, INOTIFY_READ_SIZE)
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if name:
+                names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """フォルダ内のファイルの (更新日時, サイズ) を定期的に比べて変更を待つ"""
+
+    def __init__(self, directory, interval=DEFAULT_POLL_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.signatures = self.scan()
+
+    def scan(self):
+        signatures = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                signatures[entry.name] = (st.st_mtime_ns, st.st_size)
+        return signatures
+
+    def wait(self, timeout=None):
+        """変更されたファイル名の集合を返す（timeout 秒待っても変更がなければ空）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            delay = self.interval
+            if deadline is not None:
+                delay = min(delay, max(deadline - time.monotonic(), 0))
+            time.sleep(delay)
+
+            signatures = self.scan()
+            names = {
+                name for name, signature in signatures.items()
+                if self.signatures.get(name) != signature
+            }
+            self.signatures = signatures
+            if names or (deadline is not None and time.monotonic() >= deadline):
+                return names
+
+    def close(self):
+        pass
+
+
+def open_watcher(directory, polling=False, interval=DEFAULT_POLL_INTERVAL):
+    """使えれば inotify、使えなければ更新日時のポーリングで監視する"""
+    if not polling:
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError, TypeError):
+            pass
+    return PollingWatcher(directory, interval)
+
+
+def wait_for_change(watcher, is_relevant, debounce):
+    """
+    対象のファイルが変更されるまで待ち、さらに debounce 秒続けて変更がなくなるまで待つ
+    （続けて書き込まれても1回の変更として扱う）
+    """
+    while not any(is_relevant(name) for name in watcher.wait()):
+        pass
+    while any(is_relevant(name) for name in watcher.wait(debounce)):
+        pass
+
+
+class BookmarkWatch:
+    """監視対象と出力先の設定を持ち、変更のたびに出力を更新する"""
+
+    def __init__(self, source, cleaned_file, categorized_file, organized_file, report_file,
+                 index_file, web_file, state_file=DEFAULT_STATE_FILE):
+        self.source = os.path.abspath(source)
+        self.cleaned_file = cleaned_file
+        self.categorized_file = categorized_file
+        self.organized_file = organized_file
+        self.report_file = report_file
+        self.index_file = index_file
+        self.web_file = web_file
+        self.state_file = state_file
+        self.viewer_inputs = {}
+
+    @property
+    def directory(self):
+        return self.source if os.path.isdir(self.source) else os.path.dirname(self.source)
+
+    def outputs(self):
+        return {
+            os.path.abspath(path) for path in (
+                self.cleaned_file, self.categorized_file, self.organized_file, self.report_file,
+                self.index_file, self.web_file, self.state_file
+            )
+        }
+
+    def is_relevant(self, name):
+        """監視フォルダ内のファイル名 name の変更で更新が必要か"""
+        path = os.path.join(self.directory, name)
+        if not os.path.isdir(self.source):
+            return path == self.source
+        # エクスポートのフォルダに出力を書く場合、自分の書き込みには反応しない
+        return name.endswith('.html') and path not in self.outputs()
+
+    def current_input(self):
+        """処理する入力ファイル（フォルダの場合は最新の .html エクスポート）"""
+        if not os.path.isdir(self.source):
+            return self.source if os.path.exists(self.source) else None
+        exports = [
+            path for path in glob.glob(os.path.join(glob.escape(self.source), '*.html'))
+            if os.path.abspath(path) not in self.outputs()
+        ]
+        return max(exports, key=os.path.getmtime) if exports else None
+
+    def refresh(self):
+        """入力の差分を反映し、入力が変わったビューアだけを作り直す"""
+        input_file = self.current_input()
+        if input_file is None:
+            print(f"⚠️  入力ファイルが見つかりません: {self.source}")
+            return
+
+        incremental_update(
+            input_file, self.cleaned_file, self.categorized_file, self.organized_file,
+            self.report_file, state_file=self.state_file
+        )
+
+        for viewer_input, output_file, create in (
+            (self.organized_file, self.index_file, create_hierarchical_viewer),
+            (self.cleaned_file, self.web_file, create_web_view),
+        ):
+            digest = file_digest(viewer_input)
+            if self.viewer_inputs.get(output_file) == digest and os.path.exists(output_file):
+                continue
+            create(viewer_input, output_file)
+            self.viewer_inputs[output_file] = digest
+
+    def run(self, debounce=DEFAULT_DEBOUNCE, polling=False, interval=DEFAULT_POLL_INTERVAL):
+        """起動時に1回更新し、その後は変更を待って更新し続ける（Ctrl+C で終了）"""
+        watcher = open_watcher(self.directory, polling, interval)
+        kind = 'inotify' if isinstance(watcher, InotifyWatcher) else f'{interval}秒ごとのポーリング'
+        try:
+            self.refresh_safely()
+            while True:
+                print(f"\n👀 {self.source} を監視中（{kind}）...")
+                wait_for_change(watcher, self.is_relevant, debounce)
+                print(f"\n🔄 変更を検出しました（{time.strftime('%H:%M:%S')}）")
+                self.refresh_safely()
+        except KeyboardInterrupt:
+            print("\n監視を終了します")
+        finally:
+            watcher.close()
+
+    def refresh_safely(self):
+        # 書き込み途中のファイルを読んだ場合などは、次の変更で読み直す
+        try:
+            self.refresh()
+        except (OSError, ValueError) as e:
+            print(f"⚠️  更新に失敗しました（次の変更で再試行します）: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ブックマークを監視して整理済みファイルとビューアを更新し続ける')
+    parser.add_argument('source', nargs='?', default=default_bookmarks_path(),
+                        help='Chromeプロファイルの Bookmarks、ブックマークHTML、またはエクスポートを置くフォルダ')
+    parser.add_argument('--cleaned', default='bookmarks_cleaned.html', help='整理済みブックマークの出力')
+    parser.add_argument('--categorized', default='bookmarks_categorized.html', help='カテゴリー別ブックマークの出力')
+    parser.add_argument('--organized', default='bookmarks_organized.html', help='スマート分類の出力')
+    parser.add_argument('--report', default='bookmark_cleaning_report.txt', help='整理レポートの出力')
+    parser.add_argument('--index', default='index.html', help='階層ビューアの出力')
+    parser.add_argument('--web', default='bookmarks_web.html', help='Web表示用HTMLの出力')
+    parser.add_argument('--state', default=DEFAULT_STATE_FILE, help='前回の状態を保存するファイル')
+    parser.add_argument('--debounce', type=float, default=DEFAULT_DEBOUNCE,
+                        help='最後の書き込みからこの秒数だけ変更がなければ更新する')
+    parser.add_argument('--poll', action='store_true', help='inotify を使わず更新日時を定期的に調べる')
+    parser.add_argument('--interval', type=float, default=DEFAULT_POLL_INTERVAL, help='ポーリングの間隔（秒）')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        parser.error(f'{args.source} が見つかりません')
+
+    print("="*70)
+    print("ブックマーク監視モード")
+    print("="*70)
+
+    watch = BookmarkWatch(
+        args.source, args.cleaned, args.categorized, args.organized, args.report,
+        args.index, args.web, state_file=args.state
+    )
+    watch.run(debounce=args.debounce, polling=args.poll, interval=args.interval)
+
+
+if __name__ == '__main__':
+    main()